@@ -1,13 +1,29 @@
 #agent_manager.py
+import asyncio
+import contextlib
+import functools
 import json
 import logging
+import os
 import threading
+import time
+import weakref
 from typing import Dict, List, Optional, Tuple, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError, as_completed, wait
 
 from roles import *
+from roles.base_role import GenerationCancelled
+from roles.client_pool import get_ollama_client, ollama_keep_alive
+from roles.metrics import get_metrics, span
+from roles.ollama_health import get_health_monitor
+from roles.registry import get_role_registry
+from roles.response_cache import get_response_cache
+from scheduler import FairScheduler
 
 class AgentManager:
+    # Clé de l'unique section retournée quand le traitement d'une requête échoue
+    ERROR_RESPONSE_KEY = "🚨 Erreur Système"
+
     VALID_ROLES = {
         'recherche': ("🔍 Recherches", Recherche),
         'conseil': ("💬 Conseil Personnel", Conseil),
@@ -18,30 +34,137 @@ class AgentManager:
         'connecteur': ("🔗 Synthèse des Idées", Connecteur)           
     }
 
-    def __init__(self, max_workers: Optional[int] = None, model_config: Optional[dict] = None):
+    def __init__(self, max_workers: Optional[int] = None, model_config: Optional[dict] = None,
+                 request_timeout: float = 200, pipeline_synthesis: bool = True):
+        """
+        :param max_workers: Taille du pool partagé par toutes les requêtes (ECHOPAGE_MAX_WORKERS, 8 par défaut).
+        :param model_config: Paramètres de construction par rôle.
+        :param request_timeout: Délai maximal d'attente des agents d'une requête, en secondes.
+        :param pipeline_synthesis: Résume chaque rôle dès qu'il termine au lieu d'attendre tous les agents.
+        """
         self.DetecteurBesoins = DetecteurBesoins()
         self.model_config = model_config or {}
-        self.agents = self._initialize_agents()
-        self.max_workers = max_workers or 3
-        self.executor = None
-        self.lock = threading.Lock()
+        # Rôles de roles.json, relus par le registre quand le fichier change
+        self.roles = get_role_registry()
+        self._roles_version = self.roles.version
+        self._check_roles()
+        # Les agents sont créés à leur première utilisation (voir get_agent)
+        self.agents = {}
+        self._agents_lock = threading.Lock()
+        # État du serveur Ollama, vérifié en arrière-plan et lu sans attendre
+        self.health = get_health_monitor()
+        self.max_workers = max_workers or int(os.getenv("ECHOPAGE_MAX_WORKERS", "8"))
+        self.request_timeout = request_timeout
+        self.pipeline_synthesis = pipeline_synthesis
         self.logger = logging.getLogger(self.__class__.__name__)
-        self._init_executor()
+        self.scheduler = FairScheduler(self.max_workers, self._role_limits())
+        self.executor = self.scheduler.executor
+        # Sémaphores des plafonds par rôle pour le pipeline asynchrone, une série par boucle d'événements
+        self._async_role_semaphores = weakref.WeakKeyDictionary()
+        self.logger.info(f"Pool partagé de {self.max_workers} threads initialisé")
+
+    def _role_limits(self) -> Dict[str, int]:
+        """Plafonds de concurrence par rôle (clé "max_concurrency" de roles.json), connus sans créer les agents"""
+        limits = {}
+        for role in self.VALID_ROLES:
+            limit = getattr(self._agent_class(role), 'max_concurrency', None)
+            if limit:
+                limits[role] = limit
+        return limits
 
-    def _init_executor(self):
-        """Initialise ou réinitialise l'executor si nécessaire"""
-        if self.executor is None or self.executor._shutdown:
-            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
-            self.logger.info("Initialisation pour une demande")
+    def _agent_class(self, role: str) -> type:
+        """Classe du rôle : celle du registre (roles.json à jour) ou, à défaut, la classe statique"""
+        return self.roles.role_class(role) or self.VALID_ROLES[role][1]
 
-    def _initialize_agents(self) -> Dict[str, object]:
-        agents = {}
-        for role, (display_name, agent_class) in self.VALID_ROLES.items():
+    def _check_roles(self):
+        for role in self.VALID_ROLES:
+            agent_class = self._agent_class(role)
             if not issubclass(agent_class, BaseRole):
                 raise TypeError(f"{agent_class.__name__} n'est pas un rôle valide")
-            agents[role] = agent_class(**self.model_config.get(role, {}))
-        return agents
+
+    def _refresh_roles(self):
+        """Si roles.json a changé, les agents qui en dépendent seront recréés avec la nouvelle configuration"""
+        version = self.roles.version
+        if version == self._roles_version:
+            return
+        with self._agents_lock:
+            if version == self._roles_version:
+                return
+            for role in self.VALID_ROLES:
+                agent_class = self.roles.role_class(role)
+                if agent_class is not None:
+                    self.agents.pop(role, None)
+                    self.scheduler.set_role_limit(role, agent_class.max_concurrency)
+            self._roles_version = version
+            self.logger.info("Configuration des rôles rechargée")
+
+    def get_agent(self, role: str) -> Optional[BaseRole]:
+        """Agent du rôle, créé à sa première utilisation (None pour un rôle inconnu)"""
+        self._refresh_roles()
+        agent = self.agents.get(role)
+        if agent is not None or role not in self.VALID_ROLES:
+            return agent
+        with self._agents_lock:
+            agent = self.agents.get(role)
+            if agent is None:
+                agent = self._agent_class(role)(**self.model_config.get(role, {}))
+                # Le plafond peut dépendre de la configuration de l'instance (Connecteur en mode local)
+                if agent.max_concurrency:
+                    self.scheduler.set_role_limit(role, agent.max_concurrency)
+                self.agents[role] = agent
+        return agent
     
+    def local_models(self) -> List[str]:
+        """Modèles Ollama distincts utilisés par le détecteur et les rôles en mode local (sans créer les agents)"""
+        backends = [(self.DetecteurBesoins.mode, self.DetecteurBesoins.model)] + [
+            self._agent_class(role).configured_model(self.model_config.get(role)) for role in self.VALID_ROLES
+        ]
+        return list(dict.fromkeys(model for mode, model in backends if mode == 'local'))
+
+    def role_models(self, roles: List[str]) -> Dict[str, str]:
+        """Modèle utilisé par chaque rôle (et par le Connecteur), par nom d'affichage (sans créer les agents)"""
+        models = {}
+        for role in list(roles) + ['connecteur']:
+            if role in self.VALID_ROLES:
+                agent_class = self._agent_class(role)
+                mode, model = agent_class.configured_model(self.model_config.get(role))
+                models[self.VALID_ROLES[role][0]] = model if mode == 'local' else agent_class.ext_model
+        return models
+
+    def warm_up(self, keep_alive: Optional[str] = None, on_progress: Optional[Callable] = None,
+                ready_timeout: float = 10) -> Dict[str, float]:
+        """
+        Charge en mémoire chaque modèle local (prompt vide) et le garde chargé pendant `keep_alive`
+        (ECHOPAGE_OLLAMA_KEEP_ALIVE, 30m par défaut), pour qu'aucune demande ne paie le chargement.
+        Les modèles sont chargés l'un après l'autre pour ne pas saturer la mémoire.
+
+        :param ready_timeout: Attente maximale de la disponibilité d'Ollama, en secondes.
+        :return: Durée de chargement de chaque modèle en secondes (-1 en cas d'échec).
+        """
+        models = self.local_models()
+        if not models:
+            return {}
+        if not self.health.wait_ready(ready_timeout):
+            self.logger.warning(f"Préchauffage ignoré : Ollama injoignable ({self.health.last_error})")
+            return {model: -1 for model in models}
+
+        keep_alive = keep_alive or ollama_keep_alive()
+        client = get_ollama_client()
+        load_times = {}
+        for model in models:
+            if on_progress:
+                on_progress(f"🔥 Chargement de {model}...")
+            start = time.perf_counter()
+            try:
+                response = client.generate(model=model, prompt="", keep_alive=keep_alive)
+                # load_duration (ns) est quasi nul si le modèle était déjà en mémoire
+                load_times[model] = round((response.get('load_duration') or 0) / 1e9 or time.perf_counter() - start, 3)
+                self.logger.info(f"Modèle {model} prêt en {load_times[model]:g} s (keep_alive={keep_alive})")
+            except Exception as e:
+                load_times[model] = -1
+                self.logger.warning(f"Préchauffage de {model} impossible : {str(e)}")
+        return load_times
+
     def detect_roles(self, input_text: str):
         """Traite la détection des besoins"""
         try:
@@ -53,124 +176,605 @@ class AgentManager:
             self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
             return self._create_error_response(str(e))
             
-    def process_request(self, input_text: str, required_roles: List[str], on_progress: Optional[Callable] = None) -> Tuple[Dict[str, str], List[str]]:
-        """Traite une requête de manière parallèle avec gestion d'erreurs améliorée"""
+    def process_request(self, input_text: str, required_roles: List[str], on_progress: Optional[Callable] = None,
+                        on_token: Optional[Callable[[str, str], None]] = None,
+                        on_result: Optional[Callable[[str, str], None]] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Traite une requête de manière parallèle avec gestion d'erreurs améliorée.
+        `on_token(role, fragment)` reçoit les fragments générés par chaque rôle au fil de l'eau.
+        `on_result(nom du rôle, réponse)` reçoit la réponse de chaque rôle dès qu'il termine (hors Connecteur).
+        """
         if not required_roles:
             self.logger.warning("Aucun rôle détecté, utilisation du fallback")
             required_roles = ['recherche']
         try:
-            results = self._execute_parallel_processing(input_text, required_roles, on_progress)
+            summary_request = self.scheduler.new_request_id()
+            on_role_result, partial_summaries = self._partial_summarizer(input_text, required_roles, on_result,
+                                                                         summary_request)
+            results = self._execute_parallel_processing(input_text, required_roles, on_progress, on_token, on_role_result)
             
             if len(required_roles) > 1:
-                try:
-                    on_progress(f"📝 Résumé en cours...")
-                except Exception as e:
-                    self.logger.error(f"Erreur lors de la mise à jour de la progression : {str(e)}")
-                connecteur_result = self._run_connecteur(input_text, results)
+                self._announce_synthesis(on_progress)
+                connecteur_result = self._run_connecteur(input_text, results, on_token, partial_summaries,
+                                                         summary_request)
                 results['connecteur'] = connecteur_result
             
             return results, required_roles
             
         except Exception as e:
             self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
-            return self._create_error_response(str(e))
-            
-    def _run_connecteur(self, input_text: str, agent_results: Dict[str, str]) -> str:
-        """Exécute le Connecteur en synthétisant les réponses des autres rôles"""
-        try:
-            connecteur = self.agents.get('connecteur')
-            if not connecteur:
-                raise ValueError("Agent Connecteur non configuré")
-            
-            # Préparer les réponses sous forme de liste de dictionnaires
-            responses = [
-                {"role": self.VALID_ROLES.get(role, (role, None))[0], "response": content}
-                for role, content in agent_results.items() if role != 'connecteur'
-            ]
+            return self._create_error_response(str(e)), required_roles
             
-            # Exécuter le Connecteur avec les réponses des autres agents
-            result = connecteur.execute(input_text, responses)
-            self.logger.info("Le Connecteur a terminé avec succès")
-            return result
+    def _run_connecteur(self, input_text: str, agent_results: Dict[str, str],
+                        on_token: Optional[Callable[[str, str], None]] = None,
+                        partial_summaries: Optional[Dict[str, Future]] = None,
+                        request_id: Optional[int] = None) -> str:
+        """
+        Exécute le Connecteur en synthétisant les réponses des autres rôles.
+        `partial_summaries` contient les résumés déjà lancés en mode pipeline, par nom de rôle,
+        sous la requête `request_id` de l'ordonnanceur. Résumés et synthèse ont le même délai
+        que les rôles ("timeout" du Connecteur, sinon request_timeout) : au-delà, les résumés
+        en file sont annulés et la synthèse s'arrête au fragment suivant.
+        """
+        with span('connecteur', roles=len(agent_results)) as stage:
+            request_id = request_id or self.scheduler.new_request_id()
+            futures = []
+            timeout = None
+            try:
+                connecteur, responses, connecteur_on_token = self._connecteur_inputs(agent_results, on_token)
+                timeout = connecteur.timeout or self.request_timeout
+                deadline = time.monotonic() + timeout
+                on_chunk = self._deadline_handler(deadline, connecteur_on_token)
+                submit = functools.partial(self.scheduler.submit, request_id, 'connecteur')
 
-        except Exception as e:
-            self.logger.error(f"Erreur de traitement Connecteur : {str(e)}", exc_info=True)
-            return f"Erreur Connecteur : {str(e)}"
+                if partial_summaries:
+                    # Mode pipeline : seuls les rôles non encore résumés (ex. timeout) partent maintenant
+                    futures = [
+                        partial_summaries.get(resp["role"]) or submit(connecteur.summarize_response, input_text, resp)
+                        for resp in responses
+                    ]
+                    _, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+                    if not_done:
+                        raise FuturesTimeoutError()
+                    result = connecteur.synthesize(input_text, [future.result() for future in futures], on_chunk)
+                else:
+                    # Exécuter le Connecteur avec les réponses des autres agents ;
+                    # ses résumés partiels passent par le pool partagé
+                    result = connecteur.execute(
+                        input_text,
+                        responses,
+                        on_token=on_chunk,
+                        submit=submit,
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                self.logger.info("Le Connecteur a terminé avec succès")
+                return result
 
-    def _execute_parallel_processing(self, input_text: str, roles: List[str], on_progress: Optional[Callable] = None) -> Dict[str, str]:
-        futures = {}
-        results = {}
-        
-        with self.lock:
-            self._init_executor()
+            except FuturesTimeoutError:
+                # Libère les places encore réservées par les résumés partiels
+                self.scheduler.cancel_request(request_id)
+                for future in futures:
+                    future.cancel()
+                return self._connecteur_timeout(stage, timeout)
+            except Exception as e:
+                return self._connecteur_error(stage, e)
+
+    @staticmethod
+    def _deadline_handler(deadline: float, on_token: Optional[Callable[[str], None]] = None) -> Callable[[str], None]:
+        """Relaie les fragments de la synthèse et l'interrompt une fois l'échéance passée"""
+        def handle_token(chunk: str):
+            if time.monotonic() > deadline:
+                raise FuturesTimeoutError()
+            if on_token:
+                on_token(chunk)
+
+        return handle_token
 
+    def _connecteur_timeout(self, stage, timeout: float) -> str:
+        self.logger.warning(f"Timeout : connecteur annulé après {timeout:g} secondes")
+        stage.status = 'timeout'
+        return f"Timeout : connecteur n'a pas terminé dans les {timeout:g} secondes"
+
+    def _connecteur_inputs(self, agent_results: Dict[str, str], on_token: Optional[Callable[[str, str], None]] = None):
+        """Connecteur, réponses des autres rôles (liste de dictionnaires) et relais de ses fragments"""
+        connecteur = self.get_agent('connecteur')
+        if not connecteur:
+            raise ValueError("Agent Connecteur non configuré")
+
+        responses = [
+            {"role": self.VALID_ROLES.get(role, (role, None))[0], "response": content}
+            for role, content in agent_results.items() if role != 'connecteur'
+        ]
+        connecteur_on_token = (lambda chunk: on_token('connecteur', chunk)) if on_token else None
+        return connecteur, responses, connecteur_on_token
+
+    def _connecteur_error(self, stage, error: Exception) -> str:
+        self.logger.error(f"Erreur de traitement Connecteur : {str(error)}", exc_info=True)
+        stage.status = 'error'
+        return f"Erreur Connecteur : {str(error)}"
+
+    def _announce_synthesis(self, on_progress: Optional[Callable] = None):
+        """Annonce la synthèse ; une erreur de l'affichage n'interrompt pas la requête"""
+        if on_progress:
             try:
-                # Soumission des tâches
-                for role in roles:
-                    if role in self.VALID_ROLES:
-                        if on_progress:
-                            role_name = self.VALID_ROLES[role][0]
-                            on_progress(f"🚀 Démarrage {role_name}...")
-                        
-                        future = self.executor.submit(
-                            self._run_agent_task,
-                            role,
-                            input_text,
-                            on_progress
-                        )
-                        futures[future] = role
-                        self.logger.debug(f"Tâche soumise pour {role}")
-
-                # Collecte des résultats avec gestion du timeout
+                on_progress("📝 Résumé en cours...")
+            except Exception as e:
+                self.logger.error(f"Erreur lors de la mise à jour de la progression : {str(e)}")
+
+    def _execute_parallel_processing(self, input_text: str, roles: List[str], on_progress: Optional[Callable] = None,
+                                     on_token: Optional[Callable[[str, str], None]] = None,
+                                     on_result: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """Soumet un rôle par tâche à l'ordonnanceur partagé et collecte les résultats"""
+        request_id = self.scheduler.new_request_id()
+        cancel_events = {}
+        futures = self._submit_roles(request_id, roles, input_text, on_progress, on_token, cancel_events)
+        return self._collect_results(request_id, futures, on_result, cancel_events)
+
+    def _partial_summarizer(self, input_text: str, roles: List[str],
+                            on_result: Optional[Callable[[str, str], None]] = None,
+                            request_id: Optional[int] = None) -> Tuple[Optional[Callable[[str, str], None]], Dict[str, Future]]:
+        """
+        Retourne le callback appelé dès qu'un rôle termine, et le dictionnaire (nom de rôle -> Future)
+        des résumés partiels rempli au fil de l'eau. En mode pipeline du Connecteur local, le callback
+        lance le résumé partiel du rôle (sous la requête `request_id` de l'ordonnanceur) ; il transmet
+        ensuite la réponse au `on_result` de l'appelant.
+        """
+        request_id = request_id or self.scheduler.new_request_id()
+
+        def summarize(connecteur, response: dict) -> Future:
+            return self.scheduler.submit(request_id, 'connecteur', connecteur.summarize_response, input_text, response)
+
+        return self._summarizer(roles, on_result, summarize)
+
+    def _summarizer(self, roles: List[str], on_result: Optional[Callable[[str, str], None]],
+                    summarize: Callable) -> Tuple[Optional[Callable[[str, str], None]], Dict[str, object]]:
+        """
+        Partie commune de _partial_summarizer et _partial_summarizer_async : `summarize(connecteur,
+        réponse)` lance un résumé partiel et retourne son Future (ou sa tâche asyncio).
+        """
+        summaries = {}
+        connecteur = self.get_agent('connecteur')
+        pipeline = self.pipeline_synthesis and len(roles) > 1 and connecteur is not None and connecteur.mode == 'local'
+        if not pipeline and not on_result:
+            return None, summaries
+
+        def on_role_result(role: str, content: str):
+            role_name = self.VALID_ROLES.get(role, (role, None))[0]
+            if pipeline:
+                summaries[role_name] = summarize(connecteur, {"role": role_name, "response": content})
+            if on_result:
+                on_result(self.VALID_ROLES.get(role, ("Autre", None))[0], content)
+
+        return on_role_result, summaries
+
+    def _submit_roles(self, request_id: int, roles: List[str], input_text: str,
+                      on_progress: Optional[Callable] = None,
+                      on_token: Optional[Callable[[str, str], None]] = None,
+                      cancel_events: Optional[Dict[str, threading.Event]] = None) -> Dict[Future, str]:
+        """Soumet les tâches des rôles valides ; `cancel_events` reçoit l'événement d'annulation de chacun"""
+        futures = {}
+        for role in roles:
+            if role in self.VALID_ROLES:
+                if on_progress:
+                    role_name = self.VALID_ROLES[role][0]
+                    on_progress(f"🚀 Démarrage {role_name}...")
+
+                cancel_event = threading.Event()
+                if cancel_events is not None:
+                    cancel_events[role] = cancel_event
+
+                future = self.scheduler.submit(
+                    request_id,
+                    role,
+                    self._run_agent_task,
+                    role,
+                    input_text,
+                    on_progress,
+                    on_token,
+                    cancel_event
+                )
+                futures[future] = role
+                self.logger.debug(f"Tâche soumise pour {role}")
+        return futures
+
+    def _collect_results(self, request_id: int, futures: Dict[Future, str],
+                         on_result: Optional[Callable[[str, str], None]] = None,
+                         cancel_events: Optional[Dict[str, threading.Event]] = None) -> Dict[str, str]:
+        """
+        Collecte les résultats avec gestion du timeout ; `on_result` est appelé dès qu'un rôle termine.
+        Au timeout, les rôles encore en cours sont arrêtés via leur événement de `cancel_events`.
+        """
+        results = {}
+        try:
+            for future in as_completed(futures, timeout=self.request_timeout):
+                role = futures[future]
                 try:
-                    for future in as_completed(futures, timeout=200):
-                        role = futures[future]
-                        try:
-                            result = future.result()
-                            results[role] = result
-                        except Exception as e:
-                            results[role] = f"Erreur {role}: {str(e)}"
-                            self.logger.error(f"Erreur avec {role} : {str(e)}", exc_info=True)
-                
-                except TimeoutError:
-                    self.logger.warning("Timeout : certains agents n'ont pas terminé à temps")
-                    for future in futures:
-                        if not future.done():
-                            role = futures[future]
-                            results[role] = f"Timeout : {role} n'a pas terminé dans les 200 secondes"
-                
-            finally:
-                # Réinitialisation sélective de l'executor
-                if self.executor._work_queue.empty():  # pylint: disable=protected-access
-                    self.logger.debug("Nettoyage de l'executor")
-                    self.executor.shutdown(wait=False)
-                    self.executor = None
+                    result = future.result()
+                    results[role] = result
+                except Exception as e:
+                    results[role] = f"Erreur {role}: {str(e)}"
+                    self.logger.error(f"Erreur avec {role} : {str(e)}", exc_info=True)
+                if on_result:
+                    try:
+                        on_result(role, results[role])
+                    except Exception as e:
+                        self.logger.error(f"Erreur du traitement incrémental de {role} : {str(e)}", exc_info=True)
+
+        except FuturesTimeoutError:
+            self.logger.warning("Timeout : certains agents n'ont pas terminé à temps")
+            # Libère les places encore réservées par cette requête
+            self.scheduler.cancel_request(request_id)
+            for future in futures:
+                if not future.done():
+                    role = futures[future]
+                    # Le thread s'arrête au fragment suivant et rend sa place (pool, limiteur de débit)
+                    if cancel_events and role in cancel_events:
+                        cancel_events[role].set()
+                    results[role] = f"Timeout : {role} n'a pas terminé dans les {self.request_timeout:g} secondes"
 
         return self._format_results(results)
 
-    def _run_agent_task(self, role: str, input_text: str, on_progress: Optional[Callable] = None) -> str:
-        """Exécute une tâche avec notifications de progression"""
-        self.logger.info(f"Début du traitement par {role}")
+    def _report_detection(self, required_roles: List[str], on_progress: Optional[Callable] = None):
+        """Annonce les rôles retenus"""
+        if on_progress:
+            roles_str = ", ".join(self.VALID_ROLES.get(role, ("Inconnu",))[0] for role in required_roles)
+            on_progress(f"⚙️ {len(required_roles)} besoins détectés, utilisation de: {roles_str}")
+
+    def _speculate(self, input_text: str, max_speculative: Optional[int] = None,
+                   on_progress: Optional[Callable] = None) -> Tuple[List[str], bool]:
+        """Rôles les plus probables selon le classifieur local, et s'il est assez sûr de lui pour s'en passer du LLM"""
+        limit = max_speculative or int(os.getenv("ECHOPAGE_SPECULATIVE_ROLES", "2"))
+        candidates, confident = self.DetecteurBesoins.speculate(input_text, limit)
+        if confident:
+            self.logger.info(f"Rôles détectés : {candidates}")
+            self._report_detection(candidates, on_progress)
+        return candidates, confident
+
+    def _announce_speculation(self, candidates: List[str], on_progress: Optional[Callable] = None):
+        if candidates and on_progress:
+            on_progress("⚡ Démarrage anticipé : " + ", ".join(self.VALID_ROLES[role][0] for role in candidates))
+
+    def _confirmed_roles(self, required_roles, candidates: List[str], on_progress: Optional[Callable] = None) -> List[str]:
+        """Rôles retenus par le LLM ; à défaut, les rôles anticipés (ou la recherche)"""
+        if not isinstance(required_roles, list):
+            required_roles = []
+        if not required_roles:
+            self.logger.warning("Aucun rôle détecté, utilisation du fallback")
+            required_roles = candidates or ['recherche']
+        self._report_detection(required_roles, on_progress)
+        return required_roles
+
+    def process_request_speculative(self, input_text: str, on_progress: Optional[Callable] = None,
+                                    on_token: Optional[Callable[[str, str], None]] = None,
+                                    max_speculative: Optional[int] = None,
+                                    on_result: Optional[Callable[[str, str], None]] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Détecte les besoins et traite la requête en recouvrant les deux étapes.
+
+        Si le classifieur local est sûr de lui, ses rôles partent directement. Sinon les rôles les
+        plus probables démarrent pendant que le LLM tranche : ceux qu'il écarte sont annulés, ceux
+        qu'il confirme gardent leur avance.
+        """
+        candidates, confident = self._speculate(input_text, max_speculative, on_progress)
+        if confident:
+            return self.process_request(input_text, candidates, on_progress, on_token, on_result)
+
+        request_id = self.scheduler.new_request_id()
+        cancel_events = {}
+        futures = {}
         try:
-            role_name = self.VALID_ROLES[role][0]
+            self._announce_speculation(candidates, on_progress)
+            futures = self._submit_roles(request_id, candidates, input_text, on_progress, on_token, cancel_events)
+
+            required_roles = self._confirmed_roles(self.detect_roles(input_text), candidates, on_progress)
+
+            # Annule les paris perdus et lance les rôles non anticipés
+            for future, role in list(futures.items()):
+                if role not in required_roles:
+                    self.logger.info(f"Exécution spéculative de {role} annulée")
+                    cancel_events[role].set()
+                    future.cancel()
+                    del futures[future]
+            started = set(futures.values())
+            futures.update(self._submit_roles(
+                request_id,
+                [role for role in required_roles if role not in started],
+                input_text,
+                on_progress,
+                on_token,
+                cancel_events
+            ))
+
+            on_role_result, partial_summaries = self._partial_summarizer(input_text, required_roles, on_result,
+                                                                         request_id)
+            results = self._collect_results(request_id, futures, on_role_result, cancel_events)
+
+            if len(required_roles) > 1:
+                self._announce_synthesis(on_progress)
+                results['connecteur'] = self._run_connecteur(input_text, results, on_token, partial_summaries,
+                                                             request_id)
+
+            return results, required_roles
+
+        except Exception as e:
+            for event in cancel_events.values():
+                event.set()
+            self.scheduler.cancel_request(request_id)
+            self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
+            return self._create_error_response(str(e)), candidates
+
+    def _run_agent_task(self, role: str, input_text: str, on_progress: Optional[Callable] = None,
+                        on_token: Optional[Callable[[str, str], None]] = None,
+                        cancel_event: Optional[threading.Event] = None) -> str:
+        """
+        Exécute une tâche avec notifications de progression et streaming des fragments.
+        Si `cancel_event` est levé, la génération s'arrête au fragment suivant.
+        """
+        with span('role', role=role):
+            self.logger.info(f"Début du traitement par {role}")
+            try:
+                role_name = self.VALID_ROLES[role][0]
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled(role)
             
-            # Notifie le début du traitement
-            if on_progress:
-                on_progress(f"⚙️ {role_name} en cours...")
+                # Notifie le début du traitement
+                if on_progress:
+                    on_progress(f"⚙️ {role_name} en cours...")
             
-            agent = self.agents.get(role)
-            result = agent.execute(input_text)
+                agent = self.get_agent(role)
+                result = agent.execute(input_text, on_token=self._token_handler(role, on_progress, on_token, cancel_event))
             
-            # Notifie la réussite
-            if on_progress:
-                on_progress(f"✅ {role_name} terminé !")
+                # Notifie la réussite
+                if on_progress:
+                    on_progress(f"✅ {role_name} terminé !")
             
-            return result
+                return result
+            except GenerationCancelled:
+                self.logger.info(f"Traitement par {role} interrompu")
+                raise
+            except Exception as e:
+                # Notifie l'erreur
+                if on_progress:
+                    on_progress(f"❌ Erreur {self.VALID_ROLES[role][0]} : {str(e)}")
+                raise
+
+    def _token_handler(self, role: str, on_progress: Optional[Callable] = None,
+                       on_token: Optional[Callable[[str, str], None]] = None,
+                       cancel_event: Optional[threading.Event] = None) -> Callable[[str], None]:
+        """Relaie les fragments d'un rôle et signale l'arrivée du premier (time-to-first-token)"""
+        role_name = self.VALID_ROLES[role][0]
+        first_token = threading.Event()
+
+        def handle_token(chunk: str):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled(role)
+            if not first_token.is_set():
+                first_token.set()
+                if on_progress:
+                    on_progress(f"✍️ {role_name} rédige...")
+            if on_token:
+                on_token(role, chunk)
+
+        return handle_token
+
+    async def detect_roles_async(self, input_text: str):
+        """Version asynchrone de detect_roles"""
+        try:
+            required_roles = await self.DetecteurBesoins.detect_roles_async(input_text)
+            self.logger.info(f"Rôles détectés : {required_roles}")
+
+            return required_roles
+        except Exception as e:
+            self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
+            return self._create_error_response(str(e))
+
+    async def process_request_async(self, input_text: str, required_roles: List[str],
+                                    on_progress: Optional[Callable] = None,
+                                    on_token: Optional[Callable[[str, str], None]] = None,
+                                    role_timeouts: Optional[Dict[str, float]] = None,
+                                    on_result: Optional[Callable[[str, str], None]] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Version asynchrone de process_request : une coroutine par rôle au lieu d'un thread.
+
+        Chaque rôle a sa propre échéance (`role_timeouts`, puis "timeout" dans roles.json, puis
+        request_timeout). Un rôle en retard est réellement annulé (sa connexion HTTP est fermée)
+        sans pénaliser les autres, et annuler l'appelant annule tous les rôles en cours.
+        """
+        if not required_roles:
+            self.logger.warning("Aucun rôle détecté, utilisation du fallback")
+            required_roles = ['recherche']
+        on_role_result, partial_summaries = self._partial_summarizer_async(input_text, required_roles, on_result)
+        try:
+            roles = [role for role in required_roles if role in self.VALID_ROLES]
+            role_timeouts = role_timeouts or {}
+            outcomes = await asyncio.gather(*(
+                self._notify_result(
+                    role,
+                    self._run_agent_task_async(role, input_text, on_progress, on_token, role_timeouts.get(role)),
+                    on_role_result
+                )
+                for role in roles
+            ))
+            results = self._format_results(dict(zip(roles, outcomes)))
+
+            if len(required_roles) > 1:
+                self._announce_synthesis(on_progress)
+                results['connecteur'] = await self._run_connecteur_async(input_text, results, on_token, partial_summaries)
+
+            return results, required_roles
+
+        except Exception as e:
+            self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
+            return self._create_error_response(str(e)), required_roles
+        finally:
+            for task in partial_summaries.values():
+                task.cancel()
+
+    async def process_request_speculative_async(self, input_text: str, on_progress: Optional[Callable] = None,
+                                                on_token: Optional[Callable[[str, str], None]] = None,
+                                                max_speculative: Optional[int] = None,
+                                                role_timeouts: Optional[Dict[str, float]] = None,
+                                                on_result: Optional[Callable[[str, str], None]] = None) -> Tuple[Dict[str, str], List[str]]:
+        """Version asynchrone de process_request_speculative : les paris perdus sont annulés net"""
+        candidates, confident = self._speculate(input_text, max_speculative, on_progress)
+        if confident:
+            return await self.process_request_async(input_text, candidates, on_progress, on_token, role_timeouts, on_result)
+
+        role_timeouts = role_timeouts or {}
+        tasks = {}
+        on_role_result, partial_summaries = None, {}
+
+        def start(role: str):
+            tasks[role] = asyncio.ensure_future(self._notify_result(
+                role,
+                self._run_agent_task_async(role, input_text, on_progress, on_token, role_timeouts.get(role)),
+                lambda role, content: on_role_result and on_role_result(role, content)
+            ))
+
+        try:
+            self._announce_speculation(candidates, on_progress)
+            for role in candidates:
+                start(role)
+
+            required_roles = self._confirmed_roles(await self.detect_roles_async(input_text), candidates, on_progress)
+            on_role_result, partial_summaries = self._partial_summarizer_async(input_text, required_roles, on_result)
+            # Les rôles anticipés déjà terminés sont transmis tout de suite
+            if on_role_result:
+                for role, task in tasks.items():
+                    if role in required_roles and task.done() and not task.cancelled():
+                        on_role_result(role, task.result())
+
+            rejected = [tasks.pop(role) for role in list(tasks) if role not in required_roles]
+            for task in rejected:
+                task.cancel()
+            await asyncio.gather(*rejected, return_exceptions=True)
+            for role in required_roles:
+                if role in self.VALID_ROLES and role not in tasks:
+                    start(role)
+
+            roles = list(tasks)
+            outcomes = await asyncio.gather(*(tasks[role] for role in roles))
+            results = self._format_results(dict(zip(roles, outcomes)))
+
+            if len(required_roles) > 1:
+                self._announce_synthesis(on_progress)
+                results['connecteur'] = await self._run_connecteur_async(input_text, results, on_token, partial_summaries)
+
+            return results, required_roles
+
         except Exception as e:
-            # Notifie l'erreur
+            self.logger.error(f"Erreur globale du traitement : {str(e)}", exc_info=True)
+            return self._create_error_response(str(e)), candidates
+        finally:
+            # Aucune tâche ne survit à la requête (annulation de l'appelant comprise)
+            for task in list(tasks.values()) + list(partial_summaries.values()):
+                task.cancel()
+
+    async def _run_agent_task_async(self, role: str, input_text: str, on_progress: Optional[Callable] = None,
+                                    on_token: Optional[Callable[[str, str], None]] = None,
+                                    timeout: Optional[float] = None) -> str:
+        """Exécute un rôle dans sa propre échéance ; les erreurs deviennent le texte du rôle"""
+        with span('role', role=role) as stage:
+            role_name = self.VALID_ROLES[role][0]
+            agent = self.get_agent(role)
+            timeout = timeout or agent.timeout or self.request_timeout
+
             if on_progress:
-                on_progress(f"❌ Erreur {self.VALID_ROLES[role][0]} : {str(e)}")
-            raise
+                on_progress(f"🚀 Démarrage {role_name}...")
+            try:
+                async with self._async_role_slot(role):
+                    self.logger.info(f"Début du traitement par {role}")
+                    if on_progress:
+                        on_progress(f"⚙️ {role_name} en cours...")
+                    result = await asyncio.wait_for(
+                        agent.execute_async(input_text, on_token=self._token_handler(role, on_progress, on_token)),
+                        timeout
+                    )
+
+                if on_progress:
+                    on_progress(f"✅ {role_name} terminé !")
+                return result
+
+            except asyncio.TimeoutError:
+                self.logger.warning(f"Timeout : {role} annulé après {timeout:g} secondes")
+                stage.status = 'timeout'
+                if on_progress:
+                    on_progress(f"⏱️ {role_name} annulé (délai dépassé)")
+                return f"Timeout : {role} n'a pas terminé dans les {timeout:g} secondes"
+            except Exception as e:
+                self.logger.error(f"Erreur avec {role} : {str(e)}", exc_info=True)
+                stage.status = 'error'
+                if on_progress:
+                    on_progress(f"❌ Erreur {role_name} : {str(e)}")
+                return f"Erreur {role}: {str(e)}"
+
+    async def _notify_result(self, role: str, awaitable, on_result: Optional[Callable[[str, str], None]] = None) -> str:
+        """Attend le résultat d'un rôle et le transmet aussitôt à `on_result`"""
+        result = await awaitable
+        if on_result:
+            try:
+                on_result(role, result)
+            except Exception as e:
+                self.logger.error(f"Erreur du traitement incrémental de {role} : {str(e)}", exc_info=True)
+        return result
+
+    def _partial_summarizer_async(self, input_text: str, roles: List[str],
+                                  on_result: Optional[Callable[[str, str], None]] = None) -> Tuple[Optional[Callable[[str, str], None]], Dict[str, asyncio.Task]]:
+        """Version asynchrone de _partial_summarizer : un résumé partiel est une tâche de la boucle courante"""
+        def summarize(connecteur, response: dict) -> asyncio.Task:
+            return asyncio.ensure_future(self._summarize_async(connecteur, input_text, response))
+
+        return self._summarizer(roles, on_result, summarize)
+
+    async def _summarize_async(self, connecteur, input_text: str, response: dict) -> str:
+        """Résumé partiel d'un rôle, sous le plafond de concurrence du Connecteur"""
+        async with self._async_role_slot('connecteur'):
+            return await connecteur.summarize_response_async(input_text, response)
+
+    @contextlib.asynccontextmanager
+    async def _async_role_slot(self, role: str):
+        """Applique le plafond "max_concurrency" du rôle dans la boucle d'événements courante"""
+        limit = self.scheduler.role_limits.get(role)
+        if not limit:
+            yield
+            return
+        semaphores = self._async_role_semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.setdefault(role, asyncio.Semaphore(limit))
+        async with semaphore:
+            yield
+
+    async def _run_connecteur_async(self, input_text: str, agent_results: Dict[str, str],
+                                    on_token: Optional[Callable[[str, str], None]] = None,
+                                    partial_summaries: Optional[Dict[str, asyncio.Task]] = None) -> str:
+        """Version asynchrone de _run_connecteur : au-delà du délai, résumés et synthèse sont annulés"""
+        with span('connecteur', roles=len(agent_results)) as stage:
+            timeout = None
+            try:
+                connecteur, responses, connecteur_on_token = self._connecteur_inputs(agent_results, on_token)
+                timeout = connecteur.timeout or self.request_timeout
+                result = await asyncio.wait_for(
+                    self._connect_async(connecteur, input_text, responses, connecteur_on_token, partial_summaries),
+                    timeout
+                )
+                self.logger.info("Le Connecteur a terminé avec succès")
+                return result
+
+            except asyncio.TimeoutError:
+                return self._connecteur_timeout(stage, timeout)
+            except Exception as e:
+                return self._connecteur_error(stage, e)
+
+    async def _connect_async(self, connecteur, input_text: str, responses: List[dict],
+                             on_token: Optional[Callable[[str], None]] = None,
+                             partial_summaries: Optional[Dict[str, asyncio.Task]] = None) -> str:
+        """Résumés partiels manquants puis synthèse (pipeline), ou Connecteur complet"""
+        if partial_summaries:
+            summaries = await asyncio.gather(*(
+                partial_summaries.get(resp["role"]) or self._summarize_async(connecteur, input_text, resp)
+                for resp in responses
+            ))
+            return await connecteur.synthesize_async(input_text, list(summaries), on_token)
+        return await connecteur.execute_async(input_text, responses, on_token=on_token)
 
     def _format_results(self, raw_results: Dict[str, str]) -> Dict[str, str]:
         """Formate les résultats pour l'affichage final"""
@@ -182,12 +786,17 @@ class AgentManager:
     def _create_error_response(self, error_msg: str) -> Dict[str, str]:
         """Crée une réponse d'erreur standardisée"""
         return {
-            "🚨 Erreur Système": (
+            self.ERROR_RESPONSE_KEY: (
                 "Une erreur critique est survenue. "
                 f"Détails techniques : {error_msg[:200]}..."
             )
         }
 
+    @classmethod
+    def is_error_response(cls, results: Dict[str, str]) -> bool:
+        """Vrai si `results` est la réponse d'erreur de _create_error_response (échec de toute la requête)"""
+        return cls.ERROR_RESPONSE_KEY in results
+
     def list_agents(self) -> Dict[str, str]:
         """Retourne la liste des agents disponibles avec description"""
         return {
@@ -195,8 +804,19 @@ class AgentManager:
             for role, details in self.VALID_ROLES.items()
         }
 
+    def metrics_summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99, nombre et durée cumulée de chaque étape du pipeline, en secondes"""
+        metrics = get_metrics()
+        return {
+            stage: metrics.percentiles(f"{stage}_seconds")
+            for stage in ('request', 'detection', 'role', 'generation', 'connecteur', 'report')
+        }
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Retourne les compteurs du cache de réponses partagé"""
+        return get_response_cache().stats()
+
     def shutdown(self):
         """Nettoie les ressources de manière sécurisée"""
-        if self.executor and not self.executor._shutdown:
-            self.logger.info("Arrêt propre de l'executor")
-            self.executor.shutdown(wait=True)
\ No newline at end of file
+        self.logger.info("Arrêt propre de l'executor")
+        self.scheduler.shutdown(wait=True)
\ No newline at end of file
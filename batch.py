@@ -0,0 +1,384 @@
+#batch.py
+"""
+Mode batch sans interface graphique.
+
+Lit des requêtes ligne par ligne (fichier JSONL ou entrée standard), les traite en
+parallèle via AgentManager et écrit un rapport HTML par requête ainsi qu'une ligne
+de résultat (rôles, rapport, durées) dans un fichier JSONL.
+
+Exemples :
+    python batch.py --input requests.jsonl --concurrency 4
+    cat demandes.txt | python batch.py --input - --results resultats.jsonl
+    python batch.py --async --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, TextIO
+
+from startup_profile import StartupProfile
+
+STARTUP = StartupProfile()
+
+from agent_manager import AgentManager
+from report import ASSET_FORMATS, ReportWriter, archive_reports
+from report_index import get_report_index
+from roles.metrics import configure_metrics, get_metrics, span
+
+STARTUP.mark("imports")
+
+DEFAULT_OUTPUT_DIR = os.path.expanduser("~/Assistant_Outputs")
+
+
+def read_requests(stream: TextIO) -> Iterator[Dict[str, str]]:
+    """
+    Lit les requêtes au fil de l'eau.
+
+    Chaque ligne est soit un objet JSON (clé 'prompt', 'text' ou 'body', identifiant
+    optionnel 'request_id' ou 'id'), soit directement le texte de la demande.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            data = line
+
+        if isinstance(data, dict):
+            prompt = data.get("prompt") or data.get("text") or data.get("body") or ""
+            request_id = str(data.get("request_id") or data.get("id") or line_number)
+        else:
+            prompt = str(data)
+            request_id = str(line_number)
+
+        yield {"request_id": request_id, "prompt": prompt.strip()}
+
+
+class BatchRunner:
+    def __init__(self, concurrency: int = 4, output_dir: str = DEFAULT_OUTPUT_DIR,
+                 results_path: Optional[str] = None, workers: Optional[int] = None, warm_up: bool = True,
+                 report_assets: Optional[str] = None, reuse_reports: bool = False):
+        """
+        :param concurrency: Nombre maximal de requêtes traitées en même temps.
+        :param output_dir: Dossier des rapports HTML.
+        :param results_path: Fichier JSONL des résultats (dans output_dir par défaut).
+        :param workers: Taille du pool d'agents partagé par toutes les requêtes.
+        :param warm_up: Recharge les modèles locaux avant le batch.
+        :param report_assets: 'inline' ou 'linked' (styles et scripts partagés par tous les rapports du dossier).
+        :param reuse_reports: Réutilise le rapport existant d'une demande quasi identique au lieu de la relancer.
+        """
+        self.concurrency = max(1, concurrency)
+        self.warm_up = warm_up
+        self.output_dir = output_dir
+        self.report_assets = report_assets
+        self.reuse_reports = reuse_reports
+        self.results_path = results_path or os.path.join(
+            output_dir, f"batch-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        )
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.results_lock = threading.Lock()
+        self.manager = AgentManager(max_workers=workers)
+
+    def run(self, requests: Iterator[Dict[str, str]]) -> Dict[str, float]:
+        """Traite toutes les requêtes et retourne un résumé du batch"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.warm_up:
+            self.manager.warm_up()
+        slots = threading.BoundedSemaphore(self.concurrency)
+        summary = {"total": 0, "ok": 0, "errors": 0}
+        start = time.perf_counter()
+
+        def on_done(future):
+            slots.release()
+            with self.results_lock:
+                self._count(summary, future.result())
+
+        with open(self.results_path, "a", encoding="utf-8") as results_file, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for request in self._non_empty(requests):
+                # Ne lit la ligne suivante que lorsqu'une place se libère
+                slots.acquire()
+                summary["total"] += 1
+                future = executor.submit(self._process, request, results_file)
+                future.add_done_callback(on_done)
+
+        return self._end(summary, start)
+
+    async def run_async(self, requests: Iterator[Dict[str, str]]) -> Dict[str, float]:
+        """Variante asynchrone de run : chaque requête en cours coûte une coroutine, pas un thread"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.warm_up:
+            await asyncio.to_thread(self.manager.warm_up)
+        slots = asyncio.Semaphore(self.concurrency)
+        summary = {"total": 0, "ok": 0, "errors": 0}
+        start = time.perf_counter()
+        tasks = set()
+
+        async def process(request):
+            try:
+                self._count(summary, await self._process_async(request, results_file))
+            finally:
+                slots.release()
+
+        with open(self.results_path, "a", encoding="utf-8") as results_file:
+            for request in self._non_empty(requests):
+                await slots.acquire()
+                summary["total"] += 1
+                task = asyncio.ensure_future(process(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        return self._end(summary, start)
+
+    def _process(self, request: Dict[str, str], results_file: TextIO) -> Dict[str, object]:
+        """Traite une requête et écrit sa ligne de résultat"""
+        with span('request', request_id=request["request_id"]) as stage:
+            run = BatchRequest(self, request, stage)
+            try:
+                if not run.reuse_existing():
+                    # Le rapport s'écrit au fil de l'eau : une section par rôle dès qu'il termine
+                    report = run.open_report()
+                    with run.step("detection"):
+                        roles = run.detected(self.manager.detect_roles(run.prompt))
+                    with run.step("processing"):
+                        responses, roles = self.manager.process_request(run.prompt, roles,
+                                                                        on_result=report.add_section)
+                    run.finish(responses, roles)
+            except Exception as e:
+                run.fail(e)
+            return run.close(results_file)
+
+    async def _process_async(self, request: Dict[str, str], results_file: TextIO) -> Dict[str, object]:
+        """Version asynchrone de _process"""
+        with span('request', request_id=request["request_id"]) as stage:
+            run = BatchRequest(self, request, stage)
+            try:
+                if not run.reuse_existing():
+                    report = run.open_report()
+                    with run.step("detection"):
+                        roles = run.detected(await self.manager.detect_roles_async(run.prompt))
+                    with run.step("processing"):
+                        responses, roles = await self.manager.process_request_async(run.prompt, roles,
+                                                                                    on_result=report.add_section)
+                    run.finish(responses, roles)
+            except Exception as e:
+                run.fail(e)
+            return run.close(results_file)
+
+    def _non_empty(self, requests: Iterator[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        """Requêtes à traiter, sans les demandes vides"""
+        for request in requests:
+            if not request["prompt"]:
+                self.logger.warning(f"Requête {request['request_id']} vide, ignorée")
+                continue
+            yield request
+
+    @staticmethod
+    def _count(summary: Dict[str, float], result: Dict[str, object]):
+        """Compte une requête terminée dans le résumé du batch"""
+        summary["ok" if result.get("status") == "ok" else "errors"] += 1
+
+    def _end(self, summary: Dict[str, float], start: float) -> Dict[str, float]:
+        """Libère les agents et journalise le résumé du batch"""
+        self.manager.shutdown()
+
+        summary["duration"] = round(time.perf_counter() - start, 3)
+        self.logger.info(f"Batch terminé : {summary} -> {self.results_path}")
+        self._log_stages()
+        return summary
+
+    def _log_stages(self):
+        """Journalise la répartition du temps entre les étapes du pipeline"""
+        for stage, values in self.manager.metrics_summary().items():
+            if values["count"]:
+                self.logger.info(
+                    f"Étape {stage} : p50 {values['p50']:.3f} s, p95 {values['p95']:.3f} s, "
+                    f"p99 {values['p99']:.3f} s ({values['count']} mesures)"
+                )
+
+    def _existing_report(self, prompt: str) -> Optional[Dict[str, object]]:
+        """Rapport déjà généré pour une demande quasi identique (si reuse_reports est actif)"""
+        index = get_report_index() if self.reuse_reports else None
+        existing = index.find_similar(prompt) if index else None
+        if existing:
+            self.logger.info(f"Demande déjà traitée (similarité {existing['similarity']}) : {existing['path']}")
+        return existing
+
+    def _write_result(self, result: Dict[str, object], results_file: TextIO):
+        """Ajoute une ligne au fichier de résultats"""
+        with self.results_lock:
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results_file.flush()
+
+
+class BatchRequest:
+    """
+    État d'une requête du batch (ligne de résultat, durées, rapport), partagé par
+    _process et _process_async : seuls les appels à AgentManager diffèrent entre les deux.
+    """
+
+    def __init__(self, runner: BatchRunner, request: Dict[str, str], stage):
+        self.runner = runner
+        self.stage = stage
+        self.request_id, self.prompt = request["request_id"], request["prompt"]
+        self.result = {"request_id": self.request_id, "prompt": self.prompt,
+                       "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "trace_id": stage.trace_id}
+        self.timings = {}
+        self.report = None
+        self.responses = {}
+        self.start = time.perf_counter()
+
+    def reuse_existing(self) -> bool:
+        """Reprend le rapport d'une demande quasi identique ; faux s'il faut traiter la requête"""
+        existing = self.runner._existing_report(self.prompt)
+        if not existing:
+            return False
+        self.stage.set(reused=True)
+        self.result.update({"status": "ok", "roles": existing["roles"], "report": existing["path"], "reused": True})
+        return True
+
+    def open_report(self) -> ReportWriter:
+        self.report = ReportWriter(self.prompt, self.runner.output_dir,
+                                   name=f"{time.strftime('%Y%m%d-%H%M%S')}-{self.request_id}",
+                                   assets=self.runner.report_assets)
+        return self.report
+
+    @contextmanager
+    def step(self, name: str):
+        """Chronomètre une étape dans les durées de la ligne de résultat"""
+        start = time.perf_counter()
+        yield
+        self.timings[name] = round(time.perf_counter() - start, 3)
+
+    def detected(self, required_roles) -> List[str]:
+        """Rôles détectés ; la réponse d'erreur de la détection fait échouer la requête"""
+        if isinstance(required_roles, dict) and self.runner.manager.is_error_response(required_roles):
+            raise RuntimeError(required_roles[self.runner.manager.ERROR_RESPONSE_KEY])
+        return required_roles if isinstance(required_roles, list) else []
+
+    def finish(self, responses: Dict[str, str], roles: List[str]):
+        """Termine le rapport ; la requête est en erreur si AgentManager a retourné sa réponse d'erreur"""
+        self.responses = responses
+        failed = self.runner.manager.is_error_response(responses)
+        with self.step("report"):
+            filename = self.report.finish(responses, roles=roles, timings=self.timings,
+                                          models=self.runner.manager.role_models(roles), failed=failed)
+        self.result.update({"roles": roles, "report": filename})
+        if failed:
+            self.result.update({"status": "error",
+                                "error": responses[self.runner.manager.ERROR_RESPONSE_KEY]})
+            self.stage.status = 'error'
+        else:
+            self.result["status"] = "ok"
+
+    def fail(self, error: Exception):
+        self.runner.logger.error(f"Erreur sur la requête {self.request_id} : {str(error)}", exc_info=True)
+        self.result.update({"status": "error", "error": str(error)})
+        self.stage.status = 'error'
+        if self.report:
+            self.report.finish(self.responses, failed=True)
+
+    def close(self, results_file: TextIO) -> Dict[str, object]:
+        """Écrit la ligne de résultat de la requête"""
+        if not self.result.get("reused"):
+            self.timings["total"] = round(time.perf_counter() - self.start, 3)
+            self.result["timings"] = self.timings
+        self.runner._write_result(self.result, results_file)
+        return self.result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Traitement en batch des demandes, sans interface graphique.")
+    parser.add_argument("--input", default="requests.jsonl",
+                        help="Fichier JSONL des demandes, ou '-' pour l'entrée standard (défaut : requests.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("ECHOPAGE_BATCH_CONCURRENCY", "4")),
+                        help="Nombre de demandes traitées en parallèle")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Nombre de threads d'agents partagés (ECHOPAGE_MAX_WORKERS par défaut)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Dossier des rapports HTML")
+    parser.add_argument("--results", default=None, help="Fichier JSONL des résultats et durées")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Utilise le pipeline asyncio (une coroutine par appel LLM au lieu d'un thread)")
+    parser.add_argument("--no-warm-up", dest="warm_up", action="store_false",
+                        help="Ne précharge pas les modèles Ollama avant le batch")
+    parser.add_argument("--report-assets", choices=ASSET_FORMATS, default=None,
+                        help="Styles et scripts intégrés à chaque rapport (inline) ou partagés dans le dossier (linked)")
+    parser.add_argument("--archive-days", type=float,
+                        default=float(os.getenv("ECHOPAGE_REPORT_ARCHIVE_DAYS", "0")),
+                        help="Compresse en .html.gz les rapports plus anciens que ce nombre de jours (0 : désactivé)")
+    parser.add_argument("--reuse-reports", action="store_true",
+                        help="Ne relance pas une demande quasi identique à une demande déjà traitée (index des rapports)")
+    parser.add_argument("--trace", default=os.getenv("ECHOPAGE_TRACE_PATH"),
+                        help="Fichier JSONL des traces (une ligne par étape chronométrée)")
+    parser.add_argument("--metrics", default=os.getenv("ECHOPAGE_METRICS_PATH"),
+                        help="Fichier texte Prometheus des durées par étape (p50/p95/p99)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("ECHOPAGE_METRICS_PORT", "0")),
+                        help="Expose les métriques sur http://127.0.0.1:PORT/metrics pendant le batch")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Affiche la durée de chaque étape du démarrage puis quitte sans traiter de demande")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("app.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        output_dir=os.path.expanduser(args.output_dir),
+        results_path=args.results,
+        workers=args.workers,
+        warm_up=args.warm_up,
+        report_assets=args.report_assets,
+        reuse_reports=args.reuse_reports
+    )
+    STARTUP.mark("AgentManager")
+    if args.profile_startup:
+        for role in runner.manager.VALID_ROLES:
+            try:
+                runner.manager.get_agent(role)
+            except ValueError as e:
+                print(f"{role} : {str(e)}", file=sys.stderr)
+        STARTUP.mark("agents (première utilisation)")
+        runner.manager.shutdown()
+        print(STARTUP.report(), file=sys.stderr)
+        return 0
+
+    configure_metrics(args.trace, args.metrics, args.metrics_port)
+    if args.archive_days > 0:
+        archived = archive_reports(runner.output_dir, args.archive_days)
+        if archived:
+            logging.info(f"{len(archived)} anciens rapports archivés (.html.gz)")
+
+    def run(requests):
+        if args.use_async:
+            return asyncio.run(runner.run_async(requests))
+        return runner.run(requests)
+
+    if args.input == "-":
+        summary = run(read_requests(sys.stdin))
+    else:
+        with open(args.input, "r", encoding="utf-8") as stream:
+            summary = run(read_requests(stream))
+    get_metrics().close()
+
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#bench_markdown.py
+"""
+Micro-benchmark du rendu Markdown des rapports : ancienne chaîne de re.sub contre
+markdown_renderer.render_markdown, sur des réponses de modèle de 100 Ko et plus.
+
+    python benchmarks/bench_markdown.py
+    python benchmarks/bench_markdown.py --sizes 100 400 1600 --repeat 5
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_renderer import render_markdown
+
+SAMPLE = """<think>
+L'utilisateur veut un plan. Je dois *structurer* la réponse et citer des **sources**.
+</think>
+### Objectif
+Organiser la semaine avec **priorités claires** et du temps pour *souffler*.
+
+- **Lundi** : bloc de 2 h sur le `projet A`
+- Mardi : réunions groupées, voir [le guide](https://example.com/guide)
+- Mercredi : *revue* **hebdomadaire**
+
+---
+1. Lister les tâches
+2. Estimer les durées (x < 3 h & y > 1 h)
+3. Planifier
+
+> Un plan réaliste vaut mieux qu'un plan parfait.
+
+Texte libre avec un ** marqueur orphelin et du code `a*b*c`.
+
+Pour tenir dans la durée, il vaut mieux prévoir des marges : une semaine chargée laisse rarement
+la place aux imprévus, et chaque réunion ajoutée grignote le temps de concentration. L'idée est
+de protéger deux ou trois créneaux longs, de regrouper les petites tâches administratives et de
+garder une soirée libre. Si un jour déborde, on reporte plutôt que de sacrifier le sommeil.
+"""
+
+
+def legacy_render(content: str) -> str:
+    """Ancienne chaîne de substitutions de save_to_html (référence)"""
+    formatted_content = re.sub(r'^---+(\s*)$', r'<hr>\1', content, flags=re.MULTILINE)
+    formatted_content = re.sub(r'^(#{3})\s*(.*)$', r'<h3>\2</h3>', formatted_content, flags=re.MULTILINE)
+    formatted_content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', formatted_content)
+    formatted_content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', formatted_content)
+    formatted_content = re.sub(r'`(.*?)`', r'<code>\1</code>', formatted_content)
+
+    def list_replacer(match):
+        items = match.group(0).strip().split("\n")
+        items = [f"<li>{item[2:]}</li>" for item in items]
+        return f"<ul>{''.join(items)}</ul>"
+
+    formatted_content = re.sub(r'(?:^-\s.*\n?)+', list_replacer, formatted_content, flags=re.MULTILINE)
+    return re.sub(
+        r'(</(?:li|h[1-6]|p|blockquote)>)?\n(?!<)',
+        lambda m: (m.group(1) + "\n") if m.group(1) is not None else '<br>',
+        formatted_content
+    )
+
+
+def make_document(kilobytes: int) -> str:
+    """Réponse synthétique d'au moins `kilobytes` Ko"""
+    copies = kilobytes * 1024 // len(SAMPLE.encode("utf-8")) + 1
+    return SAMPLE * copies
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark du rendu Markdown des rapports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400, 1600], help="Tailles en Ko")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre de mesures par taille (meilleure retenue)")
+    args = parser.parse_args(argv)
+
+    print(f"{'taille':>8} {'ancien (ms)':>12} {'nouveau (ms)':>13} {'gain':>6} {'Mo/s':>7}")
+    for size in args.sizes:
+        document = make_document(size)
+        legacy = min(timeit.repeat(lambda: legacy_render(document), number=1, repeat=args.repeat))
+        current = min(timeit.repeat(lambda: render_markdown(document), number=1, repeat=args.repeat))
+        throughput = len(document.encode("utf-8")) / current / 1e6
+        print(f"{size:>6}Ko {legacy * 1000:>12.1f} {current * 1000:>13.1f} {legacy / current:>5.1f}x {throughput:>7.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+#bench_pipeline.py
+"""
+Benchmark de bout en bout : détection des besoins, rôles, Connecteur et rapport HTML,
+contre le serveur simulé de mock_llm_server.py (lancé dans un processus à part pour ne
+fausser ni le nombre de threads ni la mémoire mesurés).
+
+    python benchmarks/bench_pipeline.py --requests 40 --concurrency 8
+    python benchmarks/bench_pipeline.py --latency 0.5 --tokens-per-second 30 --rate-limit-rate 0.1
+    python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --compare benchmarks/baseline.json
+
+Mesures : débit (requêtes/s), percentiles de latence par requête et par étape, pic de
+threads et pic de mémoire (RSS) du processus.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_llm_server import add_server_arguments, server_options
+
+PROMPTS = [
+    "Je suis stressé au travail et je n'arrive plus à dormir, que faire ?",
+    "Aide-moi à organiser ma semaine entre deux projets et mes enfants.",
+    "J'ai besoin d'idées originales pour l'anniversaire de ma sœur.",
+    "Comment préparer un entretien pour un poste de chef de projet ?",
+    "Je veux reprendre le sport après une blessure au genou.",
+    "Quelles sont les dernières recherches sur le sommeil et la mémoire ?",
+]
+
+# Métriques comparées aux références : (clé, sens de l'amélioration)
+COMPARED = [("throughput", 1), ("latency.p50", -1), ("latency.p95", -1), ("latency.p99", -1),
+            ("threads_peak", -1), ("peak_rss_mb", -1)]
+
+
+def start_mock(args: argparse.Namespace) -> subprocess.Popen:
+    """Lance le serveur simulé dans un sous-processus et attend son adresse"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "mock_llm_server.py"), *server_options(args)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError("Le serveur simulé n'a pas démarré")
+    args.mock_url = url
+    return process
+
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """Oriente l'application vers le serveur simulé, à faire avant d'importer agent_manager"""
+    os.environ["OLLAMA_HOST"] = args.mock_url
+    os.environ["TOGETHER_BASE_URL"] = args.mock_url.rstrip("/") + "/v1"
+    os.environ["TOGETHER_API_KEY"] = "mock"
+    # Ni cache de réponses, ni index des rapports, ni historique de détection réel
+    os.environ["ECHOPAGE_CACHE"] = "1" if args.cache else "0"
+    os.environ["ECHOPAGE_REPORT_INDEX"] = "0"
+    os.environ["ECHOPAGE_DETECTION_HISTORY"] = os.path.join(workdir, "detections.jsonl")
+    os.environ.setdefault("ECHOPAGE_TOGETHER_RPM", "0")
+    if args.llm_detection:
+        # Confiance impossible à atteindre : la détection passe toujours par le LLM
+        os.environ["ECHOPAGE_DETECTION_CONFIDENCE"] = "2"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus, en Mo (None si indisponible)"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets sous Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _windows_peak_rss_mb() -> Optional[float]:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class ThreadSampler:
+    """Relève régulièrement le nombre de threads actifs et garde le maximum"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="thread-sampler", daemon=True)
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.thread.join()
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (rang le plus proche), moyenne et maximum"""
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    result = {f"p{int(q * 100)}": round(ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)], 4)
+              for q in (0.5, 0.95, 0.99)}
+    result.update(mean=round(sum(ordered) / len(ordered), 4), max=round(ordered[-1], 4))
+    return result
+
+
+def run_benchmark(args: argparse.Namespace, workdir: str) -> dict:
+    """Traite `args.requests` demandes, `args.concurrency` à la fois, et retourne les mesures"""
+    from agent_manager import AgentManager
+    from report import save_to_html
+    from roles.metrics import get_metrics
+
+    manager = AgentManager(max_workers=args.workers)
+    output_dir = args.output_dir or os.path.join(workdir, "reports")
+    timings = []
+    errors = []
+
+    def process(index: int):
+        prompt = PROMPTS[index % len(PROMPTS)]
+        started = time.perf_counter()
+        try:
+            roles = manager.detect_roles(prompt)
+            if not isinstance(roles, list) or not roles:
+                roles = list(args.detection_roles)
+            detected = time.perf_counter()
+            responses, roles = manager.process_request(prompt, roles, on_progress=lambda message: None)
+            processed = time.perf_counter()
+            save_to_html(prompt, responses, output_dir, name=f"bench-{index}")
+            finished = time.perf_counter()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {str(e)[:200]}")
+            return
+        timings.append({"detection": detected - started, "processing": processed - detected,
+                        "report": finished - processed, "total": finished - started})
+
+    # Une requête hors mesure : imports paresseux, clients HTTP et agents créés
+    if args.warm_up:
+        process(-1)
+        timings.clear()
+
+    with ThreadSampler() as sampler, ThreadPoolExecutor(args.concurrency) as pool:
+        started = time.perf_counter()
+        list(pool.map(process, range(args.requests)))
+        duration = time.perf_counter() - started
+
+    stages = manager.metrics_summary()
+    # Appels aux backends terminés en erreur (spans "generation" des métriques partagées)
+    failed_calls = get_metrics().percentiles("generation_seconds", status="error")["count"]
+    manager.shutdown()
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "completed": len(timings),
+        "errors": len(errors),
+        "failed_backend_calls": failed_calls,
+        "duration": round(duration, 3),
+        "throughput": round(len(timings) / duration, 3) if duration else 0.0,
+        "latency": percentiles([timing["total"] for timing in timings]),
+        "steps": {step: percentiles([timing[step] for timing in timings])
+                  for step in ("detection", "processing", "report")},
+        "stages": stages,
+        "threads_peak": sampler.peak,
+        "peak_rss_mb": peak_rss_mb(),
+        "error_samples": errors[:5],
+    }
+
+
+def mock_stats(url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/mock/stats", timeout=5) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def lookup(results: dict, key: str) -> Optional[float]:
+    """Valeur d'une clé pointée ("latency.p95") dans les résultats"""
+    value = results
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Affiche l'écart avec la référence et retourne les métriques en régression"""
+    regressions = []
+    print(f"\n{'métrique':<16} {'référence':>11} {'mesure':>11} {'écart':>8}")
+    for key, direction in COMPARED:
+        before, after = lookup(baseline, key), lookup(results, key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        flag = ""
+        if change * direction < -tolerance:
+            regressions.append(key)
+            flag = "  ← régression"
+        print(f"{key:<16} {before:>11.3f} {after:>11.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def print_results(results: dict):
+    latency = results["latency"]
+    print(f"{results['completed']}/{results['requests']} requêtes en {results['duration']:.2f} s "
+          f"(concurrence {results['concurrency']}) : {results['throughput']:.2f} req/s")
+    print(f"latence : p50 {latency['p50']:.3f} s, p95 {latency['p95']:.3f} s, p99 {latency['p99']:.3f} s")
+    for step, values in results["steps"].items():
+        print(f"  {step:<12} p50 {values['p50']:.3f} s  p95 {values['p95']:.3f} s")
+    print(f"threads (pic) : {results['threads_peak']}, mémoire (pic) : {results['peak_rss_mb']} Mo")
+    print(f"erreurs : {results['errors']} requêtes, {results['failed_backend_calls']} appels aux backends")
+    if results.get("mock"):
+        print(f"serveur simulé : {results['mock']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout contre un serveur LLM simulé.")
+    parser.add_argument("--requests", type=int, default=24, help="Nombre de demandes traitées")
+    parser.add_argument("--concurrency", type=int, default=4, help="Demandes traitées en même temps")
+    parser.add_argument("--workers", type=int, default=None, help="Taille du pool partagé (ECHOPAGE_MAX_WORKERS)")
+    parser.add_argument("--llm-detection", action="store_true",
+                        help="Force la détection par le LLM au lieu du classifieur local")
+    parser.add_argument("--cache", action="store_true", help="Laisse le cache de réponses actif")
+    parser.add_argument("--no-warm-up", dest="warm_up", action="store_false",
+                        help="Compte aussi la première requête (imports, connexions)")
+    parser.add_argument("--mock-url", default=None, help="Serveur simulé déjà lancé (sinon un est démarré)")
+    parser.add_argument("--output-dir", default=None, help="Dossier des rapports (temporaire par défaut)")
+    parser.add_argument("--json", default=None, help="Écrit les résultats dans ce fichier JSON")
+    parser.add_argument("--save-baseline", default=None, help="Enregistre les résultats comme référence")
+    parser.add_argument("--compare", default=None, help="Compare les résultats à une référence")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les journaux de l'application")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    mock = None if args.mock_url else start_mock(args)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_environment(args, workdir)
+            results = run_benchmark(args, workdir)
+        results["mock"] = mock_stats(args.mock_url)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    results["environment"] = {"python": platform.python_version(), "platform": platform.platform(),
+                              "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    results["settings"] = {key: value for key, value in vars(args).items()
+                           if key not in ("json", "save_baseline", "compare", "tolerance", "mock_url", "output_dir",
+                                          "verbose")}
+    print_results(results)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"Résultats enregistrés dans {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            print("Attention : réglages différents de ceux de la référence")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+#mock_llm_server.py
+"""
+Serveur HTTP local qui se fait passer pour Ollama et Together, pour mesurer le pipeline
+sans modèle réel : latence avant le premier token, débit de tokens, taux d'erreurs et
+refus 429 réglables.
+
+    python benchmarks/mock_llm_server.py --port 11500 --latency 0.3 --tokens-per-second 40
+    OLLAMA_HOST=http://127.0.0.1:11500 TOGETHER_BASE_URL=http://127.0.0.1:11500/v1 python main.py
+
+Points d'accès : GET /api/tags, POST /api/generate (Ollama, NDJSON),
+POST /v1/chat/completions (Together/OpenAI, SSE) et GET /mock/stats (compteurs).
+Les demandes de détection des besoins reçoivent un JSON {"roles": [...]}, les autres
+une réponse Markdown précédée d'un bloc <think>.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+
+DEFAULT_MODELS = ["deepseek-r1:14b"]
+DEFAULT_DETECTION_ROLES = ["conseil", "organisation"]
+
+# Texte de remplissage des réponses simulées
+FILLER = (
+    "Pour avancer sereinement il vaut mieux **découper** le travail en étapes courtes, "
+    "garder des marges pour les *imprévus* et revoir le plan chaque semaine avec un regard neuf."
+).split()
+
+# Marqueur de la consigne de détection (roles/detecteur_besoins.py)
+DETECTION_MARKER = "UNIQUEMENT en JSON"
+
+
+class MockLLMServer:
+    """Faux backends Ollama et Together, servis dans un thread d'arrière-plan"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05,
+                 tokens_per_second: float = 200.0, response_tokens: int = 80, reasoning_tokens: int = 8,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 0.5, models: Optional[List[str]] = None,
+                 detection_roles: Optional[List[str]] = None, seed: Optional[int] = None):
+        """
+        :param host: Adresse d'écoute.
+        :param port: Port d'écoute (0 : port libre choisi par le système).
+        :param latency: Délai avant le premier token, en secondes.
+        :param tokens_per_second: Débit de chaque génération (0 : tout d'un coup).
+        :param response_tokens: Longueur des réponses simulées, en tokens (mots).
+        :param reasoning_tokens: Longueur du bloc <think> qui précède chaque réponse.
+        :param error_rate: Part des générations qui échouent (HTTP 500).
+        :param rate_limit_rate: Part des appels Together refusés (HTTP 429 avec Retry-After).
+        :param retry_after: Valeur de l'en-tête Retry-After des refus, en secondes.
+        :param models: Modèles annoncés par /api/tags.
+        :param detection_roles: Rôles renvoyés aux demandes de détection.
+        :param seed: Graine du tirage des erreurs (reproductibilité).
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.reasoning_tokens = reasoning_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.models = models or list(DEFAULT_MODELS)
+        self.detection_roles = detection_roles or list(DEFAULT_DETECTION_ROLES)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {'generate': 0, 'chat': 0, 'tags': 0, 'errors': 0, 'rate_limited': 0, 'tokens': 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        """Démarre le serveur en arrière-plan"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.server.serve_forever, name="mock-llm", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le serveur"""
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread = None
+        self.server.server_close()
+
+    def stats(self) -> dict:
+        """Nombre d'appels par point d'accès, d'erreurs injectées et de tokens envoyés"""
+        with self.lock:
+            return dict(self.counters)
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def _draw(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def completion(self, prompt: str) -> List[str]:
+        """Tokens de la réponse simulée à un prompt"""
+        if DETECTION_MARKER in prompt:
+            return [json.dumps({"roles": self.detection_roles})]
+        lines = ["<think>"] + [FILLER[i % len(FILLER)] + " " for i in range(self.reasoning_tokens)]
+        lines += ["</think>\n\n", "### ", "Plan\n"]
+        words = [FILLER[i % len(FILLER)] for i in range(self.response_tokens)]
+        for i, word in enumerate(words):
+            lines.append(word + ("\n- " if i % 16 == 15 else " "))
+        return lines
+
+    def paced(self, tokens: List[str]) -> Iterator[str]:
+        """Émet les tokens après la latence initiale, au débit configuré"""
+        time.sleep(self.latency)
+        started = time.perf_counter()
+        for i, token in enumerate(tokens):
+            if self.tokens_per_second > 0:
+                # Rythme calé sur l'horloge pour ne pas accumuler les retards de time.sleep
+                delay = started + i / self.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield token
+        self._count('tokens', len(tokens))
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 : les connexions restent ouvertes comme avec les vrais backends
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:
+                    # Connexion coupée par le client au milieu d'un flux (génération interrompue)
+                    pass
+
+            def _json(self, status: int, payload: dict, headers: Optional[dict] = None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, content_type: str, chunks: Iterator[bytes]):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        self.wfile.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Le client a fermé le flux (génération annulée)
+                    self.close_connection = True
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return {}
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    mock._count('tags')
+                    self._json(200, {"models": [{"name": name, "model": name} for name in mock.models]})
+                elif self.path.rstrip("/") == "/mock/stats":
+                    self._json(200, mock.stats())
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                request = self._body()
+                path = self.path.rstrip("/")
+                if path == "/api/generate":
+                    self._generate(request)
+                elif path.endswith("/chat/completions"):
+                    self._chat(request)
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def _generate(self, request: dict):
+                mock._count('generate')
+                model = request.get("model", mock.models[0])
+                prompt = request.get("prompt", "")
+                if not prompt:
+                    # Préchargement du modèle (agent_manager.warm_up)
+                    self._json(200, {"model": model, "response": "", "done": True, "load_duration": 0})
+                    return
+                if mock._draw(mock.error_rate):
+                    mock._count('errors')
+                    self._json(500, {"error": "erreur simulée"})
+                    return
+
+                tokens = mock.completion(prompt)
+                usage = {"prompt_eval_count": len(prompt) // 4, "eval_count": len(tokens)}
+                if request.get("stream", True) is False:
+                    started = time.perf_counter()
+                    text = "".join(mock.paced(tokens))
+                    usage["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+                    self._json(200, {"model": model, "response": text, "done": True, **usage})
+                    return
+
+                def lines():
+                    started = time.perf_counter()
+                    for token in mock.paced(tokens):
+                        yield json.dumps({"model": model, "response": token, "done": False}).encode("utf-8") + b"\n"
+                    usage["eval_duration"] = int((time.perf_counter() - started) * 1e9)
+                    yield json.dumps({"model": model, "response": "", "done": True, "done_reason": "stop",
+                                      **usage}).encode("utf-8") + b"\n"
+
+                self._stream("application/x-ndjson", lines())
+
+            def _chat(self, request: dict):
+                mock._count('chat')
+                if mock._draw(mock.rate_limit_rate):
+                    mock._count('rate_limited')
+                    self._json(429, {"error": {"message": "limite simulée", "type": "rate_limit"}},
+                               {"Retry-After": f"{mock.retry_after:g}"})
+                    return
+                if mock._draw(mock.error_rate):
+                    mock._count('errors')
+                    self._json(500, {"error": {"message": "erreur simulée", "type": "server_error"}})
+                    return
+
+                model = request.get("model", "mock")
+                prompt = "".join(str(message.get("content", "")) for message in request.get("messages", []))
+                tokens = mock.completion(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens),
+                         "total_tokens": len(prompt) // 4 + len(tokens)}
+                completion_id = f"mock-{uuid.uuid4().hex[:12]}"
+                if not request.get("stream"):
+                    self._json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(mock.paced(tokens))}}],
+                        "usage": usage
+                    })
+                    return
+
+                def events():
+                    base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                            "model": model}
+                    for token in mock.paced(tokens):
+                        chunk = dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": token},
+                                                     "finish_reason": None}])
+                        yield b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n"
+                    last = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}], usage=usage)
+                    yield b"data: " + json.dumps(last).encode("utf-8") + b"\n\n"
+                    yield b"data: [DONE]\n\n"
+
+                self._stream("text/event-stream", events())
+
+        return Handler
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """Options du serveur simulé, partagées avec bench_pipeline.py"""
+    parser.add_argument("--latency", type=float, default=0.05, help="Délai avant le premier token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Débit de chaque génération")
+    parser.add_argument("--response-tokens", type=int, default=80, help="Longueur des réponses simulées")
+    parser.add_argument("--reasoning-tokens", type=int, default=8, help="Longueur du bloc <think> de chaque réponse")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part des générations en erreur (500)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Part des appels Together refusés (429)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After des refus 429 (s)")
+    parser.add_argument("--detection-roles", nargs="+", default=DEFAULT_DETECTION_ROLES,
+                        help="Rôles renvoyés aux demandes de détection")
+    parser.add_argument("--seed", type=int, default=None, help="Graine du tirage des erreurs")
+
+
+def server_options(args: argparse.Namespace) -> List[str]:
+    """Options de ligne de commande équivalentes à `args` (pour lancer le serveur dans un autre processus)"""
+    options = ["--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+               "--response-tokens", str(args.response_tokens), "--reasoning-tokens", str(args.reasoning_tokens),
+               "--error-rate", str(args.error_rate),
+               "--rate-limit-rate", str(args.rate_limit_rate), "--retry-after", str(args.retry_after),
+               "--detection-roles", *args.detection_roles]
+    if args.seed is not None:
+        options += ["--seed", str(args.seed)]
+    return options
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Faux serveurs Ollama et Together pour les benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=0, help="Port d'écoute (0 : port libre)")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(host=args.host, port=args.port, latency=args.latency,
+                           tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens,
+                           reasoning_tokens=args.reasoning_tokens,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           retry_after=args.retry_after, detection_roles=args.detection_roles, seed=args.seed)
+    # Première ligne : l'adresse, lue par bench_pipeline.py
+    print(server.url, flush=True)
+    print(f"OLLAMA_HOST={server.url} TOGETHER_BASE_URL={server.url}/v1", file=sys.stderr, flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(json.dumps(server.stats()), file=sys.stderr, flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,24 @@
 #main.py
+from startup_profile import StartupProfile
+
+STARTUP = StartupProfile()
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import os
 import sys
 import subprocess
 import time
-import psutil
-import requests
 from agent_manager import AgentManager
+from report import ReportWriter, archive_reports, save_to_html
+from report_index import get_report_index
+from roles.metrics import span
 import threading
 from typing import Dict
 import logging
 import queue
-import re
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+STARTUP.mark("imports")
 
 # Configuration globale du logging
 logging.basicConfig(
@@ -39,6 +44,8 @@ class AIAssistantApp:
         self.loading = False
         self.check_and_start_ollama()
         self.setup_status()
+        self.warm_up_models()
+        self.archive_old_reports()
 
     def setup_status(self):
         """Configure la barre de statut initiale"""
@@ -48,74 +55,95 @@ class AIAssistantApp:
         """Met à jour la barre de statut de manière thread-safe"""
         self.status_bar.config(text=message)
         self.status_bar.update_idletasks()
-        
-    def check_and_start_ollama(self):
-        """Vérifie si Ollama est en cours d'exécution et le démarre si nécessaire"""
-        if not self.is_ollama_running():
-            self.status_bar['text'] = "Démarrage d'Ollama..."
-            self.root.update()
-            
-            try:
-                # Démarrer Ollama en mode serveur
-                ollama_path = "ollama"  # Adapter si nécessaire
-                subprocess.Popen([ollama_path, "serve"],
-                                 stdout=subprocess.DEVNULL,
-                                 stderr=subprocess.DEVNULL)
-
-                # Vérifier que le serveur répond bien
-                if self.wait_for_ollama():
-                    self.status_bar['text'] = "Ollama prêt !"
-                else:
-                    raise Exception("Le serveur Ollama ne répond pas après démarrage.")
 
-            except Exception as e:
-                messagebox.showerror(
-                    "Erreur Ollama", 
-                    f"Impossible de démarrer Ollama : {str(e)}\n"
-                    "Veuillez vous assurer qu'il est installé et accessible."
-                )
-                self.root.destroy()
-        else:
-            self.status_bar['text'] = "Prêt !"
-
-    def is_ollama_running(self):
-        """Vérifie si le processus Ollama est en cours d'exécution"""
-        for proc in psutil.process_iter(['name']):
-            if proc.info['name'] and 'ollama' in proc.info['name'].lower():
-                return True
-        return False
-
-    def wait_for_ollama(self, timeout=10):
-        """Attente active jusqu'à ce qu'Ollama réponde sur le port 11434"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
+    def warm_up_models(self):
+        """Précharge les modèles locaux en arrière-plan pour que la première demande ne paie pas leur chargement"""
+        def warm_up_task():
+            load_times = self.agent_manager.warm_up(
+                on_progress=lambda message: self.root.after(0, lambda: self._update_status(message))
+            )
+            loaded = [f"{model} ({seconds:g} s)" for model, seconds in load_times.items() if seconds >= 0]
+            if loaded:
+                message = "Prêt - Modèles chargés : " + ", ".join(loaded)
+            else:
+                message = "Prêt - Entrez votre demande ci-dessus"
+            self.root.after(0, lambda: self._update_status(message))
+
+        threading.Thread(target=warm_up_task, daemon=True).start()
+
+    def archive_old_reports(self):
+        """Compresse en arrière-plan les anciens rapports (ECHOPAGE_REPORT_ARCHIVE_DAYS, désactivé par défaut)"""
+        days = float(os.getenv("ECHOPAGE_REPORT_ARCHIVE_DAYS", "0"))
+        if days <= 0:
+            return
+
+        def archive_task():
             try:
-                response = requests.get("http://localhost:11434/api/tags")
-                if response.status_code == 200:
-                    return True
-            except requests.ConnectionError:
-                time.sleep(1)  # Attendre avant de réessayer
-        return False
+                archived = archive_reports(self.output_dir, days)
+                if archived:
+                    logging.info(f"{len(archived)} anciens rapports archivés (.html.gz)")
+            except OSError as e:
+                logging.error(f"Erreur lors de l'archivage des rapports : {str(e)}")
+
+        threading.Thread(target=archive_task, daemon=True).start()
         
-    def check_ollama_connection(self):
-        """Vérifie la connexion et la disponibilité des modèles"""
+    def check_and_start_ollama(self):
+        """
+        Surveille Ollama en arrière-plan et le démarre si la première vérification échoue.
+        L'interface n'attend jamais : l'état est mis à jour au fil des vérifications.
+        """
+        self.health = self.agent_manager.health
+        self.ollama_started = False
+        self.health.add_listener(lambda status: self.root.after(0, lambda: self.on_ollama_status(status)))
+        self.health.start()
+
+    def on_ollama_status(self, status: str):
+        """Réagit à un changement d'état d'Ollama (dans le thread de l'interface)"""
+        if status == 'up':
+            if self.ollama_started and not self.loading:
+                self._update_status("Ollama prêt !")
+        elif not self.ollama_started:
+            self.start_ollama()
+        elif not self.loading:
+            self._update_status("⚠️ Ollama injoignable, nouvelle vérification en arrière-plan...")
+
+    def start_ollama(self):
+        """Lance `ollama serve` sans attendre qu'il réponde (seulement si un rôle utilise Ollama)"""
+        if not self.agent_manager.local_models():
+            return
+        self.ollama_started = True
+        self._update_status("Démarrage d'Ollama...")
         try:
-            response = requests.get("http://localhost:11434/api/tags")
-            if response.status_code != 200:
-                return False
-            
-            # Vérifier la présence d'au moins un modèle
-            models = response.json().get('models', [])
-            if not models:
-                messagebox.showwarning(
-                    "Aucun modèle installé",
-                    "Veuillez installer au moins un modèle Ollama (ex: llama2)."
-                )
-                return False
-            
+            ollama_path = "ollama"  # Adapter si nécessaire
+            subprocess.Popen([ollama_path, "serve"],
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL)
+        except Exception as e:
+            messagebox.showerror(
+                "Erreur Ollama",
+                f"Impossible de démarrer Ollama : {str(e)}\n"
+                "Veuillez vous assurer qu'il est installé et accessible."
+            )
+            return
+        # Le serveur met un moment à démarrer : la surveillance repart du délai minimal
+        self.health.check_now()
+
+    def check_ollama_connection(self):
+        """Vérifie la disponibilité d'Ollama et de ses modèles à partir de l'état en cache (sans requête HTTP)"""
+        if not self.agent_manager.local_models():
             return True
-        except requests.ConnectionError:
+        if not self.health.is_ready():
+            self.health.check_now()
+            return False
+
+        # Vérifier la présence d'au moins un modèle
+        if not self.health.models:
+            messagebox.showwarning(
+                "Aucun modèle installé",
+                "Veuillez installer au moins un modèle Ollama (ex: llama2)."
+            )
             return False
+        return True
 
     def setup_styles(self):
         self.style = ttk.Style()
@@ -216,6 +244,9 @@ class AIAssistantApp:
         if not prompt:
             messagebox.showwarning("Requête vide", "Veuillez décrire vos besoins dans la zone de texte.")
             return
+
+        if self.open_existing_report(prompt):
+            return
             
         self.toggle_loading(True)
         
@@ -232,33 +263,35 @@ class AIAssistantApp:
                     
                     self.root.after(0, _safe_update)
 
-                # Étape 1 : Détection des rôles
-                update_status("🔍 Analyse de la demande...")
-                required_roles = self.agent_manager.detect_roles(prompt)
-                
-                # Affichage des rôles détectés
-                if required_roles:
-                    roles_str = ", ".join([self.agent_manager.VALID_ROLES.get(role, ("Inconnu",))[0] for role in required_roles])
-                    update_status(f"⚙️ {len(required_roles)} besoins détectés, utilisation de: {roles_str}")
-                else:
-                    update_status("⚠️ Aucun rôle détecté, utilisation du mode par défaut")
-                
-                time.sleep(0.5)  # Pause courte pour le feedback visuel
-                
-                # Étape 2 : Traitement avec suivi temps réel
-                results = {}
-                try:
-                    results, _ = self.agent_manager.process_request(
-                        prompt,
-                        required_roles,
-                        on_progress=update_status  
-                    )
-                except Exception as e:
-                    raise e
-                
-                # Étape 3 : Synthèse finale
-                update_status("🧠 Intégration des résultats...")
-                filename = self.save_to_html(prompt, results)
+                # Chaque demande est une trace : détection, rôles, appels aux modèles, synthèse, rapport
+                with span('request'):
+                    # Le rapport s'écrit au fil de l'eau : il peut être ouvert avant la fin
+                    report = ReportWriter(prompt, self.output_dir)
+                    update_status(f"📄 Rapport en cours : {os.path.basename(report.filename)}")
+
+                    # Étapes 1 et 2 : Détection des rôles et traitement avec suivi temps réel.
+                    # Les rôles les plus probables démarrent pendant que la détection se termine.
+                    update_status("🔍 Analyse de la demande...")
+                    results, required_roles = {}, []
+                    completed = False
+                    start = time.perf_counter()
+                    try:
+                        results, required_roles = self.agent_manager.process_request_speculative(
+                            prompt,
+                            on_progress=update_status,
+                            on_result=report.add_section
+                        )
+                        completed = True
+                    finally:
+                        # Étape 3 : Synthèse finale, ajoutée en dernier (le rapport est clos même en cas d'erreur)
+                        update_status("🧠 Intégration des résultats...")
+                        filename = report.finish(
+                            results,
+                            roles=required_roles,
+                            timings={"total": round(time.perf_counter() - start, 3)},
+                            models=self.agent_manager.role_models(required_roles),
+                            failed=not completed
+                        )
                 
                 self.root.after(0, lambda: self.show_success_message(filename))
                 
@@ -272,244 +305,32 @@ class AIAssistantApp:
         
         threading.Thread(target=processing_task, daemon=True).start()
 
-    def save_to_html(self, prompt: str, responses: Dict[str, str]) -> str:
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = os.path.join(self.output_dir, f"{timestamp}.html")
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>{timestamp}</title>
-            <style>
-                body {{ 
-                    font-family: 'Segoe UI', sans-serif; 
-                    line-height: 1.6;
-                    margin: 20px;
-                    background-color: #f5f6fa;
-                }}
-                .header {{ 
-                    color: #2c3e50; 
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                }}
-                .prompt {{ 
-                    background: #ffffff;
-                    padding: 20px;
-                    border-radius: 10px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                    margin: 15px 0;
-                }}
-                .response {{
-                    white-space: pre-wrap;
-                    margin-top: 20px;
-                    background: #ffffff;
-                    padding: 20px;
-                    border-radius: 10px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                think {{
-                    display: inline-block;
-                    background-color: #ffeaa7;
-                    color: #2d3436;
-                    padding: 8px 15px;
-                    border-radius: 6px;
-                    font-style: italic;
-                    border: 1px dashed #fdcb6e;
-                    cursor: pointer;
-                    transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-                    overflow: hidden;
-                    max-height: 500px;
-                    position: relative;
-                    vertical-align: top;
-                    margin: 3px 0;
-                    line-height: 1.4;
-                }}
-                think.hidden {{
-                    max-height: 28px;
-                    background-color: #dfe6e9;
-                    border: 1px solid #b2bec3;
-                    border-left: 4px solid #ffeaa7;
-                    padding: 3px 12px 3px 30px;
-                    color: transparent;
-                }}
-                think.hidden::before {{
-                    content: "▶";
-                    position: absolute;
-                    left: 12px;
-                    top: 50%;
-                    transform: translateY(-50%);
-                    color: #636e72;
-                    font-size: 14px;
-                    transition: transform 0.2s;
-                }}
-                think:hover {{
-                    filter: brightness(0.98);
-                    transform: translateY(-1px);
-                }}
-                .timestamp {{
-                    color: #7f8c8d;
-                    font-size: 0.9em;
-                }}
-                h2 {{
-                    color: #3498db;
-                    margin-top: 25px;
-                }}
-                .response-section {{
-                    margin: 20px 0;
-                    padding: 15px;
-                    background: #ffffff;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-                }}
-                h3 {{
-                    color: #3498db;
-                    margin-top: 0;
-                    border-bottom: 2px solid #f0f0f0;
-                    padding-bottom: 8px;
-                }}
-                
-                .response-content {{
-                    padding: 15px;
-                    line-height: 1.7;
-                    color: #2c3e50;
-                    background: #f9f9f9;
-                    border-left: 4px solid #3498db;
-                    margin: 10px 0;
-                }}
-                .response-content pre {{
-                    background: #2c3e50;
-                    color: #f9f9f9;
-                    padding: 10px;
-                    border-radius: 5px;
-                    overflow-x: auto;
-                }}
-                .response-content code {{
-                    font-family: 'Courier New', Courier, monospace;
-                    background: #2c3e50;
-                    color: #f9f9f9;
-                    padding: 2px 4px;
-                    border-radius: 3px;
-                }}
-                .response-content blockquote {{
-                    border-left: 4px solid #3498db;
-                    padding-left: 15px;
-                    color: #7f8c8d;
-                    font-style: italic;
-                    margin: 10px 0;
-                }}
-                .response-content ul, .response-content ol {{
-                    padding-left: 20px;
-                    margin: 10px 0;
-                }}
-                .response-content li {{
-                    margin-bottom: 5px;
-                }}
-                .response-content a {{
-                    color: #3498db;
-                    text-decoration: none;
-                }}
-                .response-content a:hover {{
-                    text-decoration: underline;
-                }}
-                /* Transition pour les interactions */
-                .response-content, .response-section, .prompt {{
-                    transition: all 0.3s ease;
-                }}
-                .response-section:hover, .prompt:hover {{
-                    transform: translateY(-2px);
-                    box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-                }}
-            </style>
-            <script>
-                function toggleThink(event) {{
-                    const thinkElement = event.currentTarget;
-                    thinkElement.classList.toggle('hidden');
-                    
-                    // Rotate arrow
-                    const arrow = window.getComputedStyle(thinkElement, '::before').getPropertyValue('content');
-                    if(thinkElement.classList.contains('hidden')) {{
-                        thinkElement.style.setProperty('--arrow-rotation', '0deg');
-                    }} else {{
-                        thinkElement.style.setProperty('--arrow-rotation', '90deg');
-                    }}
-                }}
-
-                document.addEventListener('DOMContentLoaded', function() {{
-                    document.querySelectorAll('think').forEach(element => {{
-                        element.addEventListener('click', toggleThink);
-                        // Initialize rotation property
-                        element.style.setProperty('--arrow-rotation', '90deg');
-                    }});
-                }});
-            </script>
-        </head>
-        <body>
-            <div class="container">
-                <h1 class="header">Résultats:</h1>
-                <p class="timestamp">{time.strftime("%d/%m/%Y %H:%M:%S")}</p>
-
-                <h2>Demande initiale :</h2>
-                <div class="prompt">{prompt}</div>
-
-                <h2>Réponse générée :</h2>
-            """
-        
-        for role, content in responses.items():
-            formatted_content = content
-            
-            # Lignes de séparation : --- → <hr>
-            formatted_content = re.sub(r'^---+(\s*)$', r'<hr>\1', formatted_content, flags=re.MULTILINE)
-
-            # Titres : ### Titre
-            formatted_content = re.sub(r'^(#{3})\s*(.*)$', r'<h3>\2</h3>', formatted_content, flags=re.MULTILINE)
-
-            # Gras : **texte**
-            formatted_content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', formatted_content)
-
-            # Italique : *texte*
-            formatted_content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', formatted_content)
-
-            # Code inline : `texte`
-            formatted_content = re.sub(r'`(.*?)`', r'<code>\1</code>', formatted_content)
-
-            # Listes à puces : - texte (à traiter AVANT les sauts de ligne)
-            def list_replacer(match):
-                items = match.group(0).strip().split("\n")
-                items = [f"<li>{item[2:]}</li>" for item in items]
-                return f"<ul>{''.join(items)}</ul>"
-
-            formatted_content = re.sub(r'(?:^-\s.*\n?)+', list_replacer, formatted_content, flags=re.MULTILINE)
-
-            # Gestion des sauts de ligne hors des balises HTML block-level
-            formatted_content = re.sub(
-                r'(</(?:li|h[1-6]|p|blockquote)>)?\n(?!<)',
-                lambda m: (m.group(1) + "\n") if m.group(1) is not None else '<br>',
-                formatted_content
-            )
-
-            # Envelopper le tout dans une section
-            html_content += f"""
-                <div class="response-section">
-                    <h3>{role}</h3>
-                    <div class="response-content">
-                        {formatted_content}
-                    </div>
-                </div>
-            """
-
-        
-        html_content += """
-            </div>
-        </body>
-        </html>
+    def open_existing_report(self, prompt: str) -> bool:
         """
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        return filename
+        Propose d'ouvrir le rapport d'une demande quasi identique déjà traitée au lieu de la relancer.
+        Retourne True si l'utilisateur a choisi l'ancien rapport.
+        """
+        index = get_report_index()
+        existing = index.find_similar(prompt) if index else None
+        if existing is None:
+            return False
+        created = time.strftime("%d/%m/%Y %H:%M", time.localtime(existing['created']))
+        if not messagebox.askyesno(
+            "Demande déjà traitée",
+            f"Une demande quasi identique a déjà été traitée le {created} :\n\n"
+            f"{existing['prompt'][:300]}\n\nOuvrir ce rapport au lieu de relancer les agents ?"
+        ):
+            return False
+        self.show_success_message(existing['path'])
+        try:
+            os.startfile(existing['path'])
+        except Exception as e:
+            logging.error(f"Ouverture du rapport impossible : {str(e)}")
+        return True
+
+    def save_to_html(self, prompt: str, responses: Dict[str, str]) -> str:
+        """Génère le rapport HTML dans le dossier de sortie"""
+        return save_to_html(prompt, responses, self.output_dir)
 
     def _update_status(self, message: str):
         """Met à jour la barre de statut de manière thread-safe"""
@@ -543,5 +364,13 @@ class AIAssistantApp:
 
 if __name__ == "__main__":
     root = tk.Tk()
+    STARTUP.mark("fenêtre Tk")
     app = AIAssistantApp(root)
+    STARTUP.mark("AIAssistantApp")
+    if "--profile-startup" in sys.argv:
+        # Premier affichage de la fenêtre, puis rapport dans la console et le journal
+        def profile_startup():
+            STARTUP.mark("premier affichage")
+            logging.info(STARTUP.report())
+        root.after_idle(profile_startup)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,166 @@
+#markdown_renderer.py
+"""
+Rendu Markdown -> HTML des réponses des rôles, en une seule passe.
+
+Une seule expression précompilée découpe tout le texte en jetons : débuts de ligne
+(titres, séparateurs, listes, citations, blocs de code), texte ordinaire, sauts de
+ligne et éléments en ligne (code, liens, gras, italique, balises <think>). Une citation
+peut contenir des listes, des titres et des séparateurs ; *** combine gras et italique.
+Le texte est échappé ; seules les balises <think> du modèle sont conservées.
+Le résultat est accumulé dans un seul tampon et assemblé une fois à la fin.
+"""
+import re
+from html import escape
+
+# Les titres, séparateurs et listes peuvent suivre le « > » d'une citation
+AFTER_QUOTE = r"(?:^|(?<=^>)|(?<=^> )|(?<=^>\t))"
+
+TOKEN_PATTERN = re.compile(
+    r"(?P<fence>^[ \t]*```[^\n]*\n?(?P<fence_body>[\s\S]*?)(?:^[ \t]*```[^\n]*$|\Z))"
+    r"|" + AFTER_QUOTE + r"(?:(?P<rule>[ \t]*(?:-{3,}|\*{3,}|_{3,})[ \t]*$)"
+    r"|(?P<heading>#{1,6})[ \t]+"
+    r"|(?P<bullet>[ \t]*[-*+][ \t]+)"
+    r"|(?P<ordered>[ \t]*\d+[.)][ \t]+))"
+    r"|(?P<quote>^>[ \t]?)"
+    # Texte ordinaire jusqu'au prochain caractère qui peut commencer un jeton
+    r"|(?P<text>[^\n`\[<*]+)(?P<eol>\n)?"
+    r"|(?P<newline>\n)"
+    r"|(?P<ticks>`+)(?P<code>[^\n]+?)(?P=ticks)"
+    r"|\[(?P<label>[^\]\n]+)\]\((?P<url>https?://[^)\s]+)\)"
+    r"|(?P<think></?think>)"
+    r"|(?P<marker>\*\*\*|\*\*|\*)"
+    # Caractère spécial qui ne commence finalement aucun jeton
+    r"|(?P<char>[`\[<])",
+    re.MULTILINE
+)
+
+LINE_TOKENS = {'heading', 'bullet', 'ordered', 'quote', 'rule', 'fence'}
+MARKER_TAGS = {'**': 'strong', '*': 'em'}
+LISTS = {'bullet': 'ul', 'ordered': 'ol'}
+
+
+def render_markdown(text: str) -> str:
+    """Convertit la réponse d'un rôle (Markdown simple) en HTML"""
+    out = []
+    append = out.append
+    containers = []  # blocs ouverts sur plusieurs lignes, du plus externe au plus interne ('blockquote', 'ul', 'ol')
+    prefix = []  # blocs annoncés au début de la ligne en cours (citation)
+    line_kind = None  # type de la ligne en cours (None : ligne pas encore commencée)
+    heading_level = 0
+    opened = []  # (marqueur, position dans out) des ** et * pas encore fermés
+
+    def enter(path: list):
+        """Ferme les blocs qui ne contiennent pas la ligne et ouvre ceux qui manquent"""
+        common = 0
+        while common < len(containers) and common < len(path) and containers[common] == path[common]:
+            common += 1
+        while len(containers) > common:
+            append(f"</{containers.pop()}>\n")
+        for tag in path[common:]:
+            append(f"<{tag}>")
+            containers.append(tag)
+
+    # Chaque caractère du texte appartient à exactement un jeton
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+
+        if line_kind is None and kind not in LINE_TOKENS and kind != 'newline':
+            # Début de ligne ordinaire (éventuellement dans une citation)
+            if containers or prefix:
+                enter(prefix)
+            line_kind = 'paragraph'
+
+        if kind == 'text' or kind == 'eol':
+            append(escape(match.group('text'), quote=False))
+        elif kind == 'marker':
+            _emphasis(match.group('marker'), opened, out)
+        elif kind == 'code':
+            append(f"<code>{escape(match.group('code'), quote=False)}</code>")
+        elif kind == 'url':
+            append(f'<a href="{escape(match.group("url"))}">{escape(match.group("label"), quote=False)}</a>')
+        elif kind == 'think':
+            append(match.group('think'))
+        elif kind == 'char':
+            append(escape(match.group(), quote=False))
+        elif kind == 'quote':
+            if line_kind is None and not prefix:
+                prefix.append('blockquote')
+            else:
+                append(escape(match.group(), quote=False))
+        elif kind != 'newline':
+            # Jeton de début de ligne
+            if kind in LISTS:
+                enter(prefix + [LISTS[kind]])
+                append("<li>")
+                line_kind = 'item'
+            else:
+                enter(prefix)
+                if kind == 'heading':
+                    heading_level = len(match.group('heading'))
+                    append(f"<h{heading_level}>")
+                    line_kind = 'heading'
+                elif kind == 'rule':
+                    append("<hr>\n")
+                    line_kind = 'block'
+                else:
+                    body = match.group('fence_body').rstrip("\n")
+                    append(f"<pre><code>{escape(body, quote=False)}</code></pre>\n")
+                    line_kind = 'block'
+
+        if kind == 'newline' or kind == 'eol':
+            if line_kind == 'heading':
+                append(f"</h{heading_level}>\n")
+            elif line_kind == 'item':
+                append("</li>")
+            elif line_kind != 'block':
+                if line_kind is None and (containers or prefix):
+                    # Une ligne vide termine la liste ou la citation (« > » seul garde la citation)
+                    enter(prefix)
+                append("<br>")
+            line_kind = None
+            prefix = []
+            # Les marqueurs restés ouverts sont déjà écrits tels quels et redeviennent du texte
+            opened.clear()
+
+    if line_kind == 'heading':
+        append(f"</h{heading_level}>\n")
+    elif line_kind == 'item':
+        append("</li>")
+    enter([])
+    return "".join(out)
+
+
+def _emphasis(marker: str, opened: list, out: list):
+    """
+    Ouvre ou ferme un marqueur ***, ** ou * ; il reste du texte tant qu'il n'est pas fermé.
+    Un *** ouvrant occupe deux places dans `out` (externe, interne) : l'ordre du gras et de
+    l'italique n'est connu qu'à la fermeture du premier des deux.
+    """
+    for position in range(len(opened) - 1, -1, -1):
+        open_marker, index = opened[position]
+        if open_marker == marker or '***' in (open_marker, marker):
+            break
+    else:
+        opened.append((marker, len(out)))
+        out.extend(('**', '*') if marker == '***' else (marker,))
+        return
+
+    # Les marqueurs ouverts après celui-ci se chevauchent et restent du texte
+    del opened[position:]
+    if open_marker == marker == '***':
+        out[index], out[index + 1] = "<strong>", "<em>"
+        out.append("</em></strong>")
+    elif open_marker == marker:
+        out[index] = f"<{MARKER_TAGS[marker]}>"
+        out.append(f"</{MARKER_TAGS[marker]}>")
+    elif open_marker == '***':
+        # Le marqueur fermé est l'interne ; l'autre reste ouvert à l'extérieur
+        other = '*' if marker == '**' else '**'
+        out[index], out[index + 1] = other, f"<{MARKER_TAGS[marker]}>"
+        out.append(f"</{MARKER_TAGS[marker]}>")
+        opened.append((other, index))
+    else:
+        # *** ferme le marqueur ouvert, puis traite l'autre moitié (fermeture ou ouverture)
+        out[index] = f"<{MARKER_TAGS[open_marker]}>"
+        out.append(f"</{MARKER_TAGS[open_marker]}>")
+        _emphasis('*' if open_marker == '**' else '**', opened, out)
@@ -0,0 +1,420 @@
+#report.py
+import gzip
+import hashlib
+import os
+import shutil
+import textwrap
+import threading
+import time
+from html import escape
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from markdown_renderer import render_markdown
+from report_index import get_report_index
+from roles.metrics import span
+
+
+REPORT_CSS = """
+            body { 
+                font-family: 'Segoe UI', sans-serif; 
+                line-height: 1.6;
+                margin: 20px;
+                background-color: #f5f6fa;
+            }
+            .header { 
+                color: #2c3e50; 
+                border-bottom: 2px solid #3498db;
+                padding-bottom: 10px;
+            }
+            .prompt { 
+                background: #ffffff;
+                padding: 20px;
+                border-radius: 10px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                margin: 15px 0;
+            }
+            .response {
+                white-space: pre-wrap;
+                margin-top: 20px;
+                background: #ffffff;
+                padding: 20px;
+                border-radius: 10px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            }
+            think {
+                display: inline-block;
+                background-color: #ffeaa7;
+                color: #2d3436;
+                padding: 8px 15px;
+                border-radius: 6px;
+                font-style: italic;
+                border: 1px dashed #fdcb6e;
+                cursor: pointer;
+                transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                overflow: hidden;
+                max-height: 500px;
+                position: relative;
+                vertical-align: top;
+                margin: 3px 0;
+                line-height: 1.4;
+            }
+            think.hidden {
+                max-height: 28px;
+                background-color: #dfe6e9;
+                border: 1px solid #b2bec3;
+                border-left: 4px solid #ffeaa7;
+                padding: 3px 12px 3px 30px;
+                color: transparent;
+            }
+            think.hidden::before {
+                content: "▶";
+                position: absolute;
+                left: 12px;
+                top: 50%;
+                transform: translateY(-50%);
+                color: #636e72;
+                font-size: 14px;
+                transition: transform 0.2s;
+            }
+            think:hover {
+                filter: brightness(0.98);
+                transform: translateY(-1px);
+            }
+            .timestamp {
+                color: #7f8c8d;
+                font-size: 0.9em;
+            }
+            h2 {
+                color: #3498db;
+                margin-top: 25px;
+            }
+            .response-section {
+                margin: 20px 0;
+                padding: 15px;
+                background: #ffffff;
+                border-radius: 8px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+            }
+            h3 {
+                color: #3498db;
+                margin-top: 0;
+                border-bottom: 2px solid #f0f0f0;
+                padding-bottom: 8px;
+            }
+            
+            .response-content {
+                padding: 15px;
+                line-height: 1.7;
+                color: #2c3e50;
+                background: #f9f9f9;
+                border-left: 4px solid #3498db;
+                margin: 10px 0;
+            }
+            .response-content pre {
+                background: #2c3e50;
+                color: #f9f9f9;
+                padding: 10px;
+                border-radius: 5px;
+                overflow-x: auto;
+            }
+            .response-content code {
+                font-family: 'Courier New', Courier, monospace;
+                background: #2c3e50;
+                color: #f9f9f9;
+                padding: 2px 4px;
+                border-radius: 3px;
+            }
+            .response-content blockquote {
+                border-left: 4px solid #3498db;
+                padding-left: 15px;
+                color: #7f8c8d;
+                font-style: italic;
+                margin: 10px 0;
+            }
+            .response-content ul, .response-content ol {
+                padding-left: 20px;
+                margin: 10px 0;
+            }
+            .response-content li {
+                margin-bottom: 5px;
+            }
+            .response-content a {
+                color: #3498db;
+                text-decoration: none;
+            }
+            .response-content a:hover {
+                text-decoration: underline;
+            }
+            /* Transition pour les interactions */
+            .response-content, .response-section, .prompt {
+                transition: all 0.3s ease;
+            }
+            .response-section:hover, .prompt:hover {
+                transform: translateY(-2px);
+                box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+            }
+"""
+
+REPORT_JS = """
+            function toggleThink(event) {
+                const thinkElement = event.currentTarget;
+                thinkElement.classList.toggle('hidden');
+                
+                // Rotate arrow
+                const arrow = window.getComputedStyle(thinkElement, '::before').getPropertyValue('content');
+                if(thinkElement.classList.contains('hidden')) {
+                    thinkElement.style.setProperty('--arrow-rotation', '0deg');
+                } else {
+                    thinkElement.style.setProperty('--arrow-rotation', '90deg');
+                }
+            }
+
+            // Tant que le rapport s'écrit, la page se recharge en gardant la position de lecture.
+            // Un rapport qui ne change plus (processus arrêté avant la fin) n'est plus rechargé.
+            document.addEventListener('DOMContentLoaded', function() {
+                const scroll = sessionStorage.getItem('report-scroll:' + location.pathname);
+                const sizeKey = 'report-size:' + location.pathname;
+                if (scroll !== null) {
+                    window.scrollTo(0, parseInt(scroll, 10));
+                }
+                if (document.getElementById('report-complete')) {
+                    document.getElementById('report-progress').hidden = true;
+                    sessionStorage.removeItem('report-scroll:' + location.pathname);
+                    sessionStorage.removeItem(sizeKey);
+                    return;
+                }
+                const size = document.body.innerHTML.length;
+                const previous = JSON.parse(sessionStorage.getItem(sizeKey) || 'null');
+                const since = previous && previous.size === size ? previous.since : Date.now();
+                sessionStorage.setItem(sizeKey, JSON.stringify({size: size, since: since}));
+                if (Date.now() - since > (parseInt(document.body.dataset.stale, 10) || 600) * 1000) {
+                    document.getElementById('report-progress').textContent =
+                        "⚠️ Rapport interrompu : la génération ne s'est pas terminée.";
+                    return;
+                }
+                setTimeout(function() {
+                    sessionStorage.setItem('report-scroll:' + location.pathname, window.scrollY);
+                    location.reload();
+                }, (parseInt(document.body.dataset.refresh, 10) || 3) * 1000);
+            });
+
+            document.addEventListener('DOMContentLoaded', function() {
+                document.querySelectorAll('think').forEach(element => {
+                    element.addEventListener('click', toggleThink);
+                    // Initialize rotation property
+                    element.style.setProperty('--arrow-rotation', '90deg');
+                });
+            });
+"""
+
+# Les fichiers liés changent de nom quand leur contenu change : un ancien rapport garde ses styles
+ASSETS_VERSION = hashlib.sha256((REPORT_CSS + REPORT_JS).encode("utf-8")).hexdigest()[:10]
+ASSET_FORMATS = ('inline', 'linked')
+
+_written_assets = set()
+_assets_lock = threading.Lock()
+
+
+def write_assets(output_dir: str) -> Tuple[str, str]:
+    """Écrit une seule fois report.<version>.css et report.<version>.js dans le dossier des rapports"""
+    names = (f"report.{ASSETS_VERSION}.css", f"report.{ASSETS_VERSION}.js")
+    directory = os.path.abspath(output_dir)
+    with _assets_lock:
+        if directory in _written_assets:
+            return names
+        os.makedirs(directory, exist_ok=True)
+        for name, content in zip(names, (REPORT_CSS, REPORT_JS)):
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                # Écriture atomique : un autre processus peut écrire le même fichier en même temps
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, 'w', encoding='utf-8') as f:
+                    f.write(textwrap.dedent(content).strip() + "\n")
+                os.replace(temporary, path)
+        _written_assets.add(directory)
+    return names
+
+
+def _render_assets(output_dir: str, assets: str) -> str:
+    """Styles et scripts du rapport : intégrés à la page, ou liés aux fichiers partagés du dossier"""
+    if assets == 'linked':
+        css, js = write_assets(output_dir)
+        return f'        <link rel="stylesheet" href="{css}">\n        <script src="{js}"></script>\n'
+    return f"        <style>{REPORT_CSS}        </style>\n        <script>{REPORT_JS}        </script>\n"
+
+
+def archive_reports(output_dir: str, older_than_days: float = 30) -> List[str]:
+    """
+    Compresse en .html.gz les rapports plus anciens que `older_than_days` jours
+    (l'original est supprimé, la date de modification conservée).
+
+    :return: Chemins des archives créées.
+    """
+    if not os.path.isdir(output_dir):
+        return []
+    cutoff = time.time() - older_than_days * 24 * 3600
+    archived = []
+    for entry in os.scandir(output_dir):
+        if not entry.is_file() or not entry.name.endswith(".html"):
+            continue
+        stat = entry.stat()
+        if stat.st_mtime >= cutoff:
+            continue
+        target = entry.path + ".gz"
+        with open(entry.path, 'rb') as source, gzip.open(target, 'wb', compresslevel=9) as destination:
+            shutil.copyfileobj(source, destination)
+        os.utime(target, (stat.st_atime, stat.st_mtime))
+        os.remove(entry.path)
+        archived.append(target)
+    return archived
+
+
+def _open_unique(output_dir: str, name: str) -> TextIO:
+    """Crée le fichier du rapport sans écraser un fichier existant (plusieurs rapports peuvent naître la même seconde)"""
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = 0
+    while True:
+        filename = os.path.join(output_dir, f"{name}{'-' + str(suffix) if suffix else ''}.html")
+        try:
+            return open(filename, 'x', encoding='utf-8')
+        except FileExistsError:
+            suffix += 1
+
+
+def _render_header(title: str, prompt: str, refresh_seconds: int, stale_seconds: int, assets_html: str) -> str:
+    """En-tête du rapport : styles et scripts (intégrés ou liés), demande initiale"""
+    return f"""    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>{title}</title>
+{assets_html}    </head>
+    <body data-refresh="{refresh_seconds}" data-stale="{stale_seconds}">
+        <div class="container">
+            <h1 class="header">Résultats:</h1>
+            <p class="timestamp">{time.strftime("%d/%m/%Y %H:%M:%S")}</p>
+            <p class="timestamp" id="report-progress">⏳ Rapport en cours de génération, la page se met à jour toute seule...</p>
+
+            <h2>Demande initiale :</h2>
+            <div class="prompt">{escape(prompt)}</div>
+
+            <h2>Réponse générée :</h2>
+        """
+
+
+def _render_section(role: str, content: str) -> str:
+    """Section d'un rôle"""
+    return f"""
+            <div class="response-section">
+                <h3>{escape(role)}</h3>
+                <div class="response-content">
+                    {render_markdown(content)}
+                </div>
+            </div>
+        """
+
+
+FOOTER = """
+            <div id="report-complete" hidden></div>
+        </div>
+    </body>
+    </html>
+    """
+
+
+class ReportWriter:
+    """
+    Rapport HTML écrit au fil de l'eau : l'en-tête tout de suite, puis une section par
+    rôle dès qu'il termine, la synthèse du Connecteur en dernier. Tant que le marqueur
+    de fin n'est pas écrit, la page ouverte dans un navigateur se recharge toute seule,
+    sauf si le fichier n'a plus changé depuis `stale_seconds` secondes.
+    """
+
+    def __init__(self, prompt: str, output_dir: str, name: Optional[str] = None, refresh_seconds: int = 3,
+                 assets: Optional[str] = None, stale_seconds: int = 600):
+        """
+        :param prompt: Demande initiale.
+        :param output_dir: Dossier de sortie des rapports.
+        :param name: Nom du fichier sans extension (horodatage par défaut).
+        :param refresh_seconds: Intervalle de rechargement de la page tant que le rapport n'est pas terminé.
+        :param assets: 'inline' (styles et scripts dans la page) ou 'linked' (fichiers partagés du dossier),
+                       ECHOPAGE_REPORT_ASSETS par défaut.
+        :param stale_seconds: Durée sans nouvelle section après laquelle la page cesse de se recharger
+                              (rapport abandonné) ; plus longue que le délai d'une requête.
+        """
+        assets = assets or os.getenv("ECHOPAGE_REPORT_ASSETS", "inline")
+        if assets not in ASSET_FORMATS:
+            raise ValueError(f"Format de rapport inconnu : {assets} (attendu : {', '.join(ASSET_FORMATS)})")
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.prompt = prompt
+        self.lock = threading.Lock()
+        # Texte de chaque section écrite, pour l'index des rapports
+        self.sections = {}
+        assets_html = _render_assets(output_dir, assets)
+        self.file = _open_unique(output_dir, name or timestamp)
+        self.filename = self.file.name
+        self._write(_render_header(timestamp, prompt, refresh_seconds, stale_seconds, assets_html))
+
+    def _write(self, content: str):
+        self.file.write(content)
+        # Visible tout de suite par le navigateur
+        self.file.flush()
+
+    def add_section(self, role: str, content: str):
+        """Ajoute la section d'un rôle (une seule fois par rôle)"""
+        with self.lock:
+            if self.file.closed or role in self.sections:
+                return
+            self.sections[role] = content
+            with span('report_section', role=role, chars=len(content)):
+                self._write(_render_section(role, content))
+
+    def finish(self, responses: Optional[Dict[str, str]] = None, roles: Optional[List[str]] = None,
+               timings: Optional[Dict[str, float]] = None, models: Optional[Dict[str, str]] = None,
+               failed: bool = False) -> str:
+        """
+        Ajoute les réponses pas encore écrites et le marqueur de fin, enregistre le rapport
+        dans l'index plein texte, et retourne le chemin du rapport.
+
+        :param roles: Rôles détectés.
+        :param timings: Durées des étapes, en secondes.
+        :param models: Modèle utilisé par chaque rôle.
+        :param failed: La requête a échoué : le rapport est indexé comme incomplet et ne sera
+                       pas réutilisé (c'est aussi le cas dès qu'une section est en erreur).
+        """
+        if self.file.closed:
+            return self.filename
+        with span('report'):
+            for role, content in (responses or {}).items():
+                self.add_section(role, content)
+            with self.lock:
+                if self.file.closed:
+                    return self.filename
+                self._write(FOOTER)
+                self.file.close()
+
+            index = get_report_index()
+            if index is not None and self.sections:
+                index.add(self.filename, self.prompt, dict(self.sections), roles=roles, timings=timings, models=models,
+                          complete=not failed)
+            return self.filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.finish(failed=exc_type is not None)
+
+
+def save_to_html(prompt: str, responses: Dict[str, str], output_dir: str, name: Optional[str] = None,
+                 assets: Optional[str] = None) -> str:
+    """
+    Génère le rapport HTML complet d'une requête et retourne le chemin du fichier créé.
+
+    :param prompt: Demande initiale.
+    :param responses: Réponses par nom d'affichage de rôle.
+    :param output_dir: Dossier de sortie des rapports.
+    :param name: Nom du fichier sans extension (horodatage par défaut).
+    :param assets: 'inline' ou 'linked' (voir ReportWriter).
+    """
+    return ReportWriter(prompt, output_dir, name, assets=assets).finish(responses)
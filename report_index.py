@@ -0,0 +1,346 @@
+# report_index.py
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+DEFAULT_INDEX_PATH = os.path.expanduser("~/.echopageai/report_index.sqlite3")
+
+# Mots retenus pour interroger l'index (les plus courts sont trop fréquents)
+WORD_PATTERN = re.compile(r"\w{3,}")
+
+# Section unique d'une requête en échec (AgentManager._create_error_response)
+ERROR_SECTION = "🚨 Erreur Système"
+# Texte d'un rôle en erreur, annulé ou hors délai (AgentManager), ou flux coupé par une
+# erreur du backend (BaseRole._format_error, ajoutée après le texte déjà reçu)
+FAILURE_PATTERN = re.compile(
+    r"^(?:Erreur [^\n:]+: |Timeout : |Limite de requêtes dépassée|Mode non reconnu\. )"
+    r"|(?:Erreur lors de la génération locale|Erreur d'authentification|Erreur inattendue) : [^\n]*\Z"
+    r"|Limite de requêtes dépassée\Z"
+)
+
+
+def failed_sections(sections: Dict[str, str]) -> List[str]:
+    """Sections d'un rapport qui signalent une erreur, un délai dépassé ou une annulation"""
+    return [
+        role for role, content in sections.items()
+        if role == ERROR_SECTION or FAILURE_PATTERN.search(content.strip())
+    ]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Forme canonique d'une demande : minuscules, sans accents, ponctuation ni espaces superflus"""
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+class ReportIndex:
+    """
+    Index plein texte (SQLite FTS5) des rapports générés.
+
+    Chaque rapport y est enregistré avec sa demande, les rôles détectés, le texte de
+    chaque rôle, les durées et les modèles utilisés. L'index sert à retrouver une
+    ancienne réponse et à repérer une demande quasi identique avant de la relancer ;
+    seuls les rapports complets (sans rôle en erreur) sont proposés à la réutilisation.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        :param path: Fichier SQLite de l'index (":memory:" pour un index temporaire).
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.lock = threading.Lock()
+        self.fts = True
+        self.db = self._open_db(path)
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        """Ouvre (ou crée) la base de l'index"""
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, prompt TEXT NOT NULL, "
+                "normalized TEXT NOT NULL, roles TEXT NOT NULL, models TEXT NOT NULL, "
+                "timings TEXT NOT NULL, created REAL NOT NULL, complete INTEGER NOT NULL DEFAULT 1)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS reports_normalized ON reports (normalized)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sections ("
+                "report_id INTEGER NOT NULL REFERENCES reports (id) ON DELETE CASCADE, "
+                "role TEXT NOT NULL, content TEXT NOT NULL)"
+            )
+            if "complete" not in {row[1] for row in db.execute("PRAGMA table_info(reports)")}:
+                self._add_complete_column(db)
+            try:
+                db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(prompt, content)")
+            except sqlite3.OperationalError:
+                # SQLite compilé sans FTS5 : la recherche se rabat sur LIKE
+                self.fts = False
+                self.logger.warning("FTS5 indisponible, recherche simple dans l'index des rapports")
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            self.logger.error(f"Index des rapports indisponible ({path}) : {str(e)}")
+            return None
+
+    @staticmethod
+    def _add_complete_column(db: sqlite3.Connection):
+        """Index créé avant le marquage des rapports incomplets : ajoute la colonne et marque ceux en erreur"""
+        db.execute("ALTER TABLE reports ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+        reports = {}
+        for report_id, role, content in db.execute("SELECT report_id, role, content FROM sections"):
+            reports.setdefault(report_id, {})[role] = content
+        db.executemany(
+            "UPDATE reports SET complete = 0 WHERE id = ?",
+            [(report_id,) for report_id, sections in reports.items() if failed_sections(sections)]
+        )
+
+    def add(self, path: str, prompt: str, sections: Dict[str, str], roles: Optional[List[str]] = None,
+            timings: Optional[Dict[str, float]] = None, models: Optional[Dict[str, str]] = None,
+            complete: bool = True):
+        """
+        Enregistre (ou remplace) un rapport dans l'index.
+
+        :param path: Chemin du fichier HTML.
+        :param prompt: Demande initiale.
+        :param sections: Texte de chaque rôle, par nom d'affichage.
+        :param roles: Rôles détectés (noms d'affichage des sections par défaut).
+        :param timings: Durées des étapes, en secondes.
+        :param models: Modèle utilisé par chaque rôle.
+        :param complete: Faux si la requête a échoué ; le rapport reste cherchable mais n'est
+                         jamais réutilisé (find_similar). Une section en erreur suffit aussi.
+        """
+        if self.db is None:
+            return
+        path = os.path.abspath(path)
+        with self.lock:
+            try:
+                self._delete(path)
+                cursor = self.db.execute(
+                    "INSERT INTO reports (path, prompt, normalized, roles, models, timings, created, complete) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, prompt, normalize_prompt(prompt),
+                     json.dumps(roles if roles is not None else list(sections), ensure_ascii=False),
+                     json.dumps(models or {}, ensure_ascii=False),
+                     json.dumps(timings or {}), time.time(),
+                     int(complete and not failed_sections(sections)))
+                )
+                report_id = cursor.lastrowid
+                self.db.executemany(
+                    "INSERT INTO sections (report_id, role, content) VALUES (?, ?, ?)",
+                    [(report_id, role, content) for role, content in sections.items()]
+                )
+                if self.fts:
+                    self.db.execute(
+                        "INSERT INTO reports_fts (rowid, prompt, content) VALUES (?, ?, ?)",
+                        (report_id, prompt, "\n\n".join(sections.values()))
+                    )
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.db.rollback()
+                self.logger.error(f"Indexation du rapport {path} impossible : {str(e)}")
+
+    def _delete(self, path: str):
+        """Retire un rapport de l'index (verrou déjà pris)"""
+        row = self.db.execute("SELECT id FROM reports WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM sections WHERE report_id = ?", row)
+        if self.fts:
+            self.db.execute("DELETE FROM reports_fts WHERE rowid = ?", row)
+        self.db.execute("DELETE FROM reports WHERE id = ?", row)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, object]]:
+        """
+        Recherche plein texte dans les demandes et les réponses, les plus pertinents d'abord.
+
+        :param query: Mots recherchés (syntaxe FTS5 acceptée : "expression exacte", OR, préfixe*).
+        :return: Rapports trouvés (chemin, demande, rôles, modèles, durées, date, extrait).
+        """
+        if self.db is None or not query.strip():
+            return []
+        with self.lock:
+            if not self.fts:
+                rows = self._search_like(query, limit)
+            else:
+                try:
+                    rows = self._search_fts(query, limit)
+                except sqlite3.OperationalError:
+                    # Requête invalide pour FTS5 (guillemets, opérateurs) : recherche des mots tels quels
+                    rows = self._search_fts(self._quote(query), limit)
+        return [self._to_result(row) for row in rows]
+
+    def _search_fts(self, match: str, limit: int) -> list:
+        """Recherche FTS5 classée par pertinence (verrou déjà pris)"""
+        return self.db.execute(
+            "SELECT r.id, r.path, r.prompt, r.roles, r.models, r.timings, r.created, "
+            "snippet(reports_fts, 1, '[', ']', '…', 12) "
+            "FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid "
+            "WHERE reports_fts MATCH ? ORDER BY bm25(reports_fts) LIMIT ?",
+            (match, limit)
+        ).fetchall()
+
+    def _search_like(self, query: str, limit: int) -> list:
+        """Recherche sans FTS5 : sous-chaîne dans la demande ou le texte des rôles (verrou déjà pris)"""
+        pattern = f"%{query}%"
+        return self.db.execute(
+            "SELECT DISTINCT r.id, r.path, r.prompt, r.roles, r.models, r.timings, r.created, '' "
+            "FROM reports r LEFT JOIN sections s ON s.report_id = r.id "
+            "WHERE r.prompt LIKE ? OR s.content LIKE ? ORDER BY r.created DESC LIMIT ?",
+            (pattern, pattern, limit)
+        ).fetchall()
+
+    @staticmethod
+    def _quote(text: str) -> str:
+        """Convertit un texte libre en requête FTS5 : chaque mot entre guillemets, reliés par OR"""
+        return " OR ".join(f'"{word}"' for word in WORD_PATTERN.findall(text)) or '""'
+
+    @staticmethod
+    def _to_result(row: tuple) -> Dict[str, object]:
+        report_id, path, prompt, roles, models, timings, created, snippet = row
+        return {
+            'id': report_id,
+            'path': _existing_path(path) or path,
+            'prompt': prompt,
+            'roles': json.loads(roles),
+            'models': json.loads(models),
+            'timings': json.loads(timings),
+            'created': created,
+            'snippet': snippet
+        }
+
+    def sections(self, path: str) -> Dict[str, str]:
+        """Texte de chaque rôle d'un rapport indexé"""
+        if self.db is None:
+            return {}
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT s.role, s.content FROM sections s JOIN reports r ON r.id = s.report_id "
+                "WHERE r.path = ? ORDER BY s.rowid",
+                (os.path.abspath(path),)
+            ).fetchall()
+        return dict(rows)
+
+    def find_similar(self, prompt: str, threshold: float = 0.92, max_age: Optional[float] = None) -> Optional[Dict[str, object]]:
+        """
+        Cherche un rapport existant et complet pour une demande quasi identique.
+
+        Les candidats sont les demandes identiques une fois normalisées, puis les
+        meilleurs résultats plein texte, départagés par similarité de séquence.
+
+        :param prompt: Nouvelle demande.
+        :param threshold: Similarité minimale (0 à 1) des demandes normalisées.
+        :param max_age: Âge maximal du rapport en secondes (None : pas de limite).
+        :return: Le rapport le plus proche (voir search, plus 'similarity'), ou None.
+        """
+        if self.db is None:
+            return None
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return None
+        min_created = time.time() - max_age if max_age else 0
+        columns = "r.id, r.path, r.prompt, r.roles, r.models, r.timings, r.created, '', r.normalized"
+
+        with self.lock:
+            candidates = self.db.execute(
+                f"SELECT {columns} FROM reports r WHERE r.normalized = ? AND r.created >= ? AND r.complete = 1 "
+                "ORDER BY r.created DESC LIMIT 5",
+                (normalized, min_created)
+            ).fetchall()
+            if not candidates and self.fts:
+                candidates = self.db.execute(
+                    f"SELECT {columns} FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid "
+                    "WHERE reports_fts MATCH ? AND r.created >= ? AND r.complete = 1 "
+                    "ORDER BY bm25(reports_fts) LIMIT 20",
+                    ("prompt : (" + self._quote(normalized) + ")", min_created)
+                ).fetchall()
+
+        best, best_ratio = None, threshold
+        for row in candidates:
+            ratio = 1.0 if row[-1] == normalized else SequenceMatcher(None, normalized, row[-1]).ratio()
+            path = _existing_path(row[1])
+            # Les rapports supprimés du dossier ne comptent pas
+            if ratio >= best_ratio and path is not None:
+                best, best_ratio = row, ratio
+                if ratio == 1.0:
+                    break
+        if best is None:
+            return None
+        result = self._to_result(best[:-1])
+        result['similarity'] = round(best_ratio, 3)
+        return result
+
+    def forget_missing(self) -> int:
+        """Retire de l'index les rapports dont le fichier n'existe plus ; retourne leur nombre"""
+        if self.db is None:
+            return 0
+        with self.lock:
+            paths = [path for (path,) in self.db.execute("SELECT path FROM reports").fetchall()]
+            missing = [path for path in paths if _existing_path(path) is None]
+            for path in missing:
+                self._delete(path)
+            self.db.commit()
+        return len(missing)
+
+
+def _existing_path(path: str) -> Optional[str]:
+    """Chemin actuel du rapport : le fichier HTML, ou son archive .html.gz"""
+    if os.path.exists(path):
+        return path
+    if os.path.exists(path + ".gz"):
+        return path + ".gz"
+    return None
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_report_index() -> Optional[ReportIndex]:
+    """Index partagé par tout le processus (ECHOPAGE_REPORT_INDEX : chemin de la base, 0 pour désactiver)"""
+    global _shared_index
+    path = os.getenv("ECHOPAGE_REPORT_INDEX", DEFAULT_INDEX_PATH)
+    if path == "0":
+        return None
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = ReportIndex(os.path.expanduser(path))
+        return _shared_index
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recherche dans l'index des rapports générés.")
+    parser.add_argument("query", help="Mots recherchés dans les demandes et les réponses")
+    parser.add_argument("--limit", type=int, default=20, help="Nombre maximal de résultats")
+    parser.add_argument("--similar", action="store_true",
+                        help="Cherche le rapport d'une demande quasi identique plutôt qu'une recherche plein texte")
+    args = parser.parse_args(argv)
+
+    index = get_report_index()
+    if index is None:
+        print("Index des rapports désactivé (ECHOPAGE_REPORT_INDEX=0)")
+        return 1
+    results = index.find_similar(args.query) if args.similar else index.search(args.query, args.limit)
+    if isinstance(results, dict):
+        results = [results]
+    for result in results or []:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(result['created']))
+        print(f"{created}  {result['path']}\n    {result['prompt'][:120]}")
+        if result.get('snippet'):
+            print(f"    {result['snippet']}")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
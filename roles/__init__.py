@@ -3,20 +3,13 @@ from .detecteur_besoins import DetecteurBesoins
 from .connecteur import Connecteur
 from .recherche import Recherche
 from .role_class import create_role_class
+from .registry import ROLES_JSON_PATH, get_role_registry
 
-import json
-import os
-
-# Chargement des rôles dynamiques depuis roles.json
-dynamic_roles = {}
-ROLES_JSON_PATH = os.path.join(os.path.dirname(__file__), 'roles.json')
-
-if os.path.exists(ROLES_JSON_PATH):
-    with open(ROLES_JSON_PATH, "r", encoding="utf-8") as file:
-        roles_data = json.load(file)
-    for role_data in roles_data:
-        role_name = role_data["name"]
-        dynamic_roles[role_name] = create_role_class(role_data)
+# Rôles dynamiques de roles.json, lus par le registre partagé avec AgentManager et DetecteurBesoins
+try:
+    dynamic_roles = get_role_registry().role_classes()
+except FileNotFoundError:
+    dynamic_roles = {}
 
 # Export des rôles statiques + dynamiques
 __all__ = [
@@ -1,69 +1,693 @@
 # base_role.py
-from ollama import Client
-import requests
-import together 
-from together import Together
 from dotenv import load_dotenv
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+from .metrics import get_metrics
+from .hedging import ahedged_stream, hedged_stream
+from .client_pool import (get_async_ollama_client, get_async_together_client, get_ollama_client,
+                          get_together_client, ollama_keep_alive)
+from .rate_limiter import get_rate_limiter, is_rate_limit_error
+from .reasoning import CLOSE_TAG, OPEN_TAG, ReasoningFilter
+from .response_cache import ResponseCache, get_response_cache
+import asyncio
+import functools
+import inspect
+import logging
 import os
+import time
 
 load_dotenv()
 
+# Estimation grossière du nombre de tokens d'un texte, pour le budget de débit
+CHARS_PER_TOKEN = 4
+# Longueur maximale d'une réponse Together quand le rôle ne fixe pas max_tokens
+DEFAULT_MAX_TOKENS = 2600
+# Nom de chaque backend dans les métriques, et backend de relance de chaque mode
+BACKEND_NAMES = {'local': 'ollama', 'external': 'together'}
+HEDGE_MODES = {'local': 'external', 'external': 'local'}
+# Délai de relance tant que le backend n'a pas assez d'historique pour en tirer un p95
+DEFAULT_HEDGE_DELAY = 10.0
+HEDGE_MIN_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.5
+# Réponse d'un appel dont le mode n'est ni 'local' ni 'external'
+UNKNOWN_MODE_MESSAGE = "Mode non reconnu. Utilisez 'local' ou 'external'."
+
+
+@functools.lru_cache(maxsize=None)
+def _generate_parameters(client_class) -> frozenset:
+    """Paramètres acceptés par client.generate (think n'existe que depuis ollama 0.5)"""
+    return frozenset(inspect.signature(client_class.generate).parameters)
+
+
+class GenerationCancelled(Exception):
+    """Levée pour interrompre une génération en cours (rôle annulé par l'appelant)"""
+
+
+class GenerationCall:
+    """
+    Suivi d'un appel à stream_response ou astream_response, commun aux deux : span "generation",
+    cache de réponses et statut. Utilisé comme contexte autour de la lecture du flux ; une
+    sortie par exception (flux fermé ou tâche annulée par l'appelant) marque l'appel annulé.
+    """
+
+    def __init__(self, role: 'BaseRole', mode: str, prompt: str, temp: float, local_options: Optional[dict] = None):
+        self.role = role
+        self.mode = mode
+        self.prompt = prompt
+        self.temp = temp
+        self.usage = {}
+        self.local_options = role._local_options(local_options)
+        self.chunks = []
+        self.status = 'ok'
+        self.cache_key = role._cache_key(mode, prompt, temp, self.local_options) if role.cache else None
+        self.span = get_metrics().start_span(
+            'generation',
+            backend=BACKEND_NAMES[mode],
+            model=role._model_name(mode),
+            agent=role.__class__.__name__,
+            prompt_chars=len(prompt)
+        )
+
+    def __enter__(self) -> 'GenerationCall':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            # Génération interrompue par l'appelant (fermeture du flux)
+            self.status = 'cancelled'
+        self._end()
+        return False
+
+    def cached(self) -> Optional[str]:
+        """Réponse en cache pour cet appel, s'il y en a une"""
+        if not self.cache_key:
+            return None
+        cached = self.role.cache.get(self.cache_key)
+        if cached is not None:
+            self.span.set(cached=True)
+            self.chunks.append(cached)
+        return cached
+
+    def received(self, chunk: str) -> str:
+        """Enregistre un fragment du flux et le retourne"""
+        if not self.chunks:
+            self.span.set(time_to_first_token=round(time.perf_counter() - self.span.started, 3))
+        self.chunks.append(chunk)
+        return chunk
+
+    def failed(self, error: Exception) -> str:
+        """Erreur du backend : retourne le message à transmettre à la place de la suite du flux"""
+        self.status = 'error'
+        self.span.set(error=str(error)[:200])
+        return self.role._format_error(self.mode, error)
+
+    def store(self):
+        """Seules les générations complètes et sans erreur sont mises en cache, sous la clé du backend qui a répondu"""
+        if not self.cache_key:
+            return
+        key = self.cache_key
+        served = self.role._served_mode(self.mode, self.usage)
+        if served != self.mode:
+            # Réponse de l'autre backend (relance) : elle ne doit pas être resservie pour le modèle du rôle
+            key = self.role._cache_key(served, self.prompt, self.temp, self.local_options)
+        self.role.cache.set(key, "".join(self.chunks))
+
+    def _end(self):
+        """Complète le span avec la taille de la réponse et le débit annoncé par le backend"""
+        call, usage = self.span, self.usage
+        call.set(response_chars=sum(len(chunk) for chunk in self.chunks))
+        call.set(**{key: value for key, value in usage.items() if key != 'eval_seconds' and value is not None})
+        completion_tokens = usage.get('completion_tokens')
+        # Ollama mesure lui-même la durée de génération ; sinon, depuis le premier fragment
+        seconds = usage.get('eval_seconds') or (
+            time.perf_counter() - call.started - call.attributes.get('time_to_first_token', 0)
+        )
+        if completion_tokens and seconds > 0:
+            call.set(tokens_per_second=round(completion_tokens / seconds, 2))
+        get_metrics().end_span(call, self.status)
+
+
 class BaseRole:
-    def __init__(self, model_name='deepseek-r1:14b', mode='local'):
+    # Nombre maximal d'exécutions simultanées de ce rôle (None : pas de plafond)
+    max_concurrency = None
+    # Délai maximal d'exécution de ce rôle en secondes (None : délai de la requête)
+    timeout = None
+    # Longueur maximale de la génération, raisonnement compris (num_predict / max_tokens ; None : défaut du backend)
+    max_tokens = None
+    # Budget de raisonnement en tokens (0 : pas de raisonnement si le backend le permet ; None : illimité)
+    max_reasoning_tokens = None
+    # Garde les blocs <think> dans la réponse (ils sont retirés du flux par défaut)
+    keep_reasoning = False
+    # Relance la demande sur l'autre backend si le premier fragment tarde ; le premier qui répond l'emporte
+    hedge = False
+    # Délai avant la relance en secondes (None : p95 du temps jusqu'au premier fragment du backend)
+    hedge_delay = None
+    # Modèle et mode utilisés quand le constructeur n'en reçoit pas
+    default_model = 'deepseek-r1:14b'
+    default_mode = 'local'
+    # Modèle appelé en mode externe (Together)
+    ext_model = 'deepseek-ai/DeepSeek-R1'
+
+    def __init__(self, model_name: Optional[str] = None, mode: Optional[str] = None, use_cache=True):
         """
         Classe de base pour tous les rôles.
-        
+
         :param model_name: Nom du modèle à utiliser.
         :param mode: 'local' pour Ollama, 'external' pour une API externe.
+        :param use_cache: Réutilise les réponses déjà générées pour une requête identique.
         """
-        self.model = model_name
-        self.ext_model = 'deepseek-ai/DeepSeek-R1'
-        self.mode = mode
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.model = model_name or self.default_model
+        self.mode = mode or self.default_mode
         self.api_key = os.getenv("TOGETHER_API_KEY")
-        
-        if self.mode == 'local':
-            self.client = Client(host='http://localhost:11434')
-        elif self.mode == 'external':
-            if not self.api_key:
-                raise ValueError("Une clé API est nécessaire pour le mode externe (.env).")
-            
-    def generate_response(self, prompt: str, temp: float = 1.0, mode: str = None) -> str:
+        self.use_cache = use_cache and os.getenv("ECHOPAGE_CACHE", "1") != "0"
+
+        # Les clients et le cache sont créés au premier appel (démarrage rapide)
+        if self.mode == 'external' and not self.api_key:
+            raise ValueError("Une clé API est nécessaire pour le mode externe (.env).")
+
+    @classmethod
+    def configured_model(cls, config: Optional[dict] = None) -> Tuple[str, str]:
+        """Mode et modèle d'un agent construit avec les paramètres `config`, connus sans le créer"""
+        config = config or {}
+        return config.get('mode') or cls.default_mode, config.get('model_name') or cls.default_model
+
+    @property
+    def client(self):
+        """Client Ollama partagé par tous les rôles : les connexions restent ouvertes d'un appel à l'autre"""
+        return get_ollama_client()
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        """Cache de réponses partagé, ouvert au premier appel (None si désactivé)"""
+        return get_response_cache() if self.use_cache else None
+
+    def generate_response(self, prompt: str, temp: float = 1.0, mode: str = None,
+                          on_token: Optional[Callable[[str], None]] = None,
+                          local_options: Optional[dict] = None) -> str:
+        """
+        Génère la réponse complète. Si `on_token` est fourni, il reçoit chaque
+        fragment dès qu'il arrive du backend.
+        `local_options` complète l'appel à Ollama (format, think, options comme num_predict).
+        """
+        chunks = []
+        stream = self.stream_response(prompt, temp, mode, local_options)
+        try:
+            for chunk in stream:
+                self._receive(chunks, chunk, on_token)
+        finally:
+            # Si on_token interrompt la génération, la connexion au backend est fermée tout de suite
+            stream.close()
+        return "".join(chunks)
+
+    def stream_response(self, prompt: str, temp: float = 1.0, mode: str = None,
+                        local_options: Optional[dict] = None) -> Iterator[str]:
+        """
+        Itère sur les fragments de texte au fil de la génération.
+        Une réponse en cache est renvoyée d'un bloc sans appeler le backend.
+        Chaque appel est chronométré (span "generation" : tailles, tokens/s si le backend les fournit).
+        """
+        mode = mode or self.mode
+
+        if mode not in BACKEND_NAMES:
+            yield UNKNOWN_MODE_MESSAGE
+            return
+        call = GenerationCall(self, mode, prompt, temp, local_options)
+        with call:
+            cached = call.cached()
+            if cached is not None:
+                yield cached
+                return
+            try:
+                for chunk in self._filtered_stream(mode, prompt, temp, call.usage, call.local_options):
+                    yield call.received(chunk)
+            except Exception as e:
+                yield call.failed(e)
+                return
+        call.store()
+
+    async def generate_response_async(self, prompt: str, temp: float = 1.0, mode: str = None,
+                                      on_token: Optional[Callable[[str], None]] = None,
+                                      local_options: Optional[dict] = None) -> str:
+        """Équivalent asynchrone de generate_response (annulable à tout moment)"""
+        chunks = []
+        async for chunk in self.astream_response(prompt, temp, mode, local_options):
+            self._receive(chunks, chunk, on_token)
+        return "".join(chunks)
+
+    async def astream_response(self, prompt: str, temp: float = 1.0, mode: str = None,
+                               local_options: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Équivalent asynchrone de stream_response, via les clients HTTP asynchrones.
+        L'annulation de la tâche ferme la connexion et interrompt la génération.
+        """
         mode = mode or self.mode
 
+        if mode not in BACKEND_NAMES:
+            yield UNKNOWN_MODE_MESSAGE
+            return
+        call = GenerationCall(self, mode, prompt, temp, local_options)
+        with call:
+            cached = call.cached()
+            if cached is not None:
+                yield cached
+                return
+            try:
+                async for chunk in self._afiltered_stream(mode, prompt, temp, call.usage, call.local_options):
+                    yield call.received(chunk)
+            except Exception as e:
+                yield call.failed(e)
+                return
+        call.store()
+
+    @staticmethod
+    def _receive(chunks: list, chunk: str, on_token: Optional[Callable[[str], None]]):
+        chunks.append(chunk)
+        if on_token:
+            on_token(chunk)
+
+    def _cache_key(self, mode: str, prompt: str, temp: float, local_options: Optional[dict] = None) -> str:
+        """Clé de cache : backend, modèle, prompt complet, température et options (raisonnement compris)"""
+        reasoning = {'reasoning': [self.max_reasoning_tokens, self.keep_reasoning]}
+        if mode == 'local':
+            return ResponseCache.make_key('ollama', self.model, prompt, temp, {**(local_options or {}), **reasoning})
+        return ResponseCache.make_key('together', self.ext_model, prompt, temp,
+                                      {'max_tokens': self.max_tokens or DEFAULT_MAX_TOKENS, **reasoning})
+
+    def _local_options(self, local_options: Optional[dict] = None) -> dict:
+        """Options Ollama du rôle (num_predict, think), complétées ou remplacées par celles de l'appel"""
+        options = dict(local_options or {})
+        if self.max_tokens:
+            options['options'] = {'num_predict': self.max_tokens, **options.get('options', {})}
+        if self.max_reasoning_tokens == 0:
+            options.setdefault('think', False)
+        return options
+
+    def _model_name(self, mode: str) -> str:
+        return self.model if mode == 'local' else self.ext_model
+
+    def _backend_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                        local_options: Optional[dict] = None) -> Iterator[str]:
+        """Flux brut d'un backend ; le délai jusqu'à son premier fragment sert au délai de relance"""
+        started = time.perf_counter()
         if mode == 'local':
-            return self._generate_local(prompt, temp)
-        elif mode == 'external':
-            return self._generate_external(prompt, temp)
+            stream = self._stream_local(prompt, temp, usage, local_options)
         else:
-            return "Mode non reconnu. Utilisez 'local' ou 'external'."
-    
-    def _generate_local(self, prompt: str, temp: float) -> str:
-        """Génération via Ollama en local"""
+            stream = self._stream_external(prompt, temp, usage)
         try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=prompt,
-                options={'temperature': temp}
-            )
-            return response['response']
-        except Exception as e:
-            return f"Erreur lors de la génération locale : {str(e)}"
+            for chunk in stream:
+                if started is not None:
+                    self._observe_first_token(mode, time.perf_counter() - started)
+                    started = None
+                yield chunk
+        finally:
+            stream.close()
+
+    async def _abackend_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                               local_options: Optional[dict] = None) -> AsyncIterator[str]:
+        """Équivalent asynchrone de _backend_stream"""
+        started = time.perf_counter()
+        if mode == 'local':
+            stream = self._astream_local(prompt, temp, usage, local_options)
+        else:
+            stream = self._astream_external(prompt, temp, usage)
+        try:
+            async for chunk in stream:
+                if started is not None:
+                    self._observe_first_token(mode, time.perf_counter() - started)
+                    started = None
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def _observe_first_token(self, mode: str, seconds: float):
+        get_metrics().observe("time_to_first_token_seconds", seconds,
+                              (('backend', BACKEND_NAMES[mode]), ('model', self._model_name(mode))))
 
-    def _generate_external(self, prompt: str, temp: float) -> str:
-        """Génération via l'API Together"""
+    def _can_hedge(self, mode: str) -> bool:
+        """La relance vise l'autre backend : Together demande une clé API"""
+        return bool(self.hedge) and (mode == 'external' or bool(self.api_key))
+
+    def _hedge_delay(self, mode: str) -> float:
+        """Délai avant la relance : fixé par le rôle, sinon p95 du temps jusqu'au premier fragment"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        stats = get_metrics().percentiles("time_to_first_token_seconds",
+                                          backend=BACKEND_NAMES[mode], model=self._model_name(mode))
+        if stats['count'] < HEDGE_MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, stats['p95'])
+
+    def _first_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                      local_options: Optional[dict] = None) -> Iterator[str]:
+        """Flux du backend du rôle, doublé par l'autre backend s'il tarde (hedge)"""
+        if not self._can_hedge(mode):
+            yield from self._backend_stream(mode, prompt, temp, usage, local_options)
+            return
+        race, end_hedge = self._hedge_race(hedged_stream, self._backend_stream, mode, prompt, temp, usage,
+                                           local_options)
+        try:
+            yield from race
+        finally:
+            race.close()
+            end_hedge()
+
+    async def _afirst_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                             local_options: Optional[dict] = None) -> AsyncIterator[str]:
+        """Équivalent asynchrone de _first_stream"""
+        if not self._can_hedge(mode):
+            async for chunk in self._abackend_stream(mode, prompt, temp, usage, local_options):
+                yield chunk
+            return
+        race, end_hedge = self._hedge_race(ahedged_stream, self._abackend_stream, mode, prompt, temp, usage,
+                                           local_options)
         try:
-            client = Together(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model=self.ext_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=temp,
-                max_tokens=2600
+            async for chunk in race:
+                yield chunk
+        finally:
+            await race.aclose()
+            end_hedge()
+
+    def _hedge_race(self, race: Callable, backend_stream: Callable, mode: str, prompt: str, temp: float,
+                    usage: dict, local_options: Optional[dict] = None):
+        """
+        Course entre le backend du rôle et l'autre (`race` : hedged_stream ou ahedged_stream).
+        Retourne le flux de la course et la fonction à appeler à sa fermeture.
+        """
+        other = HEDGE_MODES[mode]
+        usages = {mode: {}, other: {}}
+        winner = []
+
+        def on_winner(name: str, hedged: bool):
+            winner.append((name, hedged))
+            # Connu dès le premier fragment : le budget de raisonnement dépend du backend qui répond
+            usage['backend'] = BACKEND_NAMES[name]
+
+        stream = race(
+            (mode, lambda: backend_stream(mode, prompt, temp, usages[mode], local_options)),
+            (other, lambda: backend_stream(other, prompt, temp, usages[other], local_options)),
+            self._hedge_delay(mode), on_winner
+        )
+        return stream, functools.partial(self._end_hedge, mode, winner, usages, usage)
+
+    def _end_hedge(self, mode: str, winner: list, usages: dict, usage: dict):
+        """Compteurs du gagnant pour le span (backend, modèle) et métrique des relances"""
+        if not winner:
+            return
+        name, hedged = winner[0]
+        usage.update(usages[name], backend=BACKEND_NAMES[name], model=self._model_name(name), hedged=hedged)
+        if hedged:
+            get_metrics().observe("hedged_requests", 1, (('role', self.__class__.__name__),
+                                                         ('backend', BACKEND_NAMES[name])))
+            self.logger.info(f"Relance sur {BACKEND_NAMES[HEDGE_MODES[mode]]} : réponse de {BACKEND_NAMES[name]}")
+
+    def _filtered_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                         local_options: Optional[dict] = None) -> Iterator[str]:
+        """
+        Flux du backend sans les blocs <think> : ni l'interface, ni le rapport, ni le Connecteur
+        ne les reçoivent. Avec Ollama, au-delà de max_reasoning_tokens, la génération est
+        interrompue et le modèle est relancé une fois, sans réflexion (think=False), pour
+        répondre directement à partir de la sienne. Together ne permet pas de désactiver le
+        raisonnement : la génération n'y est bornée que par max_tokens.
+        """
+        reasoning = self._reasoning_filter()
+        stream = self._first_stream(mode, prompt, temp, usage, local_options)
+        try:
+            for chunk in stream:
+                text = reasoning.feed(chunk)
+                if text:
+                    yield text
+                if reasoning.exhausted and self._served_mode(mode, usage) == 'local':
+                    break
+        finally:
+            stream.close()
+        tail, retry = self._end_reasoning(reasoning, mode, prompt, usage, local_options)
+        if tail:
+            yield tail
+        if retry is None:
+            return
+
+        retry_mode, retry_prompt, retry_options = retry
+        answer = ReasoningFilter()
+        for chunk in self._backend_stream(retry_mode, retry_prompt, temp, usage, retry_options):
+            text = answer.feed(chunk)
+            if text:
+                yield text
+        tail = answer.flush()
+        if tail:
+            yield tail
+
+    async def _afiltered_stream(self, mode: str, prompt: str, temp: float, usage: dict,
+                                local_options: Optional[dict] = None) -> AsyncIterator[str]:
+        """Équivalent asynchrone de _filtered_stream"""
+        reasoning = self._reasoning_filter()
+        stream = self._afirst_stream(mode, prompt, temp, usage, local_options)
+        try:
+            async for chunk in stream:
+                text = reasoning.feed(chunk)
+                if text:
+                    yield text
+                if reasoning.exhausted and self._served_mode(mode, usage) == 'local':
+                    break
+        finally:
+            await stream.aclose()
+        tail, retry = self._end_reasoning(reasoning, mode, prompt, usage, local_options)
+        if tail:
+            yield tail
+        if retry is None:
+            return
+
+        retry_mode, retry_prompt, retry_options = retry
+        answer = ReasoningFilter()
+        async for chunk in self._abackend_stream(retry_mode, retry_prompt, temp, usage, retry_options):
+            text = answer.feed(chunk)
+            if text:
+                yield text
+        tail = answer.flush()
+        if tail:
+            yield tail
+
+    def _reasoning_filter(self) -> ReasoningFilter:
+        return ReasoningFilter(keep=self.keep_reasoning, budget=self.max_reasoning_tokens)
+
+    def _end_reasoning(self, reasoning: ReasoningFilter, mode: str, prompt: str, usage: dict,
+                       local_options: Optional[dict] = None) -> Tuple[str, Optional[tuple]]:
+        """
+        Fin du premier flux : reste du filtre et compteurs de raisonnement pour le span.
+        Retourne (reste, relance) ; la relance (mode, prompt, options) n'existe que si Ollama
+        a répondu et que le budget de raisonnement est épuisé.
+        """
+        usage['reasoning_tokens'] = reasoning.tokens
+        exhausted = reasoning.exhausted
+        tail = reasoning.flush()
+        if not exhausted or self._served_mode(mode, usage) != 'local':
+            return tail, None
+        usage['reasoning_truncated'] = True
+        return tail, ('local', self._direct_answer_prompt(prompt, reasoning.text),
+                      {**(local_options or {}), 'think': False})
+
+    @staticmethod
+    def _served_mode(mode: str, usage: dict) -> str:
+        """Backend qui a répondu : celui du rôle, ou l'autre s'il a gagné la relance (hedge)"""
+        return next((key for key, name in BACKEND_NAMES.items() if name == usage.get('backend')), mode)
+
+    @staticmethod
+    def _direct_answer_prompt(prompt: str, reasoning: str) -> str:
+        """Relance après un budget de raisonnement épuisé : la réflexion déjà faite sert de point de départ"""
+        return (
+            f"{prompt}\n\n"
+            f"Pistes de réflexion déjà explorées :\n{reasoning}\n\n"
+            "Réponds maintenant directement, sans nouvelle réflexion préalable."
+        )
+
+    def _ollama_request(self, client, prompt: str, temp: float, local_options: Optional[dict] = None) -> dict:
+        """
+        Paramètres de client.generate. Les options propres à l'appel sont fusionnées avec la
+        température ; celles que la version installée du SDK ne connaît pas (think) sont ignorées.
+        """
+        extra = dict(local_options or {})
+        request = {
+            'model': self.model,
+            'prompt': prompt,
+            'options': {'temperature': temp, **extra.pop('options', {})},
+            'keep_alive': ollama_keep_alive()
+        }
+        supported = _generate_parameters(type(client))
+        request.update((key, value) for key, value in extra.items() if key in supported)
+        return request
+
+    def _stream_local(self, prompt: str, temp: float, usage: Optional[dict] = None,
+                      local_options: Optional[dict] = None) -> Iterator[str]:
+        """Génération en streaming via Ollama en local (`usage` reçoit les compteurs du dernier fragment)"""
+        client = self.client
+        thinking = False
+        for part in client.generate(**self._ollama_request(client, prompt, temp, local_options), stream=True):
+            text, thinking = self._ollama_text(part, thinking, usage)
+            if text:
+                yield text
+
+    def _stream_external(self, prompt: str, temp: float, usage: Optional[dict] = None) -> Iterator[str]:
+        """
+        Génération en streaming via l'API Together, sous le limiteur de débit partagé.
+        Un refus (429) avant le premier fragment est retenté après un délai avec gigue.
+        """
+        limiter = get_rate_limiter('together', self.api_key)
+        attempt = 0
+        while True:
+            limiter.acquire(self._estimate_tokens(prompt))
+            started = rate_limited = completed = False
+            try:
+                client = get_together_client(self.api_key)
+                stream = client.chat.completions.create(**self._together_request(prompt, temp))
+                thinking = False
+                for chunk in stream:
+                    text, thinking = self._together_text(chunk, thinking, usage)
+                    if text:
+                        started = True
+                        yield text
+                completed = True
+                return
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                delay = self._retry_delay(limiter, attempt, e, started)
+                if delay is None:
+                    raise
+            finally:
+                # Seul un flux complet fait remonter la concurrence ; une autre erreur ou une annulation est neutre
+                limiter.release(success=completed, rate_limited=rate_limited)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _astream_local(self, prompt: str, temp: float, usage: Optional[dict] = None,
+                             local_options: Optional[dict] = None) -> AsyncIterator[str]:
+        """Génération asynchrone en streaming via Ollama en local"""
+        client = get_async_ollama_client()
+        request = self._ollama_request(client, prompt, temp, local_options)
+        thinking = False
+        async for part in await client.generate(**request, stream=True):
+            text, thinking = self._ollama_text(part, thinking, usage)
+            if text:
+                yield text
+
+    async def _astream_external(self, prompt: str, temp: float, usage: Optional[dict] = None) -> AsyncIterator[str]:
+        """Génération asynchrone en streaming via l'API Together, sous le limiteur de débit partagé"""
+        limiter = get_rate_limiter('together', self.api_key)
+        attempt = 0
+        while True:
+            await limiter.acquire_async(self._estimate_tokens(prompt))
+            started = rate_limited = completed = False
+            try:
+                client = get_async_together_client(self.api_key)
+                stream = await client.chat.completions.create(**self._together_request(prompt, temp))
+                thinking = False
+                async for chunk in stream:
+                    text, thinking = self._together_text(chunk, thinking, usage)
+                    if text:
+                        started = True
+                        yield text
+                completed = True
+                return
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                delay = self._retry_delay(limiter, attempt, e, started)
+                if delay is None:
+                    raise
+            finally:
+                # Seul un flux complet fait remonter la concurrence ; une autre erreur ou une annulation est neutre
+                limiter.release(success=completed, rate_limited=rate_limited)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _together_request(self, prompt: str, temp: float) -> dict:
+        """Paramètres de chat.completions.create"""
+        return {
+            'model': self.ext_model,
+            'messages': [{"role": "user", "content": prompt}],
+            'temperature': temp,
+            'max_tokens': self.max_tokens or DEFAULT_MAX_TOKENS,
+            'stream': True
+        }
+
+    @staticmethod
+    def _retry_delay(limiter, attempt: int, error: Exception, started: bool) -> Optional[float]:
+        """
+        Délai avant une nouvelle tentative après `error`, ou None s'il faut abandonner : seul un
+        refus (429) reçu avant le premier fragment est retenté, max_retries fois au plus.
+        """
+        if not is_rate_limit_error(error) or started or attempt >= limiter.max_retries:
+            return None
+        return limiter.retry_delay(attempt, error)
+
+    @classmethod
+    def _ollama_text(cls, part, thinking: bool, usage: Optional[dict]):
+        """Texte d'un fragment Ollama ; le dernier fragment fournit les compteurs (usage)"""
+        text, thinking = cls._with_reasoning_tags(part.get('thinking'), part['response'], thinking)
+        if usage is not None and part.get('done'):
+            cls._ollama_usage(part, usage)
+        return text, thinking
+
+    @classmethod
+    def _together_text(cls, chunk, thinking: bool, usage: Optional[dict]):
+        """Texte d'un fragment Together, et ses compteurs de tokens s'il les fournit"""
+        text = ""
+        if chunk.choices:
+            delta = chunk.choices[0].delta
+            text, thinking = cls._with_reasoning_tags(getattr(delta, 'reasoning', None), delta.content, thinking)
+        cls._together_usage(chunk, usage)
+        return text, thinking
+
+    @staticmethod
+    def _with_reasoning_tags(reasoning: Optional[str], content: Optional[str], thinking: bool):
+        """
+        Remet entre balises <think> le raisonnement que le backend envoie à part (champ
+        `thinking` d'Ollama, `reasoning` de Together), pour que le filtre le traite comme le reste.
+        Retourne (texte à transmettre, raisonnement en cours).
+        """
+        text = ""
+        if reasoning:
+            text += reasoning if thinking else OPEN_TAG + reasoning
+            thinking = True
+        if content:
+            if thinking:
+                text += CLOSE_TAG
+                thinking = False
+            text += content
+        return text, thinking
+
+    @staticmethod
+    def _ollama_usage(part, usage: dict):
+        """Compteurs de tokens et durée de génération du dernier fragment Ollama"""
+        usage.update(
+            prompt_tokens=part.get('prompt_eval_count'),
+            completion_tokens=part.get('eval_count'),
+            eval_seconds=(part.get('eval_duration') or 0) / 1e9
+        )
+
+    @staticmethod
+    def _together_usage(chunk, usage: Optional[dict]):
+        """Compteurs de tokens du dernier fragment Together, s'il les fournit"""
+        chunk_usage = getattr(chunk, 'usage', None)
+        if usage is not None and chunk_usage:
+            usage.update(
+                prompt_tokens=getattr(chunk_usage, 'prompt_tokens', None),
+                completion_tokens=getattr(chunk_usage, 'completion_tokens', None)
             )
-            return response.choices[0].message.content
-        except together.error.AuthenticationError:
+
+    def _estimate_tokens(self, prompt: str) -> int:
+        """Tokens réservés pour un appel externe : prompt estimé + max_tokens"""
+        return len(prompt) // CHARS_PER_TOKEN + (self.max_tokens or DEFAULT_MAX_TOKENS)
+
+    @staticmethod
+    def _format_error(mode: str, error: Exception) -> str:
+        """Convertit une erreur de backend en message lisible"""
+        if mode == 'local':
+            return f"Erreur lors de la génération locale : {str(error)}"
+
+        import together
+
+        # together < 1.0 expose ses exceptions dans together.error
+        errors = getattr(together, 'error', together)
+        if isinstance(error, errors.AuthenticationError):
             return "Erreur d'authentification : vérifiez votre clé API"
-        except together.error.RateLimitError:
+        if isinstance(error, errors.RateLimitError):
             return "Limite de requêtes dépassée"
-        except Exception as e:
-            return f"Erreur inattendue : {str(e)}"
-            
\ No newline at end of file
+        return f"Erreur inattendue : {str(error)}"
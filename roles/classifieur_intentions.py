@@ -0,0 +1,295 @@
+# classifieur_intentions.py
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+
+DEFAULT_HISTORY_PATH = os.path.expanduser("~/.echopageai/detections.jsonl")
+# Nombre de détections passées gardées (les plus récentes, une seule par demande)
+DEFAULT_MAX_HISTORY = 1000
+
+# Mots trop fréquents pour distinguer les rôles
+STOPWORDS = {
+    'alors', 'au', 'aux', 'avec', 'avoir', 'besoin', 'ce', 'ces', 'cette', 'comment', 'dans', 'de', 'des',
+    'donne', 'donner', 'du', 'elle', 'en', 'est', 'et', 'etre', 'faire', 'il', 'je', 'la', 'le', 'les',
+    'leur', 'lui', 'ma', 'mais', 'me', 'mes', 'moi', 'mon', 'ne', 'nous', 'on', 'ou', 'par', 'pas', 'plus',
+    'pour', 'quel', 'quelle', 'quelles', 'quels', 'qui', 'que', 'quoi', 'sa', 'se', 'ses', 'son', 'sont',
+    'sur', 'ta', 'te', 'tes', 'ton', 'tu', 'un', 'une', 'vos', 'votre', 'vous', 'mots', 'cles', 'contexte',
+    'exemples', 'aide', 'aider', 'veux', 'voudrais', 'peux', 'suis', 'ai', 'mot', 'cle'
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+KEYWORDS_PATTERN = re.compile(r"Mots-clés\s*:\s*(.*)", re.IGNORECASE)
+EXAMPLES_PATTERN = re.compile(r"«\s*(.*?)\s*»")
+
+STEM_LENGTH = 6
+KEYWORD_BOOST = 3
+
+
+def extract_features(text: str) -> Counter:
+    """Transforme un texte en sac de racines (préfixes) et de bigrammes de racines"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    stems = [
+        token[:STEM_LENGTH]
+        for token in TOKEN_PATTERN.findall(text)
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+    features = Counter(stems)
+    features.update(f"{a}_{b}" for a, b in zip(stems, stems[1:]))
+    return features
+
+
+class ClassifieurIntentions:
+    """
+    Classifieur TF-IDF local qui prédit les rôles d'une demande en quelques millisecondes.
+
+    Il est entraîné sur les blocs `detection` de roles.json (mots-clés et exemples),
+    sur les mots-clés pondérés de la détection de secours et sur l'historique des
+    détections faites par le LLM.
+
+    L'IDF est calculé une fois (premier appel) ; une nouvelle détection ne met ensuite à
+    jour que les centroïdes de ses rôles.
+    """
+
+    def __init__(self, roles_data: List[dict], keyword_mapping: Optional[Dict[str, dict]] = None,
+                 history_path: Optional[str] = DEFAULT_HISTORY_PATH, max_roles: int = 3,
+                 relative_cutoff: float = 0.6, max_history: int = DEFAULT_MAX_HISTORY,
+                 valid_roles: Optional[Iterable[str]] = None):
+        """
+        :param roles_data: Contenu de roles.json.
+        :param keyword_mapping: Mots-clés pondérés par rôle ({'role': {'keywords': [...], 'weight': 1.0}}).
+        :param history_path: Fichier JSONL des détections passées (None pour ne rien persister).
+        :param max_roles: Nombre maximal de rôles retournés.
+        :param relative_cutoff: Un rôle est retenu si son score atteint cette fraction du meilleur score.
+        :param max_history: Nombre maximal de détections passées gardées (les plus récentes).
+        :param valid_roles: Rôles existants : les détections passées vers d'autres rôles sont ignorées.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.history_path = history_path
+        self.max_roles = max_roles
+        self.relative_cutoff = relative_cutoff
+        self.max_history = max_history
+        self.valid_roles = frozenset(valid_roles) if valid_roles is not None else None
+        self.lock = threading.Lock()
+        self.role_weights = {}
+        self.documents = []  # (rôle, Counter de features) issus de roles.json
+        self.idf = {}
+        # Par rôle : somme des vecteurs de ses documents, nombre de documents, centroïde normalisé
+        self.sums = {}
+        self.counts = Counter()
+        self.centroids = {}
+        # Texte normalisé de la demande -> (texte, Counter de features, rôles détectés)
+        self.history = OrderedDict()
+        self.history_vectors = {}  # texte normalisé -> (vecteur, rôles)
+        self._dirty = True
+
+        self._add_role_documents(roles_data, keyword_mapping or {})
+        self._load_history()
+
+    def _add_role_documents(self, roles_data: List[dict], keyword_mapping: Dict[str, dict]):
+        """Construit les documents d'entraînement à partir de la configuration des rôles"""
+        for role in roles_data:
+            name = role["name"].strip().lower()
+            detection = role.get("detection", "")
+            if not detection.strip():
+                continue
+
+            self.documents.append((name, extract_features(detection)))
+
+            keywords_match = KEYWORDS_PATTERN.search(detection)
+            if keywords_match:
+                keywords = extract_features(keywords_match.group(1))
+                self.documents.append((name, Counter({k: v * KEYWORD_BOOST for k, v in keywords.items()})))
+
+            for example in EXAMPLES_PATTERN.findall(detection):
+                self.documents.append((name, extract_features(example)))
+
+        for name, data in keyword_mapping.items():
+            self.role_weights[name] = data.get('weight', 1.0)
+            keywords = extract_features(" ".join(data.get('keywords', [])))
+            self.documents.append((name, Counter({k: v * KEYWORD_BOOST for k, v in keywords.items()})))
+
+    def _load_history(self):
+        """Charge les détections passées enregistrées sur disque, et compacte le fichier s'il a trop grossi"""
+        if not self.history_path or not os.path.exists(self.history_path):
+            return
+        lines = 0
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._add_history_entry(entry.get("text", ""), entry.get("roles", []))
+        except OSError as e:
+            self.logger.warning(f"Historique des détections illisible : {str(e)}")
+            return
+        if lines > 2 * self.max_history:
+            self._compact_history()
+
+    def _compact_history(self):
+        """Réécrit le fichier d'historique avec les seules détections gardées"""
+        temporary_path = self.history_path + ".tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                for text, _, roles in self.history.values():
+                    f.write(json.dumps({"text": text, "roles": roles}, ensure_ascii=False) + "\n")
+            os.replace(temporary_path, self.history_path)
+        except OSError as e:
+            self.logger.warning(f"Compactage de l'historique des détections impossible : {str(e)}")
+
+    @staticmethod
+    def _history_key(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def _add_history_entry(self, text: str, roles: Iterable[str]):
+        """
+        Ajoute une détection passée aux données d'entraînement (verrou déjà pris ou init).
+        Une demande déjà vue remplace sa détection précédente ; au-delà de max_history,
+        les plus anciennes sont oubliées.
+        """
+        roles = [role for role in roles if role and (self.valid_roles is None or role in self.valid_roles)]
+        features = extract_features(text)
+        if not roles or not features:
+            return
+        key = self._history_key(text)
+        if key in self.history:
+            self._forget_history_entry(key)
+        self.history[key] = (text, features, roles)
+        if not self._dirty:
+            self._add_history_vector(key)
+        while len(self.history) > self.max_history:
+            self._forget_history_entry(next(iter(self.history)))
+
+    def _add_history_vector(self, key: str):
+        _, features, roles = self.history[key]
+        vector = self._vectorize(features)
+        self.history_vectors[key] = (vector, roles)
+        for role in roles:
+            self._update_centroid(role, vector, 1)
+
+    def _forget_history_entry(self, key: str):
+        self.history.pop(key)
+        entry = self.history_vectors.pop(key, None)
+        if entry is not None:
+            vector, roles = entry
+            for role in roles:
+                self._update_centroid(role, vector, -1)
+
+    def _update_centroid(self, role: str, vector: Dict[str, float], sign: int, normalize: bool = True):
+        """Ajoute (sign=1) ou retire (sign=-1) un document du centroïde d'un rôle"""
+        self.counts[role] += sign
+        if self.counts[role] <= 0:
+            del self.counts[role]
+            self.sums.pop(role, None)
+            self.centroids.pop(role, None)
+            return
+        total = self.sums.setdefault(role, {})
+        for feature, value in vector.items():
+            updated = total.get(feature, 0.0) + sign * value
+            if sign < 0 and abs(updated) < 1e-12:
+                total.pop(feature, None)
+            else:
+                total[feature] = updated
+        if normalize:
+            self.centroids[role] = self._normalize(total)
+
+    def _fit(self):
+        """Calcule l'IDF et les centroïdes normalisés de chaque rôle (verrou déjà pris)"""
+        document_frequency = Counter()
+        for _, features in self.documents:
+            document_frequency.update(features.keys())
+        for _, features, _ in self.history.values():
+            document_frequency.update(features.keys())
+        total = len(self.documents) + len(self.history)
+        self.idf = {
+            feature: math.log((1 + total) / (1 + count)) + 1.0
+            for feature, count in document_frequency.items()
+        }
+
+        self.sums, self.counts, self.history_vectors = {}, Counter(), {}
+        for role, features in self.documents:
+            self._update_centroid(role, self._vectorize(features), 1, normalize=False)
+        for key, (_, features, roles) in self.history.items():
+            vector = self._vectorize(features)
+            self.history_vectors[key] = (vector, roles)
+            for role in roles:
+                self._update_centroid(role, vector, 1, normalize=False)
+        self.centroids = {role: self._normalize(vector) for role, vector in self.sums.items()}
+        self._dirty = False
+
+    def _vectorize(self, features: Counter) -> Dict[str, float]:
+        """Pondération TF-IDF normalisée d'un sac de features"""
+        return self._normalize({
+            feature: (1 + math.log(count)) * self.idf.get(feature, 0.0)
+            for feature, count in features.items()
+        })
+
+    @staticmethod
+    def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if not norm:
+            return {}
+        return {feature: value / norm for feature, value in vector.items()}
+
+    @staticmethod
+    def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(value * b.get(feature, 0.0) for feature, value in a.items())
+
+    def score(self, text: str) -> List[Tuple[str, float]]:
+        """Retourne tous les rôles avec leur score, du plus au moins probable"""
+        with self.lock:
+            if self._dirty:
+                self._fit()
+            vector = self._vectorize(extract_features(text))
+            if not vector:
+                return []
+
+            scores = {
+                role: self._cosine(vector, centroid) * self.role_weights.get(role, 1.0)
+                for role, centroid in self.centroids.items()
+            }
+
+            # Une demande quasi identique à une détection passée reprend ses rôles
+            for past_vector, roles in self.history_vectors.values():
+                similarity = self._cosine(vector, past_vector)
+                for rank, role in enumerate(roles):
+                    scores[role] = max(scores.get(role, 0.0), similarity * (1.0 - 0.1 * rank))
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def predict(self, text: str) -> Tuple[List[str], float]:
+        """
+        Prédit les rôles d'une demande.
+
+        :return: (rôles retenus par ordre de priorité, confiance entre 0 et 1)
+        """
+        scores = [(role, score) for role, score in self.score(text) if score > 0]
+        if not scores:
+            return [], 0.0
+        best = scores[0][1]
+        roles = [role for role, score in scores if score >= best * self.relative_cutoff]
+        return roles[:self.max_roles], min(best, 1.0)
+
+    def record(self, text: str, roles: List[str]):
+        """Mémorise une détection (faite par le LLM) pour les prochaines prédictions"""
+        with self.lock:
+            self._add_history_entry(text, roles)
+        if not self.history_path or not roles:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"text": text, "roles": roles}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.logger.warning(f"Impossible d'enregistrer la détection : {str(e)}")
@@ -0,0 +1,113 @@
+# client_pool.py
+# Les SDK (httpx, ollama, together) sont importés au premier client créé : une
+# configuration uniquement locale n'importe jamais together, et inversement.
+from typing import TYPE_CHECKING, Dict
+import asyncio
+import inspect
+import os
+import threading
+import weakref
+
+if TYPE_CHECKING:
+    import httpx
+    from ollama import AsyncClient, Client
+    from together import AsyncTogether, Together
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+_lock = threading.Lock()
+_ollama_client = None
+_together_clients: Dict[str, "Together"] = {}
+# Les clients asynchrones sont liés à la boucle d'événements qui les utilise
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def ollama_host() -> str:
+    """Adresse du serveur Ollama (OLLAMA_HOST dans le .env)"""
+    return os.getenv("OLLAMA_HOST", DEFAULT_OLLAMA_HOST)
+
+
+def ollama_keep_alive() -> str:
+    """Durée pendant laquelle Ollama garde un modèle chargé après un appel (ECHOPAGE_OLLAMA_KEEP_ALIVE)"""
+    return os.getenv("ECHOPAGE_OLLAMA_KEEP_ALIVE", "30m")
+
+
+def _limits() -> "httpx.Limits":
+    """Taille du pool de connexions, partagée par tous les rôles"""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=int(os.getenv("ECHOPAGE_HTTP_MAX_CONNECTIONS", "32")),
+        max_keepalive_connections=int(os.getenv("ECHOPAGE_HTTP_KEEPALIVE_CONNECTIONS", "16")),
+        keepalive_expiry=float(os.getenv("ECHOPAGE_HTTP_KEEPALIVE_EXPIRY", "60"))
+    )
+
+
+def _together_options(cls, http_client) -> dict:
+    """Options de construction du client Together (together >= 2.0 accepte un client httpx)"""
+    options = {}
+    base_url = os.getenv("TOGETHER_BASE_URL")
+    if base_url:
+        options["base_url"] = base_url
+    parameters = inspect.signature(cls.__init__).parameters
+    if "max_retries" in parameters:
+        # Les nouvelles tentatives sont gérées par le limiteur de débit partagé
+        options["max_retries"] = 0
+    if "http_client" in parameters:
+        import httpx
+
+        options["http_client"] = http_client(limits=_limits(), timeout=httpx.Timeout(600, connect=10))
+    return options
+
+
+def get_ollama_client() -> "Client":
+    """Client Ollama partagé par tout le processus (connexions keep-alive)"""
+    global _ollama_client
+    with _lock:
+        if _ollama_client is None:
+            from ollama import Client
+
+            _ollama_client = Client(host=ollama_host(), limits=_limits())
+        return _ollama_client
+
+
+def get_together_client(api_key: str) -> "Together":
+    """Client Together partagé par tout le processus, un par clé API"""
+    with _lock:
+        client = _together_clients.get(api_key)
+        if client is None:
+            import httpx
+            from together import Together
+
+            client = Together(api_key=api_key, **_together_options(Together, httpx.Client))
+            _together_clients[api_key] = client
+        return client
+
+
+def _loop_clients() -> dict:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def get_async_ollama_client() -> "AsyncClient":
+    """Client Ollama asynchrone partagé par toutes les coroutines de la boucle courante"""
+    clients = _loop_clients()
+    if "ollama" not in clients:
+        from ollama import AsyncClient
+
+        clients["ollama"] = AsyncClient(host=ollama_host(), limits=_limits())
+    return clients["ollama"]
+
+
+def get_async_together_client(api_key: str) -> "AsyncTogether":
+    """Client Together asynchrone partagé par toutes les coroutines de la boucle courante"""
+    clients = _loop_clients()
+    key = ("together", api_key)
+    if key not in clients:
+        import httpx
+        from together import AsyncTogether
+
+        clients[key] = AsyncTogether(api_key=api_key, **_together_options(AsyncTogether, httpx.AsyncClient))
+    return clients[key]
+
@@ -1,43 +1,170 @@
 from .base_role import BaseRole
-import re
+from .metrics import get_metrics, span
+from .prompt_packer import PromptPacker, estimate_tokens
+from .reasoning import strip_reasoning
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from typing import Callable, List, Optional
+import asyncio
+import os
+import time
 
 class Connecteur(BaseRole):
-    def __init__(self, model_name='deepseek-r1:14b', mode='external'):
+    default_mode = 'external'
+
+    def __init__(self, model_name: Optional[str] = None, mode: Optional[str] = None, use_cache=True,
+                 summary_concurrency: Optional[int] = None, prompt_budget: Optional[int] = None):
         """
         Initialise un Connecteur qui peut fonctionner en mode local ou externe.
+
+        :param summary_concurrency: Nombre de résumés partiels générés en même temps en mode local
+                                    (ECHOPAGE_SUMMARY_CONCURRENCY, sinon OLLAMA_NUM_PARALLEL, sinon 2).
+        :param prompt_budget: Taille maximale (tokens estimés) du prompt de synthèse du mode externe
+                              (ECHOPAGE_CONNECTEUR_PROMPT_TOKENS, 6000 par défaut).
         """
-        super().__init__(model_name, mode)
+        super().__init__(model_name, mode, use_cache)
+        self.summary_concurrency = summary_concurrency or int(
+            os.getenv("ECHOPAGE_SUMMARY_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "2"))
+        )
+        self.prompt_budget = prompt_budget or int(os.getenv("ECHOPAGE_CONNECTEUR_PROMPT_TOKENS", "6000"))
+        self.packer = PromptPacker(self.prompt_budget)
+        if self.mode == 'local':
+            # Les résumés partiels passent par le pool partagé sous le rôle 'connecteur'
+            self.max_concurrency = self.summary_concurrency
     
-    def execute(self, prompt: str, responses: list) -> str:
-        """Relie et synthétise les idées des différents rôles pour créer une vision cohérente."""
+    def execute(self, prompt: str, responses: list, on_token: Optional[Callable[[str], None]] = None,
+                submit: Optional[Callable[..., Future]] = None, timeout: Optional[float] = None) -> str:
+        """
+        Relie et synthétise les idées des différents rôles pour créer une vision cohérente.
+
+        :param submit: Fonction de soumission (fn, *args) -> Future du pool partagé, pour les
+                       résumés partiels du mode local ; un pool temporaire est créé sinon.
+        :param timeout: Délai maximal des résumés partiels du mode local, en secondes
+                        (concurrent.futures.TimeoutError au-delà, les résumés en attente sont annulés).
+        """
         if self.mode == 'local':
-            # Résumer chaque réponse individuellement
-            partial_summaries = []
-            for resp in responses:
-                individual_prompt = self.build_individual_prompt(prompt, resp)
-                
-                partial_summary = self.generate_response(individual_prompt, temp=1.2)
-                partial_summary = self.clean_think_tags(partial_summary)
-                
-                partial_summaries.append(f"Résumé du rôle {resp['role']} : {partial_summary}")
+            # Résumer chaque réponse individuellement, en parallèle (map)
+            partial_summaries = self._summarize_all(prompt, responses, submit, timeout)
         
-            # Résumer l'ensemble des mini-résumés
-            final_prompt = self.build_final_prompt(prompt, partial_summaries)
-            self.save_summary_to_file("\n\n".join(partial_summaries))
-            return self.generate_response(final_prompt, temp=1.2)
+            # Résumer l'ensemble des mini-résumés (reduce)
+            return self.synthesize(prompt, partial_summaries, on_token)
         
         else:
             # Mode externe : tout en une seule fois
-            formatted_responses = "\n".join(
-                [f"Réponse de l'aidant {resp['role']}: {resp['response']}" for resp in responses]
-            )
-            full_prompt = self.build_final_prompt(prompt, [formatted_responses])
-            return self.generate_response(full_prompt, temp=1.1)
-            
+            return self.generate_response(self.build_external_prompt(prompt, responses), temp=1.1, on_token=on_token)
+
+    def summarize_response(self, prompt: str, response: dict) -> str:
+        """Résume la réponse d'un rôle (étape map du mode local)."""
+        summary = self.generate_response(self.build_individual_prompt(prompt, response), temp=1.2)
+        return self.format_partial_summary(response, summary)
+
+    def synthesize(self, prompt: str, partial_summaries: List[str],
+                   on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Synthèse finale des résumés partiels (étape reduce du mode local)."""
+        return self.generate_response(self.prepare_synthesis(prompt, partial_summaries), temp=1.2, on_token=on_token)
+
+    def _summarize_all(self, prompt: str, responses: list, submit: Optional[Callable[..., Future]] = None,
+                       timeout: Optional[float] = None) -> List[str]:
+        """Génère les résumés partiels avec au plus `summary_concurrency` générations simultanées"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        own_executor = None
+        if submit is None:
+            own_executor = ThreadPoolExecutor(max_workers=max(1, min(self.summary_concurrency, len(responses))))
+            submit = own_executor.submit
+
+        try:
+            summaries = [None] * len(responses)
+            waiting = list(enumerate(responses))
+            pending = {}
+            while waiting or pending:
+                while waiting and len(pending) < self.summary_concurrency:
+                    index, resp = waiting.pop(0)
+                    pending[submit(self.summarize_response, prompt, resp)] = index
+                remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    for future in pending:
+                        future.cancel()
+                    raise FuturesTimeoutError()
+                for future in done:
+                    summaries[pending.pop(future)] = future.result()
+            return summaries
+        finally:
+            if own_executor is not None:
+                own_executor.shutdown(wait=False)
+
+    async def execute_async(self, prompt: str, responses: list, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Version asynchrone de execute."""
+        if self.mode == 'local':
+            semaphore = asyncio.Semaphore(self.summary_concurrency)
+
+            async def summarize(resp: dict) -> str:
+                async with semaphore:
+                    return await self.summarize_response_async(prompt, resp)
+
+            partial_summaries = await asyncio.gather(*(summarize(resp) for resp in responses))
+            return await self.synthesize_async(prompt, list(partial_summaries), on_token)
+
+        else:
+            return await self.generate_response_async(self.build_external_prompt(prompt, responses), temp=1.1,
+                                                      on_token=on_token)
+
+    async def summarize_response_async(self, prompt: str, response: dict) -> str:
+        """Version asynchrone de summarize_response."""
+        summary = await self.generate_response_async(self.build_individual_prompt(prompt, response), temp=1.2)
+        return self.format_partial_summary(response, summary)
+
+    async def synthesize_async(self, prompt: str, partial_summaries: List[str],
+                               on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Version asynchrone de synthesize."""
+        return await self.generate_response_async(self.prepare_synthesis(prompt, partial_summaries), temp=1.2,
+                                                  on_token=on_token)
+
+    def format_partial_summary(self, response: dict, summary: str) -> str:
+        """Résumé partiel d'un rôle, sans le raisonnement du modèle"""
+        return f"Résumé du rôle {response['role']} : {self.clean_think_tags(summary)}"
+
+    def prepare_synthesis(self, prompt: str, partial_summaries: List[str]) -> str:
+        """Enregistre les résumés partiels et retourne le prompt de la synthèse finale"""
+        self.save_summary_to_file("\n\n".join(partial_summaries))
+        return self.build_final_prompt(prompt, partial_summaries)
+
+    def build_external_prompt(self, prompt: str, responses: list) -> str:
+        """Prompt unique du mode externe : toutes les réponses, ramenées au budget du prompt"""
+        return self.build_final_prompt(prompt, [self.format_responses(responses, prompt)])
+
     def clean_think_tags(self, text: str) -> str:
-        """Supprime les balises <think> et leur contenu du texte."""
-        return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-            
+        """Supprime les balises <think> et leur contenu du texte (même non refermées)."""
+        return strip_reasoning(text)
+
+    def format_responses(self, responses: list, prompt: Optional[str] = None) -> str:
+        """
+        Réponses des rôles pour la synthèse du mode externe, sans leur raisonnement.
+        Avec la demande `prompt`, les réponses les plus longues sont résumées (extraits) pour
+        que le prompt final tienne dans `prompt_budget`.
+        """
+        if prompt is not None:
+            responses = self.pack_responses(prompt, responses)
+        return "\n".join(
+            f"Réponse de l'aidant {resp['role']}: {self.clean_think_tags(resp['response'])}" for resp in responses
+        )
+
+    def pack_responses(self, prompt: str, responses: list) -> list:
+        """Fait tenir les réponses dans le budget du prompt final, sans appel au LLM"""
+        with span('packing', role='connecteur') as stage:
+            # Part du budget laissée aux réponses : tout sauf les consignes et la demande
+            framing = self.build_final_prompt(prompt, [
+                f"Réponse de l'aidant {resp['role']}: " for resp in responses
+            ])
+            packed, stats = self.packer.pack(prompt, responses, self.prompt_budget - estimate_tokens(framing))
+            stage.set(**stats)
+        get_metrics().observe("prompt_tokens_saved", stats['tokens_saved'])
+        if stats['compressed']:
+            self.logger.info(
+                f"Prompt de synthèse réduit de {stats['tokens_before']} à {stats['tokens_after']} tokens estimés "
+                f"({stats['compressed']} réponse(s) résumée(s))"
+            )
+        return packed
+
     def save_summary_to_file(self, summary: str, filename: str = "resumesConnecteur.txt"):
         with open(filename, "w", encoding="utf-8") as file:
             file.write(summary)
@@ -50,7 +177,7 @@ class Connecteur(BaseRole):
             Voici la demande initiale : "{prompt}"
 
             Réponse de l'aidant {response['role']} :
-            {response['response']}
+            {self.clean_think_tags(response['response'])}
 
             Ta mission est d'identifier les points clés et résumer en quelques phrases l'essence de cette réponse.
             """
@@ -1,55 +1,191 @@
 from .base_role import BaseRole
-from pathlib import Path
-from typing import List
+from .classifieur_intentions import ClassifieurIntentions, DEFAULT_HISTORY_PATH, DEFAULT_MAX_HISTORY
+from .metrics import span
+from .reasoning import strip_reasoning
+from .registry import get_role_registry
+from typing import List, Optional, Tuple
 import json
 import logging
-import re
+import os
 
 class DetecteurBesoins(BaseRole):
-    def __init__(self):
+    # Plafond de la réponse du LLM : {"roles": [...]} tient en quelques dizaines de tokens
+    MAX_DETECTION_TOKENS = 96
+
+    # Mapping des rôles avec leurs mots-clés et poids associés
+    KEYWORD_MAPPING = {
+        'recherche': {
+            'keywords': ['information', 'données', 'étude', 'recherche', 'statistiques', 'faits'],
+            'weight': 1.0
+        },
+        'conseil': {
+            'keywords': ['stress', 'moral', 'émotion', 'confiance', 'solitude', 'soutien', 'relation'],
+            'weight': 1.2  # Poids plus élevé pour les termes émotionnels
+        },
+        'organisation': {
+            'keywords': ['plan', 'organisation', 'temps', 'projet', 'logistique', 'routine'],
+            'weight': 1.0
+        },
+        'créatif': {
+            'keywords': ['idée', 'créatif', 'innovation', 'inspiration', 'concept', 'brainstorming'],
+            'weight': 1.0
+        },
+        'coach': {
+            'keywords': ['productivité', 'efficacité', 'procrastination', 'motivation', 'discipline'],
+            'weight': 1.0
+        },
+        'coachpro': {
+            'keywords': ['carrière', 'leadership', 'professionnel', 'compétences', 'performance'],
+            'weight': 1.0
+        }
+    }
+
+    def __init__(self, confidence_threshold: Optional[float] = None):
+        """
+        :param confidence_threshold: Confiance minimale du classifieur local pour éviter l'appel au LLM
+                                     (ECHOPAGE_DETECTION_CONFIDENCE dans le .env, 0.4 par défaut).
+        """
         super().__init__()
         self.logger = logging.getLogger(self.__class__.__name__)
         #self.logger.setLevel(logging.DEBUG)
-        self.roles_file = Path(__file__).parent / "roles.json"  
+        self.registry = get_role_registry()
+        if confidence_threshold is None:
+            confidence_threshold = float(os.getenv("ECHOPAGE_DETECTION_CONFIDENCE", "0.4"))
+        self.confidence_threshold = confidence_threshold
+        self.classifier = None
+        self.classifier_version = None
 
-    def detect_roles(self, text: str) -> List[str]:
-        """Détection des rôles avec gestion d'erreur améliorée"""
-        try:
-            # Chargement des rôles
-            with open(self.roles_file, "r", encoding="utf-8") as f:
-                roles = json.load(f)
-            
-            # Construction dynamique du prompt
-            detection_sections = [
-                role["detection"] 
-                for role in roles 
-                if "detection" in role and role["detection"].strip()
-            ]
-            
-            self.logger.debug(f"Nombre de sections de détection trouvées : {len(detection_sections)}")
-            if not detection_sections:
-                self.logger.error("Aucune section de détection trouvée dans roles.json !")
-            
-            prompt = (
-                "Analyse cette demande utilisateur pour identifier le type de support requis selon ces critères :\n\n"
-                f"{'\n\n'.join(detection_sections)}\n\n"
-                f'Texte à analyser : "{text}"\n\n'
-                "Réponds UNIQUEMENT en JSON valide avec une clé 'roles' contenant la liste des services pertinents par ordre de priorité.\n"
-                'Exemple de réponse valide : {"roles": ["organisation", "coach"]}'
+    def _get_classifier(self) -> ClassifieurIntentions:
+        """Construit le classifieur local à la première détection, et de nouveau si roles.json a changé"""
+        snapshot = self.registry.snapshot()
+        if self.classifier is None or self.classifier_version != snapshot.version:
+            self.classifier_version = snapshot.version
+            self.classifier = ClassifieurIntentions(
+                snapshot.roles_data,
+                keyword_mapping=self.KEYWORD_MAPPING,
+                history_path=os.getenv("ECHOPAGE_DETECTION_HISTORY", DEFAULT_HISTORY_PATH),
+                max_history=int(os.getenv("ECHOPAGE_DETECTION_HISTORY_MAX", str(DEFAULT_MAX_HISTORY))),
+                valid_roles=snapshot.valid_roles
             )
+        return self.classifier
 
-            response = self.generate_response(prompt, temp=0.2, mode='local')
-            return self._parse_response(response)
+    def detect_roles(self, text: str) -> List[str]:
+        """
+        Détection des rôles avec gestion d'erreur améliorée.
+        Le classifieur local répond seul quand il est assez confiant ; sinon le LLM tranche.
+        """
+        with span('detection') as stage:
+            try:
+                predicted_roles, prompt = self._prepare_detection(text)
+                stage.set(source='classifier' if prompt is None else 'llm')
+                if prompt is None:
+                    return predicted_roles
+
+                response = self.generate_response(prompt, temp=0.2, mode='local',
+                                                  local_options=self._detection_options())
+                return self._parse_response(response, text)
             
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                self.logger.error(f"Erreur de configuration : {str(e)}")
+                stage.set(source='keywords')
+                return self._fallback_detection(text)
+            except Exception as e:
+                self.logger.error(f"Erreur inattendue : {str(e)}", exc_info=True)
+                stage.status = 'error'
+                return []
+
+    async def detect_roles_async(self, text: str) -> List[str]:
+        """Version asynchrone de detect_roles"""
+        with span('detection') as stage:
+            try:
+                predicted_roles, prompt = self._prepare_detection(text)
+                stage.set(source='classifier' if prompt is None else 'llm')
+                if prompt is None:
+                    return predicted_roles
+
+                response = await self.generate_response_async(prompt, temp=0.2, mode='local',
+                                                              local_options=self._detection_options())
+                return self._parse_response(response, text)
+
+            except (FileNotFoundError, json.JSONDecodeError) as e:
+                self.logger.error(f"Erreur de configuration : {str(e)}")
+                stage.set(source='keywords')
+                return self._fallback_detection(text)
+            except Exception as e:
+                self.logger.error(f"Erreur inattendue : {str(e)}", exc_info=True)
+                stage.status = 'error'
+                return []
+
+    def _detection_options(self) -> dict:
+        """
+        Sortie structurée pour Ollama : un objet {"roles": [...]} limité aux rôles valides,
+        sans raisonnement (<think>) et plafonné à MAX_DETECTION_TOKENS tokens.
+        """
+        schema = {
+            "type": "object",
+            "properties": {
+                "roles": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": sorted(self.registry.valid_roles)},
+                    "maxItems": 6
+                }
+            },
+            "required": ["roles"]
+        }
+        return {'format': schema, 'think': False, 'options': {'num_predict': self.MAX_DETECTION_TOKENS}}
+
+    def _prepare_detection(self, text: str) -> Tuple[List[str], Optional[str]]:
+        """
+        Tente la détection locale.
+
+        :return: (rôles prédits, None) si le classifieur est assez confiant,
+                 sinon ([], prompt à envoyer au LLM).
+        """
+        classifier = self._get_classifier()
+        predicted_roles, confidence = classifier.predict(text)
+        if predicted_roles and confidence >= self.confidence_threshold:
+            self.logger.info(f"Détection locale ({confidence:.2f}) : {predicted_roles}")
+            return predicted_roles, None
+        self.logger.debug(f"Confiance locale insuffisante ({confidence:.2f}), appel au LLM")
+
+        # Début du prompt (critères de chaque rôle) préparé par le registre à chaque rechargement
+        snapshot = self.registry.snapshot()
+        if not snapshot.detection_sections:
+            self.logger.error("Aucune section de détection trouvée dans roles.json !")
+
+        prompt = (
+            snapshot.detection_prefix
+            + f'Texte à analyser : "{text}"\n\n'
+            "Réponds UNIQUEMENT en JSON valide avec une clé 'roles' contenant la liste des services pertinents par ordre de priorité.\n"
+            'Exemple de réponse valide : {"roles": ["organisation", "coach"]}'
+        )
+        return [], prompt
+
+    def speculate(self, text: str, limit: int = 2) -> Tuple[List[str], bool]:
+        """
+        Rôles les plus probables sans appel au LLM (classifieur local, puis mots-clés).
+
+        :return: (rôles candidats, True si la prédiction est assez sûre pour se passer du LLM)
+        """
+        try:
+            predicted_roles, confidence = self._get_classifier().predict(text)
         except (FileNotFoundError, json.JSONDecodeError) as e:
             self.logger.error(f"Erreur de configuration : {str(e)}")
-            return self._fallback_detection(text)
-        except Exception as e:
-            self.logger.error(f"Erreur inattendue : {str(e)}", exc_info=True)
-            return []
+            predicted_roles, confidence = [], 0.0
+
+        if predicted_roles and confidence >= self.confidence_threshold:
+            return predicted_roles, True
 
-    def _parse_response(self, response: str) -> List[str]:
-        """Parse la réponse du modèle avec validation renforcée"""
+        if not predicted_roles:
+            scores = self._keyword_scores(text)
+            predicted_roles = sorted((role for role in scores if scores[role] > 0), key=scores.get, reverse=True)
+        return predicted_roles[:limit], False
+
+    def _parse_response(self, response: str, text: Optional[str] = None) -> List[str]:
+        """
+        Parse la réponse du modèle avec validation renforcée.
+        Si `text` est fourni, une détection valide est mémorisée par le classifieur local.
+        """
         try:
             clean_res = self._clean_response(response)
             json_str = self._extract_json(clean_res)
@@ -57,7 +193,7 @@ class DetecteurBesoins(BaseRole):
             
             data = json.loads(json_str)
             
-            valid_roles = self._get_valid_roles()
+            valid_roles = self.registry.valid_roles
             detected_roles = [
                 self._normalize_role(role) 
                 for role in data.get('roles', [])
@@ -65,18 +201,15 @@ class DetecteurBesoins(BaseRole):
             ]
             
             self.logger.debug(f"Rôles détectés après validation: {detected_roles}")
-            return list(dict.fromkeys(detected_roles))[:6]
+            detected_roles = list(dict.fromkeys(detected_roles))[:6]
+            if text is not None and self.classifier is not None:
+                self.classifier.record(text, detected_roles)
+            return detected_roles
 
         except (json.JSONDecodeError, KeyError) as e:
             self.logger.warning(f"Échec du parsing JSON: {str(e)}")
             return self._fallback_detection(clean_res)
             
-    def _get_valid_roles(self) -> set:
-        """Récupère dynamiquement les noms de rôles valides"""
-        with open(self.roles_file, "r", encoding="utf-8") as f:
-            roles = json.load(f)
-        return {role["name"].strip().lower() for role in roles}
-
     @staticmethod
     def _normalize_role(role_name: str) -> str:
         """Normalise le nom du rôle"""
@@ -84,67 +217,68 @@ class DetecteurBesoins(BaseRole):
 
     def _clean_response(self, text: str) -> str:
         """Nettoie la réponse du modèle"""
-        text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-        return text.lower().strip()
+        return strip_reasoning(text).lower()
 
     def _extract_json(self, text: str) -> str:
-        """Extrait le JSON de la réponse avec une regex compatible Python."""
-        # D'abord essayer de trouver un bloc JSON formel
-        json_match = re.search(r'```json\s*({.*?})\s*```', text, re.DOTALL)
-        if json_match:
-            return json_match.group(1)
-
-        # Sinon chercher le JSON le plus profond dans le texte
-        deepest_json = None
-        for match in re.finditer(r'{([^{}]*|(?R))*}', text, re.DOTALL):
-            current = match.group(0)
+        """
+        Extrait le plus grand objet JSON valide de la réponse, en un seul passage :
+        les accolades sont comptées hors des chaînes, chaque objet de premier niveau est validé.
+        """
+        text = text.strip()
+        if text.startswith('{') and text.endswith('}'):
+            # Sortie structurée : la réponse est l'objet lui-même (sinon, recherche des objets)
             try:
-                json.loads(current)  # Validation syntaxique
-                if not deepest_json or len(current) > len(deepest_json):
-                    deepest_json = current
-            except:
-                continue
+                json.loads(text)
+                return text
+            except json.JSONDecodeError:
+                pass
 
-        return deepest_json or text.strip()
+        best = None
+        depth = 0
+        start = 0
+        in_string = escaped = False
+        for i, char in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"' and depth:
+                in_string = True
+            elif char == '{':
+                if not depth:
+                    start = i
+                depth += 1
+            elif char == '}' and depth:
+                depth -= 1
+                if not depth:
+                    candidate = text[start:i + 1]
+                    try:
+                        json.loads(candidate)  # Validation syntaxique
+                    except json.JSONDecodeError:
+                        continue
+                    if best is None or len(candidate) > len(best):
+                        best = candidate
 
-    def _fallback_detection(self, text: str) -> List[str]:
-        """Détection de secours basée sur des mots-clés pondérés."""
-        # Mapping des rôles avec leurs mots-clés et poids associés
-        keyword_mapping = {
-            'recherche': {
-                'keywords': ['information', 'données', 'étude', 'recherche', 'statistiques', 'faits'],
-                'weight': 1.0
-            },
-            'conseil': {
-                'keywords': ['stress', 'moral', 'émotion', 'confiance', 'solitude', 'soutien', 'relation'],
-                'weight': 1.2  # Poids plus élevé pour les termes émotionnels
-            },
-            'organisation': {
-                'keywords': ['plan', 'organisation', 'temps', 'projet', 'logistique', 'routine'],
-                'weight': 1.0
-            },
-            'créatif': {
-                'keywords': ['idée', 'créatif', 'innovation', 'inspiration', 'concept', 'brainstorming'],
-                'weight': 1.0
-            },
-            'coach': {
-                'keywords': ['productivité', 'efficacité', 'procrastination', 'motivation', 'discipline'],
-                'weight': 1.0
-            },
-            'coachpro': {
-                'keywords': ['carrière', 'leadership', 'professionnel', 'compétences', 'performance'],
-                'weight': 1.0
-            }
-        }
+        return best or text
 
-        # Calcul des scores pour chaque rôle
-        scores = {role: 0 for role in keyword_mapping}
+    def _keyword_scores(self, text: str) -> dict:
+        """Score de chaque rôle d'après les mots-clés pondérés présents dans le texte"""
+        scores = {role: 0 for role in self.KEYWORD_MAPPING}
         text_lower = text.lower()
 
-        for role, data in keyword_mapping.items():
+        for role, data in self.KEYWORD_MAPPING.items():
             for keyword in data['keywords']:
                 if keyword in text_lower:
                     scores[role] += data['weight']
+        return scores
+
+    def _fallback_detection(self, text: str) -> List[str]:
+        """Détection de secours basée sur des mots-clés pondérés."""
+        # Calcul des scores pour chaque rôle
+        scores = self._keyword_scores(text)
 
         # Filtrage des rôles avec un score > 0
         detected_roles = [role for role, score in scores.items() if score > 0]
@@ -153,4 +287,4 @@ class DetecteurBesoins(BaseRole):
         detected_roles.sort(key=lambda x: scores[x], reverse=True)
 
         # Retourne les 3 rôles les plus pertinents (ou un fallback par défaut)
-        return detected_roles[:3] or ['conseil']
\ No newline at end of file
+        return detected_roles[:3] or ['conseil']
@@ -0,0 +1,150 @@
+# hedging.py
+from typing import AsyncIterator, Callable, Iterator, Tuple
+import asyncio
+import queue
+import threading
+import time
+
+# Fin normale d'un flux dans la file des événements
+_DONE = object()
+
+
+def hedged_stream(primary: Tuple[str, Callable[[], Iterator[str]]],
+                  secondary: Tuple[str, Callable[[], Iterator[str]]],
+                  delay: float, on_winner: Callable[[str, bool], None]) -> Iterator[str]:
+    """
+    Course entre deux flux : `primary` part seul, `secondary` est lancé s'il n'y a aucun fragment
+    au bout de `delay` secondes (ou tout de suite si `primary` échoue avant). Le premier flux
+    qui répond est transmis et l'autre est arrêté ; un appel bloquant ne pouvant pas être
+    interrompu d'un autre thread, le perdant s'arrête à son prochain fragment.
+
+    :param primary: (nom, fabrique du flux) du backend habituel.
+    :param secondary: (nom, fabrique du flux) du backend de relance.
+    :param on_winner: Appelé avec (nom du gagnant, relance lancée ?) dès que le gagnant est connu.
+    """
+    factories = dict([primary, secondary])
+    primary_name, secondary_name = primary[0], secondary[0]
+    events = queue.Queue()
+    stops = {}
+
+    def pump(name: str, stop: threading.Event):
+        try:
+            stream = factories[name]()
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        return
+                    events.put((name, chunk))
+            finally:
+                stream.close()
+            events.put((name, _DONE))
+        except Exception as e:
+            events.put((name, e))
+
+    def launch(name: str):
+        stops[name] = threading.Event()
+        threading.Thread(target=pump, args=(name, stops[name]), name=f"hedge-{name}", daemon=True).start()
+
+    launch(primary_name)
+    deadline = time.monotonic() + delay
+    winner = None
+    errors = {}
+    try:
+        while True:
+            timeout = None
+            if winner is None and secondary_name not in stops:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                name, item = events.get(timeout=timeout)
+            except queue.Empty:
+                launch(secondary_name)
+                continue
+
+            if winner is None:
+                if isinstance(item, Exception):
+                    errors[name] = item
+                    if secondary_name not in stops:
+                        launch(secondary_name)
+                    elif len(errors) == len(stops):
+                        raise errors[primary_name]
+                    continue
+                winner = name
+                for other, stop in stops.items():
+                    if other != winner:
+                        stop.set()
+                on_winner(winner, secondary_name in stops)
+
+            if name != winner:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for stop in stops.values():
+            stop.set()
+
+
+async def ahedged_stream(primary: Tuple[str, Callable[[], AsyncIterator[str]]],
+                         secondary: Tuple[str, Callable[[], AsyncIterator[str]]],
+                         delay: float, on_winner: Callable[[str, bool], None]) -> AsyncIterator[str]:
+    """Équivalent asynchrone de hedged_stream : le perdant est annulé aussitôt (connexion fermée)"""
+    factories = dict([primary, secondary])
+    primary_name, secondary_name = primary[0], secondary[0]
+    events = asyncio.Queue()
+    tasks = {}
+
+    async def pump(name: str):
+        stream = factories[name]()
+        try:
+            async for chunk in stream:
+                await events.put((name, chunk))
+            await events.put((name, _DONE))
+        except Exception as e:
+            await events.put((name, e))
+        finally:
+            await stream.aclose()
+
+    def launch(name: str):
+        tasks[name] = asyncio.ensure_future(pump(name))
+
+    launch(primary_name)
+    deadline = time.monotonic() + delay
+    winner = None
+    errors = {}
+    try:
+        while True:
+            timeout = None
+            if winner is None and secondary_name not in tasks:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                name, item = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                launch(secondary_name)
+                continue
+
+            if winner is None:
+                if isinstance(item, Exception):
+                    errors[name] = item
+                    if secondary_name not in tasks:
+                        launch(secondary_name)
+                    elif len(errors) == len(tasks):
+                        raise errors[primary_name]
+                    continue
+                winner = name
+                for other, task in tasks.items():
+                    if other != winner:
+                        task.cancel()
+                on_winner(winner, secondary_name in tasks)
+
+            if name != winner:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in tasks.values():
+            task.cancel()
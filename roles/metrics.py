@@ -0,0 +1,296 @@
+# metrics.py
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Span en cours dans le contexte courant (thread ou tâche asyncio)
+_current_span = contextvars.ContextVar("echopage_span", default=None)
+
+
+class Span:
+    """Étape chronométrée du pipeline ; les attributs peuvent être complétés pendant l'étape"""
+
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start', 'started', 'duration', 'status')
+
+    def __init__(self, name: str, attributes: dict, parent: Optional["Span"] = None):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status = 'ok'
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class MetricsRegistry:
+    """
+    Durées des étapes du pipeline (détection, rôles, appels aux backends, Connecteur, rapport).
+
+    Chaque étape terminée est ajoutée aux traces JSONL (si un fichier est configuré) et à
+    des échantillons bornés par étape, d'où sont tirés les p50/p95/p99 exportés au format
+    texte de Prometheus (fichier et/ou petit serveur HTTP).
+    """
+
+    # Attributs repris comme labels Prometheus (les autres ne vont que dans les traces)
+    LABELS = ('role', 'backend', 'model')
+
+    def __init__(self, trace_path: Optional[str] = None, metrics_path: Optional[str] = None,
+                 max_samples: int = 2048, export_interval: float = 5.0):
+        """
+        :param trace_path: Fichier JSONL des traces (None : pas de traces).
+        :param metrics_path: Fichier texte Prometheus réécrit au fil de l'eau (None : pas de fichier).
+        :param max_samples: Nombre d'échantillons récents gardés par série pour les percentiles.
+        :param export_interval: Délai minimal entre deux réécritures du fichier Prometheus, en secondes.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.max_samples = max_samples
+        self.export_interval = export_interval
+        self.lock = threading.Lock()
+        # (métrique, labels) -> [échantillons récents, nombre total, somme]
+        self.series: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], list] = {}
+        self.trace_file = None
+        self.last_export = 0.0
+        self.server = None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Chronomètre un bloc ; les spans imbriqués (même dans un autre thread du pool) partagent la trace"""
+        current = Span(name, attributes, _current_span.get())
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.status = 'cancelled' if type(e).__name__ in ('CancelledError', 'GenerationCancelled') else 'error'
+            current.attributes.setdefault('error', str(e)[:200])
+            raise
+        finally:
+            _current_span.reset(token)
+            current.duration = time.perf_counter() - current.started
+            self.finish(current)
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """
+        Ouvre un span sans le rendre courant, à terminer par end_span : pour les générateurs,
+        dont les `yield` ne doivent pas laisser de span courant chez l'appelant.
+        """
+        return Span(name, attributes, _current_span.get())
+
+    def end_span(self, span: Span, status: str = 'ok'):
+        """Termine un span ouvert par start_span"""
+        span.duration = time.perf_counter() - span.started
+        span.status = status
+        self.finish(span)
+
+    def finish(self, span: Span):
+        """Enregistre un span terminé"""
+        labels = tuple((key, str(span.attributes[key])) for key in self.LABELS if key in span.attributes)
+        self.observe(f"{span.name}_seconds", span.duration, labels + (('status', span.status),))
+        tokens_per_second = span.attributes.get('tokens_per_second')
+        if tokens_per_second:
+            self.observe("tokens_per_second", tokens_per_second, labels)
+        if self.trace_path:
+            self._write_trace(span.to_dict())
+        if self.metrics_path and time.monotonic() - self.last_export >= self.export_interval:
+            self.write_prometheus(self.metrics_path)
+
+    def observe(self, metric: str, value: float, labels: Tuple[Tuple[str, str], ...] = ()):
+        """Ajoute une valeur à une série"""
+        with self.lock:
+            series = self.series.get((metric, labels))
+            if series is None:
+                series = self.series[(metric, labels)] = [deque(maxlen=self.max_samples), 0, 0.0]
+            series[0].append(value)
+            series[1] += 1
+            series[2] += value
+
+    def _write_trace(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            try:
+                if self.trace_file is None:
+                    directory = os.path.dirname(self.trace_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self.trace_file = open(self.trace_path, "a", encoding="utf-8")
+                self.trace_file.write(line)
+                self.trace_file.flush()
+            except OSError as e:
+                self.logger.error(f"Écriture des traces impossible ({self.trace_path}) : {str(e)}")
+                self.trace_path = None
+
+    def percentiles(self, metric: str, **labels) -> Dict[str, float]:
+        """p50/p95/p99, nombre et somme d'une métrique, toutes séries confondues ou filtrées par labels"""
+        with self.lock:
+            samples, count, total = [], 0, 0.0
+            for (name, series_labels), (values, series_count, series_sum) in self.series.items():
+                if name == metric and all((key, str(value)) in series_labels for key, value in labels.items()):
+                    samples.extend(values)
+                    count += series_count
+                    total += series_sum
+        result = {f"p{int(q * 100)}": _quantile(sorted(samples), q) for q in QUANTILES}
+        result.update(count=count, sum=round(total, 6))
+        return result
+
+    def render_prometheus(self) -> str:
+        """Toutes les séries au format texte de Prometheus (type summary : quantiles, _sum, _count)"""
+        with self.lock:
+            snapshot = [(name, labels, sorted(values), count, total)
+                        for (name, labels), (values, count, total) in sorted(self.series.items())]
+
+        lines = []
+        declared = set()
+        for name, labels, values, count, total in snapshot:
+            metric = f"echopage_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f"{metric}{_format_labels(labels + (('quantile', str(q)),))} {_quantile(values, q):.6f}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Réécrit le fichier Prometheus de façon atomique"""
+        self.last_export = time.monotonic()
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(temporary, path)
+        except OSError as e:
+            self.logger.error(f"Écriture des métriques impossible ({path}) : {str(e)}")
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Expose GET /metrics sur un petit serveur HTTP en arrière-plan"""
+        if self.server is not None:
+            return
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        self.logger.info(f"Métriques disponibles sur http://{host}:{self.server.server_port}/metrics")
+
+    def close(self):
+        """Écrit le dernier état des métriques et ferme les traces"""
+        if self.metrics_path:
+            self.write_prometheus(self.metrics_path)
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+def _quantile(values: List[float], q: float) -> float:
+    """Quantile par rang le plus proche d'une liste triée (0 si vide)"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def current_span() -> Optional[Span]:
+    """Span en cours dans ce contexte (None hors de toute étape)"""
+    return _current_span.get()
+
+
+_shared_metrics = None
+_shared_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Registre partagé par tout le processus (configuré via .env) :
+    ECHOPAGE_TRACE_PATH (traces JSONL), ECHOPAGE_METRICS_PATH (fichier Prometheus),
+    ECHOPAGE_METRICS_PORT (serveur HTTP /metrics).
+    """
+    global _shared_metrics
+    with _shared_metrics_lock:
+        if _shared_metrics is None:
+            _shared_metrics = MetricsRegistry(
+                trace_path=os.getenv("ECHOPAGE_TRACE_PATH") or None,
+                metrics_path=os.getenv("ECHOPAGE_METRICS_PATH") or None
+            )
+            port = os.getenv("ECHOPAGE_METRICS_PORT")
+            if port:
+                try:
+                    _shared_metrics.serve(int(port))
+                except OSError as e:
+                    _shared_metrics.logger.error(f"Serveur de métriques indisponible (port {port}) : {str(e)}")
+        return _shared_metrics
+
+
+def configure_metrics(trace_path: Optional[str] = None, metrics_path: Optional[str] = None,
+                      port: Optional[int] = None) -> MetricsRegistry:
+    """Remplace le registre partagé (options de la ligne de commande, prioritaires sur le .env)"""
+    global _shared_metrics
+    registry = MetricsRegistry(trace_path=trace_path, metrics_path=metrics_path)
+    if port:
+        registry.serve(port)
+    with _shared_metrics_lock:
+        previous, _shared_metrics = _shared_metrics, registry
+    if previous is not None:
+        previous.close()
+    return registry
+
+
+def span(name: str, **attributes):
+    """Raccourci : chronomètre un bloc dans le registre partagé"""
+    return get_metrics().span(name, **attributes)
@@ -0,0 +1,162 @@
+# ollama_health.py
+from typing import Callable, List, Optional
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from .client_pool import ollama_host
+
+UNKNOWN, UP, DOWN = 'unknown', 'up', 'down'
+
+
+class OllamaHealthMonitor:
+    """
+    Surveille en arrière-plan la disponibilité du serveur Ollama (/api/tags).
+
+    L'état est mis en cache : l'interface et AgentManager le lisent sans jamais attendre
+    une requête HTTP. Tant que le serveur ne répond pas, les vérifications s'espacent
+    (backoff exponentiel) ; une fois prêt, il est revérifié à intervalle régulier.
+    """
+
+    def __init__(self, host: Optional[str] = None, min_interval: float = 0.5, max_interval: float = 30.0,
+                 healthy_interval: float = 15.0, timeout: float = 2.0):
+        """
+        :param host: Adresse du serveur Ollama (OLLAMA_HOST par défaut).
+        :param min_interval: Délai avant la première nouvelle vérification après un échec, en secondes.
+        :param max_interval: Délai maximal entre deux vérifications en échec.
+        :param healthy_interval: Délai entre deux vérifications quand le serveur répond.
+        :param timeout: Délai maximal d'une vérification.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.host = host or ollama_host()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.healthy_interval = healthy_interval
+        self.timeout = timeout
+
+        self.status = UNKNOWN
+        self.models: List[str] = []
+        self.last_check = 0.0
+        self.last_error: Optional[str] = None
+        self.checks = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.wake = threading.Event()
+        self.listeners: List[Callable[[str], None]] = []
+        self.thread = None
+        self.stopping = False
+
+    def start(self):
+        """Démarre la surveillance (sans effet si elle tourne déjà)"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stopping = False
+            self.thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Arrête la surveillance"""
+        with self.lock:
+            self.stopping = True
+            thread, self.thread = self.thread, None
+        self.wake.set()
+        if thread is not None:
+            thread.join(self.timeout + 1)
+
+    def check_now(self):
+        """Demande une vérification immédiate et repart du délai minimal (ex. après avoir lancé Ollama)"""
+        self.start()
+        self.wake.set()
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """`callback(status)` est appelé (depuis le thread de surveillance) à chaque changement d'état"""
+        self.listeners.append(callback)
+
+    def is_ready(self) -> bool:
+        """Vrai si la dernière vérification a réussi (état en cache, non bloquant)"""
+        return self.status == UP
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Attend que le serveur réponde, au plus `timeout` secondes ; retourne l'état final"""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.changed:
+            while self.status != UP:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+            return True
+
+    def probe(self) -> bool:
+        """Vérification synchrone de /api/tags ; met à jour l'état en cache"""
+        try:
+            with urllib.request.urlopen(f"{self.host.rstrip('/')}/api/tags", timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode("utf-8") or "{}")
+            models = [model.get('name') or model.get('model') for model in payload.get('models', [])]
+            self._set_status(UP, models, None)
+            return True
+        except (OSError, ValueError) as e:
+            # URLError, refus de connexion, délai dépassé ou réponse illisible
+            self._set_status(DOWN, [], str(getattr(e, 'reason', e)))
+            return False
+
+    def _set_status(self, status: str, models: List[str], error: Optional[str]):
+        with self.changed:
+            previous = self.status
+            self.status, self.models, self.last_error = status, models, error
+            self.last_check = time.time()
+            self.checks += 1
+            self.changed.notify_all()
+        if status != previous:
+            if status == UP:
+                self.logger.info(f"Ollama disponible sur {self.host} ({len(models)} modèles)")
+            else:
+                self.logger.warning(f"Ollama injoignable sur {self.host} : {error}")
+            for callback in list(self.listeners):
+                try:
+                    callback(status)
+                except Exception as e:
+                    self.logger.error(f"Erreur du suivi d'état Ollama : {str(e)}")
+
+    def _run(self):
+        delay = self.min_interval
+        while not self.stopping:
+            if self.probe():
+                delay = self.min_interval
+                wait = self.healthy_interval
+            else:
+                wait = delay
+                delay = min(self.max_interval, delay * 2)
+            # check_now() interrompt l'attente et repart du délai minimal
+            if self.wake.wait(wait):
+                self.wake.clear()
+                delay = self.min_interval
+
+    def stats(self) -> dict:
+        """Retourne l'état courant de la surveillance"""
+        with self.lock:
+            return {
+                'status': self.status,
+                'models': list(self.models),
+                'last_check': self.last_check,
+                'last_error': self.last_error,
+                'checks': self.checks
+            }
+
+
+_shared_monitor = None
+_shared_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> OllamaHealthMonitor:
+    """Surveillance partagée par tout le processus (démarrée à la première utilisation)"""
+    global _shared_monitor
+    with _shared_monitor_lock:
+        if _shared_monitor is None:
+            _shared_monitor = OllamaHealthMonitor()
+        return _shared_monitor
@@ -0,0 +1,164 @@
+# prompt_packer.py
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+
+from .reasoning import strip_reasoning
+
+# Mots et signes de ponctuation : un mot long compte pour plusieurs tokens (≈ 5 caractères par token)
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w{4,}")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+HEADING_PATTERN = re.compile(r"^\s*(#{1,6}\s|\*\*[^*]+\*\*\s*:?\s*$)")
+
+# Mots trop fréquents pour distinguer une phrase d'une autre
+STOPWORDS = frozenset(
+    "avec dans pour plus sont cette leur leurs nous vous elle elles être avoir fait faire "
+    "comme mais aussi tout tous toute toutes très bien peut peux sans sous entre votre notre "
+    "quand alors donc ainsi chaque autre autres même celui celle ceux dont était sera".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un texte, sans tokenizer (mots longs comptés plusieurs fois)"""
+    return sum(math.ceil(len(token) / 5) for token in TOKEN_PATTERN.findall(text))
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _units(text: str) -> List[Tuple[int, str, bool]]:
+    """Découpe un texte en phrases : (numéro de ligne, phrase, titre ?)"""
+    units = []
+    for line_number, line in enumerate(text.splitlines()):
+        if not line.strip():
+            continue
+        if HEADING_PATTERN.match(line):
+            units.append((line_number, line.rstrip(), True))
+            continue
+        for sentence in SENTENCE_END.split(line.rstrip()):
+            if sentence.strip():
+                units.append((line_number, sentence, False))
+    return units
+
+
+def compress(text: str, target_tokens: int, query: str = "") -> str:
+    """
+    Résumé extractif d'un texte en au plus `target_tokens` tokens, sans appel au LLM.
+
+    Les phrases sont classées par densité en mots importants du texte, proximité avec la
+    demande et position (début de réponse, début de paragraphe), puis gardées dans l'ordre
+    d'origine avec le titre de leur section.
+    """
+    if target_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= target_tokens:
+        return text
+
+    units = _units(text)
+    frequencies = Counter(_words(text))
+    query_words = set(_words(query))
+    heading_of = {}
+    scores = []
+    heading = None
+    previous_line = None
+    for index, (line_number, sentence, is_heading) in enumerate(units):
+        if is_heading:
+            heading = index
+            continue
+        heading_of[index] = heading
+        words = _words(sentence)
+        score = sum(frequencies[word] for word in set(words)) / math.sqrt(len(words) + 1)
+        score += 2.0 * len(query_words.intersection(words))
+        if not scores:
+            score *= 1.5  # Première phrase de la réponse
+        elif line_number != previous_line:
+            score *= 1.2  # Première phrase d'un paragraphe ou d'un élément de liste
+        previous_line = line_number
+        scores.append((score, index))
+
+    costs = {index: estimate_tokens(units[index][1]) for index in range(len(units))}
+    remaining = target_tokens
+    selected = set()
+    for score, index in sorted(scores, key=lambda item: (-item[0], item[1])):
+        section = heading_of.get(index)
+        cost = costs[index] + (costs[section] if section is not None and section not in selected else 0)
+        if cost > remaining:
+            continue
+        selected.add(index)
+        if section is not None:
+            selected.add(section)
+        remaining -= cost
+
+    if not selected:
+        # Une seule phrase plus longue que le budget : on la coupe
+        words = units[scores[0][1]][1].split() if scores else text.split()
+        kept, total = [], 0
+        for word in words:
+            total += estimate_tokens(word) + 1
+            if total > target_tokens:
+                break
+            kept.append(word)
+        return " ".join(kept) + " …"
+
+    lines: Dict[int, List[str]] = {}
+    for index in sorted(selected):
+        line_number, sentence, _ = units[index]
+        lines.setdefault(line_number, []).append(sentence)
+    return "\n".join(" ".join(sentences) for _, sentences in sorted(lines.items()))
+
+
+def allocate(sizes: List[int], budget: int) -> List[int]:
+    """
+    Partage un budget de tokens entre des textes de tailles `sizes`.
+    Les textes plus courts que la moitié d'une part égale restent entiers ; le reste du
+    budget est réparti entre les autres proportionnellement à leur longueur.
+    """
+    if sum(sizes) <= budget:
+        return list(sizes)
+    floor = budget / max(1, len(sizes)) / 2
+    kept = [size <= floor for size in sizes]
+    remaining = budget - sum(size for size, keep in zip(sizes, kept) if keep)
+    longer = sum(size for size, keep in zip(sizes, kept) if not keep)
+    return [size if keep else int(remaining * size / longer) for size, keep in zip(sizes, kept)]
+
+
+class PromptPacker:
+    """Fait tenir les réponses des rôles dans un budget de tokens avant la synthèse"""
+
+    def __init__(self, budget: int):
+        """
+        :param budget: Nombre maximal de tokens (estimés) pour l'ensemble des réponses.
+        """
+        self.budget = budget
+
+    def pack(self, query: str, responses: List[dict], budget: Optional[int] = None) -> Tuple[List[dict], dict]:
+        """
+        Réponses sans raisonnement, les plus longues résumées de façon extractive si besoin.
+
+        :param query: Demande initiale (les phrases qui la rejoignent sont privilégiées).
+        :param responses: [{'role': ..., 'response': ...}]
+        :param budget: Budget de cet appel (budget de l'instance par défaut).
+        :return: (réponses, statistiques : tokens avant, après et économisés)
+        """
+        budget = self.budget if budget is None else budget
+        raw_tokens = sum(estimate_tokens(resp['response']) for resp in responses)
+        cleaned = [dict(resp, response=strip_reasoning(resp['response'])) for resp in responses]
+        sizes = [estimate_tokens(resp['response']) for resp in cleaned]
+
+        packed = []
+        for resp, size, share in zip(cleaned, sizes, allocate(sizes, max(0, budget))):
+            if share < size:
+                resp = dict(resp, response=compress(resp['response'], share, query))
+            packed.append(resp)
+
+        packed_tokens = sum(estimate_tokens(resp['response']) for resp in packed)
+        stats = {
+            'tokens_before': raw_tokens,
+            'tokens_after': packed_tokens,
+            'tokens_saved': raw_tokens - packed_tokens,
+            'compressed': sum(1 for size, resp in zip(sizes, packed) if estimate_tokens(resp['response']) < size)
+        }
+        return packed, stats
@@ -0,0 +1,181 @@
+# rate_limiter.py
+from typing import Dict, Optional
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Limiteur de débit d'un fournisseur, partagé par tous les rôles qui utilisent la même clé API.
+
+    Deux seaux à jetons (requêtes par minute, tokens par minute) et une limite de
+    concurrence adaptative de type AIMD : elle est divisée par deux à chaque refus (429)
+    et remonte doucement, d'environ une place par série d'appels réussis.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 60, tokens_per_minute: float = 0,
+                 max_concurrency: int = 8, min_concurrency: int = 1, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        :param name: Nom du fournisseur (pour les journaux).
+        :param requests_per_minute: Débit maximal de requêtes (0 : illimité).
+        :param tokens_per_minute: Débit maximal de tokens estimés (0 : illimité).
+        :param max_concurrency: Plafond de la limite de concurrence adaptative.
+        :param min_concurrency: Plancher de la limite de concurrence adaptative.
+        :param max_retries: Nombre de nouvelles tentatives après un refus.
+        :param base_delay: Délai de la première nouvelle tentative, en secondes.
+        :param max_delay: Délai maximal entre deux tentatives, en secondes.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.condition = threading.Condition()
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        now = time.monotonic()
+        self.request_bucket = (requests_per_minute, now)
+        self.token_bucket = (tokens_per_minute, now)
+        self.counters = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'wait_seconds': 0.0}
+
+    @staticmethod
+    def _refill(bucket: tuple, per_minute: float, now: float) -> float:
+        level, updated = bucket
+        return min(per_minute, level + (now - updated) * per_minute / 60.0)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Réserve une place si possible ; sinon retourne le temps d'attente estimé (verrou déjà pris)"""
+        if self.in_flight >= max(self.min_concurrency, int(self.limit)):
+            return 0.05
+
+        now = time.monotonic()
+        wait = 0.0
+        requests_level = tokens_level = None
+        if self.requests_per_minute:
+            requests_level = self._refill(self.request_bucket, self.requests_per_minute, now)
+            if requests_level < 1:
+                wait = max(wait, (1 - requests_level) * 60.0 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            tokens_level = self._refill(self.token_bucket, self.tokens_per_minute, now)
+            # Une requête plus grosse que le seau passe dès qu'il est plein
+            needed = min(tokens, self.tokens_per_minute)
+            if tokens_level < needed:
+                wait = max(wait, (needed - tokens_level) * 60.0 / self.tokens_per_minute)
+        if wait:
+            return wait
+
+        if requests_level is not None:
+            self.request_bucket = (requests_level - 1, now)
+        if tokens_level is not None:
+            self.token_bucket = (tokens_level - tokens, now)
+        self.in_flight += 1
+        self.counters['requests'] += 1
+        return 0.0
+
+    def acquire(self, tokens: int = 0):
+        """Attend une place et le budget nécessaire (bloquant)"""
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                wait = self._try_acquire(tokens)
+                if not wait:
+                    break
+                self.condition.wait(wait)
+            self.counters['wait_seconds'] += time.monotonic() - start
+
+    async def acquire_async(self, tokens: int = 0):
+        """Équivalent asynchrone de acquire (n'immobilise pas la boucle d'événements)"""
+        start = time.monotonic()
+        while True:
+            with self.condition:
+                wait = self._try_acquire(tokens)
+                if not wait:
+                    self.counters['wait_seconds'] += time.monotonic() - start
+                    return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, success: bool = True, rate_limited: bool = False):
+        """
+        Libère la place et ajuste la limite de concurrence (AIMD) : réduite de moitié après un
+        refus (`rate_limited`), relevée après un appel complet (`success`), inchangée sinon
+        (autre erreur, génération annulée).
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.counters['rate_limited'] += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self.logger.warning(f"{self.name} : limite de débit atteinte, concurrence réduite à {int(self.limit)}")
+            elif success:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def retry_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Délai avant la tentative suivante : Retry-After s'il est fourni, sinon backoff exponentiel avec gigue"""
+        self.counters['retries'] += 1
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        self.logger.info(f"{self.name} : nouvelle tentative {attempt + 1}/{self.max_retries} dans {delay:.1f} s")
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        """Retourne l'état courant du limiteur"""
+        with self.condition:
+            stats = dict(self.counters)
+            stats['concurrency_limit'] = int(self.limit)
+            stats['in_flight'] = self.in_flight
+            return stats
+
+
+def _retry_after(error: Optional[Exception]) -> Optional[float]:
+    """Lit l'en-tête Retry-After de la réponse d'erreur, s'il existe"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or getattr(error, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Vrai si l'erreur du fournisseur est un refus pour dépassement de débit (HTTP 429)"""
+    if type(error).__name__ == 'RateLimitError':
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'http_status', None)
+    return status == 429
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, api_key: str) -> RateLimiter:
+    """Limiteur partagé par tous les rôles d'un même fournisseur et d'une même clé API (configuré via .env)"""
+    key = (provider, api_key)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            prefix = f"ECHOPAGE_{provider.upper()}_"
+            limiter = RateLimiter(
+                provider,
+                requests_per_minute=float(os.getenv(prefix + "RPM", "60")),
+                tokens_per_minute=float(os.getenv(prefix + "TPM", "0")),
+                max_concurrency=int(os.getenv(prefix + "CONCURRENCY", "8")),
+                max_retries=int(os.getenv(prefix + "MAX_RETRIES", "5"))
+            )
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,104 @@
+# reasoning.py
+from typing import Optional
+import re
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+# Bloc de raisonnement complet, ou tronqué en fin de texte (génération interrompue)
+THINK_PATTERN = re.compile(r'<think>.*?(?:</think>|$)', re.DOTALL)
+
+
+def strip_reasoning(text: str) -> str:
+    """Supprime les blocs <think> (même non refermés) d'un texte complet"""
+    return THINK_PATTERN.sub('', text).strip()
+
+
+def _partial_tag(text: str, tag: str) -> int:
+    """Longueur de la fin de `text` qui pourrait être le début de `tag` (balise coupée entre deux fragments)"""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ReasoningFilter:
+    """
+    Retire les blocs <think>…</think> d'un flux de fragments au fil de l'eau, même quand une
+    balise est coupée entre deux fragments, et compte les tokens de raisonnement (un fragment
+    de flux ≈ un token) pour appliquer un budget.
+    """
+
+    def __init__(self, keep: bool = False, budget: Optional[int] = None):
+        """
+        :param keep: Laisse passer le raisonnement (avec ses balises) au lieu de le retirer.
+        :param budget: Nombre maximal de tokens de raisonnement (None : illimité).
+        """
+        self.keep = keep
+        self.budget = budget
+        self.inside = False
+        self.pending = ""
+        self.started = False
+        self.tokens = 0
+        self.reasoning = []
+
+    @property
+    def exhausted(self) -> bool:
+        """Vrai si le raisonnement en cours a dépassé le budget"""
+        return self.inside and self.budget is not None and self.tokens > self.budget
+
+    @property
+    def text(self) -> str:
+        """Raisonnement reçu jusqu'ici, sans balises"""
+        return "".join(self.reasoning).strip()
+
+    def feed(self, chunk: str) -> str:
+        """Ajoute un fragment du flux et retourne la partie à transmettre (éventuellement vide)"""
+        text = self.pending + chunk
+        self.pending = ""
+        output = []
+        counted = self.inside
+        while text:
+            tag = CLOSE_TAG if self.inside else OPEN_TAG
+            index = text.find(tag)
+            if index < 0:
+                split = len(text) - _partial_tag(text, tag)
+                text, self.pending = text[:split], text[split:]
+                self._emit(text, output)
+                break
+            self._emit(text[:index], output)
+            if self.keep:
+                output.append(tag)
+            text = text[index + len(tag):]
+            self.inside = not self.inside
+            counted = counted or self.inside
+        if counted:
+            self.tokens += 1
+        return self._visible("".join(output))
+
+    def flush(self) -> str:
+        """Fin du flux : reste éventuel, et balise fermante si le raisonnement conservé a été coupé"""
+        text, self.pending = self.pending, ""
+        output = []
+        self._emit(text, output)
+        if self.inside and self.keep:
+            output.append(CLOSE_TAG)
+        self.inside = False
+        return self._visible("".join(output))
+
+    def _emit(self, text: str, output: list):
+        if not text:
+            return
+        if self.inside:
+            self.reasoning.append(text)
+            if self.keep:
+                output.append(text)
+        else:
+            output.append(text)
+
+    def _visible(self, text: str) -> str:
+        # Les sauts de ligne qui suivent </think> ne doivent pas ouvrir la réponse
+        if not self.started and not self.keep:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
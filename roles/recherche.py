@@ -1,15 +1,19 @@
 from .base_role import BaseRole
+from typing import Callable, Optional
 
 class Recherche(BaseRole):
-    def __init__(self, model_name='deepseek-ai/DeepSeek-R1'):
+    default_model = 'deepseek-ai/DeepSeek-R1'
+    default_mode = 'external'
+
+    def __init__(self, model_name: Optional[str] = None, use_cache=True):
         """
         Classe spécialisée pour la recherche d'informations synthétiques.
         """
-        super().__init__(model_name=model_name, mode="external")
+        super().__init__(model_name=model_name, use_cache=use_cache)
 
-    def execute(self, prompt: str) -> str:
-        """Effectue une recherche ciblée et synthétique avec une structure claire."""
-        full_prompt = (
+    def build_prompt(self, prompt: str) -> str:
+        """Construit le prompt de recherche structurée."""
+        return (
             "Vous êtes un assistant de recherche expert. "
             "Fournissez une réponse structurée en 5 parties concises :\n\n"
             "**1. Objectif** : Reformulation claire de la demande\n"
@@ -22,5 +26,11 @@ class Recherche(BaseRole):
             "Évitez le jargon trop technique.\n\n"
             f"**Demande** : {prompt}"
         )
-        
-        return self.generate_response(full_prompt)
+
+    def execute(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Effectue une recherche ciblée et synthétique avec une structure claire."""
+        return self.generate_response(self.build_prompt(prompt), on_token=on_token)
+
+    async def execute_async(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Version asynchrone de execute."""
+        return await self.generate_response_async(self.build_prompt(prompt), on_token=on_token)
@@ -0,0 +1,118 @@
+# registry.py
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+
+from .role_class import create_role_class
+
+ROLES_JSON_PATH = os.path.join(os.path.dirname(__file__), 'roles.json')
+
+DETECTION_PROMPT_HEADER = (
+    "Analyse cette demande utilisateur pour identifier le type de support requis selon ces critères :\n\n"
+)
+
+
+class RoleSnapshot:
+    """État de roles.json à un instant donné (jamais modifié : un rechargement en crée un nouveau)"""
+
+    def __init__(self, roles_data: List[dict], version: Tuple[int, int]):
+        self.version = version
+        self.roles_data = roles_data
+        # Nom normalisé (minuscules) -> configuration et classe du rôle
+        self.definitions: Dict[str, dict] = {role["name"].strip().lower(): role for role in roles_data}
+        self.valid_roles: FrozenSet[str] = frozenset(self.definitions)
+        self.classes = {key: create_role_class(role) for key, role in self.definitions.items()}
+        self.detection_sections = [
+            role["detection"] for role in roles_data if role.get("detection", "").strip()
+        ]
+        self.detection_prefix = DETECTION_PROMPT_HEADER + "\n\n".join(self.detection_sections) + "\n\n"
+
+
+class RoleRegistry:
+    """
+    Configuration des rôles (roles.json) lue une seule fois pour tout le processus.
+
+    Le fichier n'est relu que si sa date de modification (ou sa taille) change ; le nouvel
+    état est construit entièrement avant de remplacer l'ancien, et un fichier invalide en
+    cours d'édition laisse l'état précédent en place.
+    """
+
+    def __init__(self, path: str = ROLES_JSON_PATH):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.lock = threading.Lock()
+        self._snapshot: Optional[RoleSnapshot] = None
+        # Version du fichier refusée (invalide) : pas de nouvel essai tant qu'elle ne change pas
+        self._rejected = None
+
+    def snapshot(self) -> RoleSnapshot:
+        """
+        État courant, rechargé si le fichier a changé.
+        Lève FileNotFoundError ou json.JSONDecodeError si le fichier n'a jamais pu être lu.
+        """
+        current = self._snapshot
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if current is not None:
+                return current
+            raise FileNotFoundError(f"Fichier des rôles introuvable : {self.path}")
+
+        version = (stat.st_mtime_ns, stat.st_size)
+        if current is not None and version in (current.version, self._rejected):
+            return current
+
+        with self.lock:
+            current = self._snapshot
+            if current is not None and version in (current.version, self._rejected):
+                return current
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    snapshot = RoleSnapshot(json.load(f), version)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if current is None:
+                    raise
+                self._rejected = version
+                self.logger.error(f"roles.json invalide, configuration précédente conservée : {str(e)}")
+                return current
+            if current is not None:
+                self.logger.info(f"roles.json rechargé ({len(snapshot.definitions)} rôles)")
+            self._snapshot = snapshot
+            return snapshot
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """Identifiant de la configuration courante (date de modification, taille)"""
+        return self.snapshot().version
+
+    @property
+    def roles_data(self) -> List[dict]:
+        return self.snapshot().roles_data
+
+    @property
+    def valid_roles(self) -> FrozenSet[str]:
+        """Noms de rôles valides, normalisés en minuscules"""
+        return self.snapshot().valid_roles
+
+    def role_class(self, role: str):
+        """Classe du rôle `role` (nom normalisé), None s'il n'est pas dans roles.json"""
+        return self.snapshot().classes.get(role)
+
+    def role_classes(self) -> Dict[str, type]:
+        """Classes de tous les rôles, par nom de classe"""
+        return {cls.__name__: cls for cls in self.snapshot().classes.values()}
+
+
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_role_registry() -> RoleRegistry:
+    """Registre des rôles partagé par tout le processus"""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = RoleRegistry()
+        return _shared_registry
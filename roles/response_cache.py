@@ -0,0 +1,185 @@
+# response_cache.py
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.echopageai/response_cache.sqlite3")
+
+
+class ResponseCache:
+    """
+    Cache des réponses générées, adressé par le contenu de la requête.
+
+    Deux niveaux : un LRU en mémoire, puis une base SQLite sur disque bornée
+    en nombre d'entrées, en taille totale et en âge.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, memory_entries: int = 256,
+                 max_disk_entries: int = 5000, max_disk_bytes: int = 200 * 1024 * 1024,
+                 max_age: float = 30 * 24 * 3600):
+        """
+        :param path: Fichier SQLite (None pour un cache uniquement en mémoire).
+        :param memory_entries: Nombre d'entrées gardées dans le LRU mémoire.
+        :param max_disk_entries: Nombre maximal d'entrées sur disque.
+        :param max_disk_bytes: Taille maximale cumulée des réponses sur disque.
+        :param max_age: Âge maximal d'une entrée, en secondes.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.memory_entries = memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0
+        }
+        self.db = self._open_db(path) if path else None
+
+    def _open_db(self, path: str) -> Optional[sqlite3.Connection]:
+        """Ouvre (ou crée) la base SQLite du cache disque"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            self.logger.error(f"Cache disque indisponible ({path}) : {str(e)}")
+            return None
+
+    @staticmethod
+    def make_key(backend: str, model: str, prompt: str, temperature: float, options: Optional[dict] = None) -> str:
+        """Calcule la clé d'une requête à partir de tout ce qui influence la réponse"""
+        payload = json.dumps(
+            [backend, model, prompt, temperature, options or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Retourne la réponse en cache ou None"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if time.time() - created <= self.max_age:
+                    self.memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return value
+                del self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if time.time() - created <= self.max_age:
+                        self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                        self.db.commit()
+                        self._remember(key, value, created)
+                        self.counters['disk_hits'] += 1
+                        return value
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+
+            self.counters['misses'] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Enregistre une réponse dans les deux niveaux du cache"""
+        now = time.time()
+        with self.lock:
+            self._remember(key, value, now)
+            self.counters['writes'] += 1
+            if self.db is None:
+                return
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now)
+                )
+                self._evict_disk(now)
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.logger.error(f"Écriture du cache impossible : {str(e)}")
+
+    def _remember(self, key: str, value: str, created: float):
+        """Ajoute une entrée au LRU mémoire (verrou déjà pris)"""
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        """Supprime les entrées trop anciennes puis les moins récemment utilisées (verrou déjà pris)"""
+        expired = self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,)).rowcount
+        self.counters['evictions'] += max(expired, 0)
+
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_disk_entries and total <= self.max_disk_bytes:
+            return
+
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if count <= self.max_disk_entries and total <= self.max_disk_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.counters['evictions'] += len(evicted)
+
+    def stats(self) -> dict:
+        """Retourne les compteurs de succès/échecs du cache"""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            stats['memory_entries'] = len(self.memory)
+            return stats
+
+    def clear(self):
+        """Vide les deux niveaux du cache"""
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Retourne le cache partagé par tous les rôles du processus (configuré via .env)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            path = os.getenv("ECHOPAGE_CACHE_PATH", DEFAULT_CACHE_PATH)
+            _shared_cache = ResponseCache(
+                path=path if path.lower() != "memory" else None,
+                memory_entries=int(os.getenv("ECHOPAGE_CACHE_MEMORY_ENTRIES", "256")),
+                max_disk_entries=int(os.getenv("ECHOPAGE_CACHE_MAX_ENTRIES", "5000")),
+                max_disk_bytes=int(float(os.getenv("ECHOPAGE_CACHE_MAX_MB", "200")) * 1024 * 1024),
+                max_age=float(os.getenv("ECHOPAGE_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600
+            )
+        return _shared_cache
@@ -1,21 +1,39 @@
 import json
+from typing import Callable, Optional
 from .base_role import BaseRole
 
 def create_role_class(role_data):
     class_name = role_data["name"]
-    prompt_template = role_data["prompt"]
+    # Gabarit découpé une fois autour de {input} : le prompt se reconstitue par un simple join
+    template_parts = role_data["prompt"].split("{input}")
     temperature = role_data.get("temperature", 1.0)
     model_name = role_data.get("model", "deepseek-r1:14b")
     mode = role_data.get("mode", "local")
+    use_cache = role_data.get("cache", True)
     
     # Classe dynamique avec des paramètres personnalisés
     class DynamicRole(BaseRole):
+        max_concurrency = role_data.get("max_concurrency")
+        timeout = role_data.get("timeout")
+        max_tokens = role_data.get("max_tokens")
+        max_reasoning_tokens = role_data.get("max_reasoning_tokens")
+        keep_reasoning = role_data.get("keep_reasoning", False)
+        hedge = role_data.get("hedge", False)
+        hedge_delay = role_data.get("hedge_delay")
+        default_model = model_name
+        default_mode = mode
+
         def __init__(self):
-            super().__init__(model_name=model_name, mode=mode)
+            super().__init__(use_cache=use_cache)
         
-        def execute(self, user_input: str) -> str:
-            full_prompt = prompt_template.replace("{input}", user_input)
-            return self.generate_response(full_prompt, temp=temperature)
+        def build_prompt(self, user_input: str) -> str:
+            return user_input.join(template_parts)
+
+        def execute(self, user_input: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+            return self.generate_response(self.build_prompt(user_input), temp=temperature, on_token=on_token)
+
+        async def execute_async(self, user_input: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+            return await self.generate_response_async(self.build_prompt(user_input), temp=temperature, on_token=on_token)
     
     DynamicRole.__name__ = class_name 
     return DynamicRole
\ No newline at end of file
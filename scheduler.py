@@ -0,0 +1,126 @@
+#scheduler.py
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class FairScheduler:
+    """
+    Ordonnanceur équitable au-dessus d'un ThreadPoolExecutor unique et durable.
+
+    Chaque requête a sa propre file de tâches (une tâche par rôle). Les threads libres
+    sont attribués à tour de rôle entre les requêtes actives, si bien qu'une requête
+    à six rôles ne bloque pas celles qui arrivent après elle. Un plafond optionnel par
+    rôle limite le nombre de tâches simultanées d'un même rôle.
+    """
+
+    def __init__(self, max_workers: int, role_limits: Optional[Dict[str, int]] = None):
+        """
+        :param max_workers: Nombre de threads du pool partagé.
+        :param role_limits: Nombre maximal de tâches simultanées par rôle ({'recherche': 2}).
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.max_workers = max_workers
+        self.role_limits = {role: limit for role, limit in (role_limits or {}).items() if limit}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        self.queues = OrderedDict()  # request_id -> deque de tâches en attente
+        self.in_flight = 0
+        self.role_in_flight = Counter()
+        self.lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+
+    def set_role_limit(self, role: str, limit: Optional[int]):
+        """Change le plafond de tâches simultanées d'un rôle (None : pas de plafond)"""
+        with self.lock:
+            if limit:
+                self.role_limits[role] = limit
+            else:
+                self.role_limits.pop(role, None)
+            self._dispatch()
+
+    def new_request_id(self) -> int:
+        """Identifiant unique pour regrouper les tâches d'une même requête"""
+        return next(self._request_ids)
+
+    def submit(self, request_id, role: str, fn: Callable, *args, **kwargs) -> Future:
+        """Met une tâche en file pour la requête donnée et retourne son Future"""
+        future = Future()
+        # La tâche s'exécute dans le contexte de l'appelant (span en cours pour les métriques)
+        fn = functools.partial(contextvars.copy_context().run, fn)
+        with self.lock:
+            self.queues.setdefault(request_id, deque()).append((future, role, fn, args, kwargs))
+            self._dispatch()
+        return future
+
+    def cancel_request(self, request_id) -> int:
+        """Annule les tâches encore en file d'une requête, retourne leur nombre"""
+        with self.lock:
+            tasks = self.queues.pop(request_id, deque())
+        cancelled = 0
+        for future, *_ in tasks:
+            if future.cancel():
+                cancelled += 1
+        return cancelled
+
+    def _dispatch(self):
+        """Attribue les places libres aux requêtes à tour de rôle (verrou déjà pris)"""
+        while self.in_flight < self.max_workers and self.queues:
+            task = self._next_task()
+            if task is None:
+                return
+            future, role, fn, args, kwargs = task
+            self.in_flight += 1
+            self.role_in_flight[role] += 1
+            self.executor.submit(self._run, future, role, fn, args, kwargs)
+
+    def _next_task(self):
+        """Prend la première tâche exécutable en partant de la requête suivante du tour"""
+        for request_id in list(self.queues):
+            queue = self.queues[request_id]
+            for index, task in enumerate(queue):
+                role = task[1]
+                if self.role_in_flight[role] < self.role_limits.get(role, self.max_workers):
+                    del queue[index]
+                    # La requête servie passe en fin de tour
+                    if queue:
+                        self.queues.move_to_end(request_id)
+                    else:
+                        del self.queues[request_id]
+                    return task
+        return None
+
+    def _run(self, future: Future, role: str, fn: Callable, args: tuple, kwargs: dict):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.role_in_flight[role] -= 1
+                self._dispatch()
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne l'état courant de l'ordonnanceur"""
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": sum(len(queue) for queue in self.queues.values()),
+                "active_requests": len(self.queues)
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Annule les tâches en attente et arrête le pool"""
+        with self.lock:
+            pending = [task for queue in self.queues.values() for task in queue]
+            self.queues.clear()
+        for future, *_ in pending:
+            future.cancel()
+        self.executor.shutdown(wait=wait)
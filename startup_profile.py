@@ -0,0 +1,32 @@
+#startup_profile.py
+import sys
+import time
+from typing import List, Tuple
+
+# SDK et bibliothèques lourdes dont le chargement est signalé dans le rapport
+TRACKED_MODULES = ('httpx', 'ollama', 'together', 'requests', 'tkinter')
+
+
+class StartupProfile:
+    """Chronomètre des étapes du démarrage, affiché avec --profile-startup"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.steps: List[Tuple[str, float]] = []
+
+    def mark(self, step: str):
+        """Termine l'étape en cours sous le nom `step`"""
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        """Durée de chaque étape et bibliothèques déjà importées"""
+        lines = ["Profil de démarrage :"]
+        for step, seconds in self.steps:
+            lines.append(f"  {step:<32} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<32} {(self.last - self.start) * 1000:8.1f} ms")
+        loaded = [name for name in TRACKED_MODULES if name in sys.modules]
+        lines.append("  modules chargés : " + (", ".join(loaded) or "aucun"))
+        return "\n".join(lines)
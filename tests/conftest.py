@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Les tests importent les modules du dépôt (roles, scheduler, report...) depuis la racine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,68 @@
+# test_agent_manager.py
+import threading
+import time
+
+import pytest
+
+from agent_manager import AgentManager
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    # Sans clé API, créer un agent externe lèverait une erreur
+    monkeypatch.delenv("TOGETHER_API_KEY", raising=False)
+    # Les fichiers écrits par les agents (journal, résumés) restent hors du dépôt
+    monkeypatch.chdir(tmp_path)
+    manager = AgentManager(model_config={'connecteur': {'mode': 'local', 'model_name': 'llama3'}})
+    yield manager
+    manager.shutdown()
+
+
+def test_local_models_does_not_create_agents(manager):
+    models = manager.local_models()
+    assert models[0] == manager.DetecteurBesoins.model
+    assert 'llama3' in models and len(models) == len(set(models))
+    assert manager.agents == {}
+
+
+def test_role_models_does_not_create_agents(manager):
+    assert manager.role_models(['recherche', 'inconnu']) == {
+        "🔍 Recherches": 'deepseek-ai/DeepSeek-R1',
+        "🔗 Synthèse des Idées": 'llama3'
+    }
+    assert manager.agents == {}
+
+
+def test_configured_model_matches_agent(manager):
+    agent_class = manager._agent_class('connecteur')
+    assert agent_class.configured_model() == ('external', 'deepseek-r1:14b')
+    agent = manager.get_agent('connecteur')
+    assert agent_class.configured_model(manager.model_config['connecteur']) == (agent.mode, agent.model)
+
+
+class SlowAgent:
+    """Agent qui émet un fragment toutes les 10 ms pendant `seconds` secondes"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.stopped = threading.Event()
+
+    def execute(self, input_text, on_token=None):
+        try:
+            deadline = time.monotonic() + self.seconds
+            while time.monotonic() < deadline:
+                on_token("x")
+                time.sleep(0.01)
+            return "fini"
+        finally:
+            self.stopped.set()
+
+
+def test_timed_out_role_is_cancelled(manager, monkeypatch):
+    agent = SlowAgent(5)
+    monkeypatch.setattr(manager, 'get_agent', lambda role: agent)
+    manager.request_timeout = 0.1
+    results = manager._execute_parallel_processing("demande", ['coach'])
+    assert results["🏋️ Coaching Personnel"].startswith("Timeout : coach")
+    # Le thread s'arrête au fragment suivant au lieu de générer jusqu'au bout
+    assert agent.stopped.wait(1)
@@ -0,0 +1,85 @@
+# test_classifieur_intentions.py
+import json
+
+import pytest
+
+from roles.classifieur_intentions import ClassifieurIntentions, extract_features
+
+ROLES = [
+    {"name": "Coach", "detection": "**Coach** :\n- Mots-clés : productivité, procrastination, motivation\n"
+                                   "- Exemples : « Comment être plus productif ? »"},
+    {"name": "Conseil", "detection": "**Conseil** :\n- Mots-clés : émotions, stress, solitude\n"
+                                     "- Exemples : « Je me sens seul »"},
+]
+
+
+def make_classifier(tmp_path, **kwargs):
+    kwargs.setdefault("valid_roles", {"coach", "conseil"})
+    return ClassifieurIntentions(ROLES, history_path=str(tmp_path / "detections.jsonl"), **kwargs)
+
+
+def test_extract_features_normalizes_accents_and_stopwords():
+    features = extract_features("Je suis très stressé par la procrastination")
+    assert "stress" in features
+    assert "procra" in features
+    assert "suis" not in features
+
+
+def test_predicts_from_role_documents(tmp_path):
+    roles, confidence = make_classifier(tmp_path).predict("je procrastine, comment rester productif et motivé")
+    assert roles[0] == "coach"
+    assert 0 < confidence <= 1
+
+
+def test_history_is_capped_and_deduplicated(tmp_path):
+    classifier = make_classifier(tmp_path, max_history=2)
+    classifier.record("organiser un déménagement", ["coach"])
+    classifier.record("Organiser  un déménagement", ["conseil"])
+    assert [roles for _, _, roles in classifier.history.values()] == [["conseil"]]
+
+    classifier.record("écrire un roman", ["conseil"])
+    classifier.record("préparer un marathon", ["coach"])
+    assert len(classifier.history) == 2
+    assert "organiser un déménagement" not in classifier.history
+
+
+def test_stale_roles_are_ignored(tmp_path):
+    path = tmp_path / "detections.jsonl"
+    path.write_text(json.dumps({"text": "planifier un voyage", "roles": ["voyage", "coach"]}) + "\n"
+                    + json.dumps({"text": "réserver un hôtel", "roles": ["voyage"]}) + "\n", encoding="utf-8")
+    classifier = make_classifier(tmp_path)
+    assert [roles for _, _, roles in classifier.history.values()] == [["coach"]]
+    assert all(role != "voyage" for role, _ in classifier.score("réserver un hôtel pour un voyage"))
+
+
+def test_incremental_update_matches_recomputed_centroids(tmp_path):
+    classifier = make_classifier(tmp_path)
+    classifier.predict("stress")  # calcul initial de l'IDF et des centroïdes
+    classifier.record("angoisse avant un entretien", ["conseil", "coach"])
+    classifier.record("angoisse avant un entretien", ["conseil"])
+    classifier.record("trop de réunions inutiles", ["coach"])
+
+    # Centroïdes recalculés de zéro avec le même IDF
+    sums = {}
+    documents = classifier.documents + [
+        (role, features) for _, features, roles in classifier.history.values() for role in roles
+    ]
+    for role, features in documents:
+        total = sums.setdefault(role, {})
+        for feature, value in classifier._vectorize(features).items():
+            total[feature] = total.get(feature, 0.0) + value
+    for role, total in sums.items():
+        expected = classifier._normalize(total)
+        actual = classifier.centroids[role]
+        assert set(actual) == set(expected)
+        for feature, value in expected.items():
+            assert actual[feature] == pytest.approx(value)
+
+
+def test_history_file_is_compacted(tmp_path):
+    path = tmp_path / "detections.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(10):
+            f.write(json.dumps({"text": "stress au travail", "roles": ["conseil"]}) + "\n")
+    make_classifier(tmp_path, max_history=3)
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1
@@ -0,0 +1,48 @@
+# test_detecteur_besoins.py
+import json
+
+import pytest
+
+from roles.detecteur_besoins import DetecteurBesoins
+
+
+@pytest.fixture(scope="module")
+def detecteur():
+    return DetecteurBesoins()
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Sortie structurée : l'objet est retourné tel quel
+    ('  {"roles": ["coach"]}\n', '{"roles": ["coach"]}'),
+    # Commence et finit par une accolade sans être un seul objet
+    ('{"a": 1} texte {"roles": ["coach"]}', '{"roles": ["coach"]}'),
+    # Accolades dans une chaîne, objet invalide ignoré, objets imbriqués
+    ('a {"x": "}{"} b {bad} {"roles": ["c"], "n": {"k": 1}} fin', '{"roles": ["c"], "n": {"k": 1}}'),
+    ('Réponse : {"a": "\\"}"} puis {"b": 1}', '{"a": "\\"}"}'),
+    # Objet non fermé ou absent : le texte est retourné tel quel
+    ('début {"roles": ["coach"]', 'début {"roles": ["coach"]'),
+    ("aucun objet", "aucun objet"),
+])
+def test_extract_json(detecteur, text, expected):
+    assert detecteur._extract_json(text) == expected
+
+
+def test_extract_json_validates_only_top_level_objects(detecteur):
+    # Chaque objet de premier niveau est validé une seule fois, même très imbriqué
+    nested = '{"a": ' * 500 + '1' + '}' * 500
+    text = 'Réponse : ' + '{bad} ' * 2000 + nested + ' {"roles": ["coach"]}'
+    assert detecteur._extract_json(text) == nested
+    assert json.loads(nested)
+
+
+def test_parse_response_keeps_valid_roles_in_order(detecteur):
+    response = '<think>{"roles": ["recherche"]}</think> Voici : {"roles": ["Coach", "conseils", "inconnu", "coach"]}'
+    assert detecteur._parse_response(response) == ['coach', 'conseil']
+
+
+def test_parse_response_reads_objects_around_text(detecteur):
+    assert detecteur._parse_response('{"note": 1} voici : {"roles": ["coachpro"]}') == ['coachpro']
+
+
+def test_parse_response_falls_back_to_keywords(detecteur):
+    assert detecteur._parse_response("pas de json, juste de l'organisation") == ['organisation']
@@ -0,0 +1,99 @@
+# test_hedging.py
+import asyncio
+import time
+
+import pytest
+
+from roles import base_role
+from roles.base_role import BaseRole
+from roles.hedging import ahedged_stream, hedged_stream
+from roles.response_cache import ResponseCache
+
+
+def stream(chunks, wait=0.0, error=None):
+    """Fabrique d'un flux qui attend `wait` secondes avant son premier fragment"""
+    def factory():
+        time.sleep(wait)
+        if error:
+            raise error
+        yield from chunks
+    return factory
+
+
+def astream(chunks, wait=0.0, error=None):
+    async def factory():
+        await asyncio.sleep(wait)
+        if error:
+            raise error
+        for chunk in chunks:
+            yield chunk
+    return factory
+
+
+def run(primary, secondary, delay=0.05):
+    winners = []
+    chunks = list(hedged_stream(primary, secondary, delay, lambda *winner: winners.append(winner)))
+    return chunks, winners
+
+
+def arun(primary, secondary, delay=0.05):
+    winners = []
+
+    async def collect():
+        return [chunk async for chunk in ahedged_stream(primary, secondary, delay,
+                                                        lambda *winner: winners.append(winner))]
+    return asyncio.run(collect()), winners
+
+
+@pytest.fixture(params=[(run, stream), (arun, astream)], ids=["sync", "async"])
+def race(request):
+    return request.param
+
+
+def test_fast_primary_is_not_hedged(race):
+    run_race, make = race
+    assert run_race(('ollama', make(["a", "b"])), ('together', make(["x"]))) == (["a", "b"], [('ollama', False)])
+
+
+def test_slow_primary_loses_to_secondary(race):
+    run_race, make = race
+    chunks, winners = run_race(('ollama', make(["a"], wait=0.5)), ('together', make(["x", "y"])))
+    assert (chunks, winners) == (["x", "y"], [('together', True)])
+
+
+def test_failed_primary_starts_secondary_at_once(race):
+    run_race, make = race
+    start = time.monotonic()
+    chunks, winners = run_race(('ollama', make([], error=ValueError("hors ligne"))),
+                               ('together', make(["x"])), delay=5)
+    assert (chunks, winners) == (["x"], [('together', True)])
+    assert time.monotonic() - start < 1
+
+
+def test_both_failing_raises_primary_error(race):
+    run_race, make = race
+    with pytest.raises(ValueError, match="ollama"):
+        run_race(('ollama', make([], error=ValueError("ollama"))), ('together', make([], error=KeyError("t"))))
+
+
+def test_hedged_answer_is_cached_under_the_winning_backend(monkeypatch):
+    monkeypatch.setenv("TOGETHER_API_KEY", "clé")
+    monkeypatch.delenv("ECHOPAGE_CACHE", raising=False)
+    cache = ResponseCache(path=None)
+    monkeypatch.setattr(base_role, 'get_response_cache', lambda: cache)
+    role = BaseRole(mode='local')
+    role.hedge, role.hedge_delay = True, 0.01
+    chunks = {'local': [1.0, "réponse locale"], 'external': ["réponse externe"]}
+
+    def backend_stream(mode, prompt, temp, usage, local_options=None):
+        for chunk in chunks[mode]:
+            if isinstance(chunk, float):
+                time.sleep(chunk)
+            else:
+                yield chunk
+
+    monkeypatch.setattr(role, '_backend_stream', backend_stream)
+    assert role.generate_response("prompt") == "réponse externe"
+    options = role._local_options()
+    assert cache.get(role._cache_key('local', "prompt", 1.0, options)) is None
+    assert cache.get(role._cache_key('external', "prompt", 1.0, options)) == "réponse externe"
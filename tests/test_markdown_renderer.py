@@ -0,0 +1,49 @@
+# test_markdown_renderer.py
+import pytest
+
+from markdown_renderer import render_markdown
+
+
+@pytest.mark.parametrize("text, html", [
+    ("**a** *b*", "<strong>a</strong> <em>b</em>"),
+    ("***a***", "<strong><em>a</em></strong>"),
+    ("***a** b*", "<em><strong>a</strong> b</em>"),
+    ("***a* b**", "<strong><em>a</em> b</strong>"),
+    ("**a *b***", "<strong>a <em>b</em></strong>"),
+    ("*a***b**", "<em>a</em><strong>b</strong>"),
+    # Marqueurs orphelins ou qui se chevauchent : laissés tels quels
+    ("a ** b", "a ** b"),
+    ("***a", "***a"),
+    ("**a *b** c*", "<strong>a *b</strong> c*"),
+    ("*a\nb*", "*a<br>b*"),
+])
+def test_emphasis(text, html):
+    assert render_markdown(text) == html
+
+
+def test_quote_can_contain_lists_headings_and_rules():
+    assert render_markdown("> quote\n> - item\n> - two\nfin") == (
+        "<blockquote>quote<br><ul><li>item</li><li>two</li></ul>\n</blockquote>\nfin"
+    )
+    assert render_markdown("> # Titre\n> ---") == "<blockquote><h1>Titre</h1>\n<hr>\n</blockquote>\n"
+    # « > » seul garde la citation ouverte, une ligne vide la ferme
+    assert render_markdown("> x\n>\n> y\n\nz") == "<blockquote>x<br><br>y<br></blockquote>\n<br>z"
+
+
+def test_lists_switch_and_close():
+    assert render_markdown("- a\n- b\n1. c\ntexte") == (
+        "<ul><li>a</li><li>b</li></ul>\n<ol><li>c</li></ol>\ntexte"
+    )
+
+
+def test_blocks_and_inline_elements():
+    html = render_markdown("## Plan\n```\nx < y\n```\nVoir `a*b` et [le guide](https://example.com/?a=1&b=2)")
+    assert html == (
+        "<h2>Plan</h2>\n<pre><code>x &lt; y</code></pre>\n"
+        'Voir <code>a*b</code> et <a href="https://example.com/?a=1&amp;b=2">le guide</a>'
+    )
+
+
+def test_text_is_escaped_except_think_tags():
+    assert render_markdown("<think>r</think><b>x</b> & y") == "<think>r</think>&lt;b&gt;x&lt;/b&gt; &amp; y"
+    assert render_markdown("x > y") == "x &gt; y"
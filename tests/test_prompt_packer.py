@@ -0,0 +1,56 @@
+# test_prompt_packer.py
+from roles.prompt_packer import PromptPacker, allocate, compress, estimate_tokens
+
+LONG = "\n".join([
+    "## Sommeil",
+    "Se coucher à heure fixe stabilise l'horloge interne.",
+    "Les écrans retardent l'endormissement de plusieurs dizaines de minutes.",
+    "Une chambre fraîche et sombre favorise un sommeil profond.",
+    "La caféine consommée après seize heures perturbe encore la nuit.",
+    "## Organisation",
+    "Planifier la journée la veille libère l'esprit au réveil.",
+    "Regrouper les courriels en deux créneaux limite les interruptions.",
+    "Les tâches difficiles passent mieux en début de matinée.",
+    "## Stress",
+    "Respirer lentement réduit le stress au travail.",
+    "Marcher dix minutes après le déjeuner aide aussi.",
+])
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("un mot, deux.") == 5
+    assert estimate_tokens("anticonstitutionnellement") == 5
+
+
+def test_allocate_keeps_short_texts_whole():
+    assert allocate([10, 20], 100) == [10, 20]
+    shares = allocate([10, 400, 200], 300)
+    assert shares[0] == 10 and abs(shares[1] - 2 * shares[2]) <= 1
+    assert sum(shares) <= 300
+
+
+def test_compress_respects_budget_and_keeps_headings():
+    summary = compress(LONG, 40, query="stress au travail")
+    assert estimate_tokens(summary) <= 40
+    # La phrase qui rejoint la demande est gardée avec le titre de sa section, dans l'ordre d'origine
+    assert "## Stress\nRespirer lentement réduit le stress au travail." in summary
+    assert compress(LONG, estimate_tokens(LONG)) == LONG
+    assert compress(LONG, 0) == ""
+
+
+def test_compress_cuts_a_single_long_sentence():
+    sentence = " ".join(f"mot{i}" for i in range(50))
+    summary = compress(sentence, 10)
+    assert summary.endswith(" …") and sentence.startswith(summary[:-2])
+
+
+def test_pack_strips_reasoning_and_fits_budget():
+    responses = [
+        {'role': 'Coach', 'response': "<think>" + "long raisonnement " * 200 + "</think>Courte réponse."},
+        {'role': 'Conseil', 'response': LONG},
+    ]
+    packed, stats = PromptPacker(60).pack("stress au travail", responses)
+    assert packed[0] == {'role': 'Coach', 'response': "Courte réponse."}
+    assert stats['tokens_after'] <= 60 and stats['compressed'] == 1
+    assert stats['tokens_saved'] == stats['tokens_before'] - stats['tokens_after']
@@ -0,0 +1,120 @@
+# test_rate_limiter.py
+from types import SimpleNamespace
+
+import pytest
+
+from roles import base_role
+from roles.base_role import BaseRole
+from roles.rate_limiter import RateLimiter, is_rate_limit_error
+
+
+class RateLimitError(Exception):
+    """Même nom que l'exception du SDK Together"""
+
+
+def make_limiter(limit: float = 4.0, **kwargs) -> RateLimiter:
+    limiter = RateLimiter('test', requests_per_minute=0, max_concurrency=8, base_delay=0, **kwargs)
+    limiter.limit = limit
+    return limiter
+
+
+def test_aimd_halves_on_refusal_and_grows_on_success():
+    limiter = make_limiter()
+    limiter.acquire()
+    limiter.release(success=False, rate_limited=True)
+    assert limiter.limit == 2.0
+    limiter.acquire()
+    limiter.release(success=True)
+    assert limiter.limit == 2.5
+    assert limiter.stats()['rate_limited'] == 1
+
+
+def test_other_outcomes_are_neutral():
+    limiter = make_limiter()
+    limiter.acquire()
+    limiter.release(success=False)
+    assert limiter.limit == 4.0
+    assert limiter.in_flight == 0
+
+
+def test_buckets_and_concurrency_make_callers_wait():
+    limiter = RateLimiter('test', requests_per_minute=1, tokens_per_minute=100, max_concurrency=1)
+    with limiter.condition:
+        assert limiter._try_acquire(10) == 0.0
+        # Place occupée, puis seau de requêtes vide
+        assert limiter._try_acquire(10) > 0
+    limiter.release()
+    with limiter.condition:
+        assert limiter._try_acquire(10) == pytest.approx(60.0, abs=1)
+
+
+def test_retry_delay_follows_retry_after():
+    limiter = make_limiter(max_delay=30)
+    error = RateLimitError()
+    error.headers = {'retry-after': '120'}
+    assert limiter.retry_delay(0, error) == 30
+    assert limiter.retry_delay(3) == 0
+    assert is_rate_limit_error(error)
+    assert is_rate_limit_error(SimpleNamespace(status_code=429))
+    assert not is_rate_limit_error(ValueError())
+
+
+def together_chunk(text: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+@pytest.fixture
+def external_role(monkeypatch):
+    """Rôle externe branché sur un faux client Together : chaque appel rejoue le scénario suivant"""
+    monkeypatch.setenv("TOGETHER_API_KEY", "clé")
+    limiter = make_limiter()
+    scenarios = []
+
+    def create(**kwargs):
+        scenario = scenarios.pop(0)
+        if isinstance(scenario, Exception):
+            raise scenario
+
+        def stream():
+            for item in scenario:
+                if isinstance(item, Exception):
+                    raise item
+                yield together_chunk(item)
+        return stream()
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(base_role, 'get_together_client', lambda api_key: client)
+    monkeypatch.setattr(base_role, 'get_rate_limiter', lambda provider, api_key: limiter)
+    return BaseRole(mode='external', use_cache=False), limiter, scenarios
+
+
+def test_complete_stream_counts_as_success(external_role):
+    role, limiter, scenarios = external_role
+    scenarios.append(["a", "b"])
+    assert "".join(role._stream_external("prompt", 1.0, {})) == "ab"
+    assert limiter.limit == 4.25 and limiter.in_flight == 0
+
+
+def test_failure_after_first_chunk_is_neutral(external_role):
+    role, limiter, scenarios = external_role
+    scenarios.append(["a", ValueError("coupure")])
+    with pytest.raises(ValueError):
+        list(role._stream_external("prompt", 1.0, {}))
+    assert limiter.limit == 4.0 and limiter.in_flight == 0
+
+
+def test_cancelled_stream_is_neutral(external_role):
+    role, limiter, scenarios = external_role
+    scenarios.append(["a", "b"])
+    stream = role._stream_external("prompt", 1.0, {})
+    next(stream)
+    stream.close()
+    assert limiter.limit == 4.0 and limiter.in_flight == 0
+
+
+def test_refusal_is_retried_then_succeeds(external_role):
+    role, limiter, scenarios = external_role
+    scenarios.extend([RateLimitError(), ["ok"]])
+    assert list(role._stream_external("prompt", 1.0, {})) == ["ok"]
+    # Divisée par deux au refus, puis relevée par l'appel complet
+    assert limiter.limit == 2.5 and limiter.stats()['retries'] == 1
@@ -0,0 +1,96 @@
+# test_reasoning.py
+import time
+
+import pytest
+
+from roles.base_role import BaseRole
+from roles.reasoning import ReasoningFilter, strip_reasoning
+
+STREAM = "<think>je réfléchis</think>\n\nRéponse <b>finale</b>"
+
+
+def run(chunks, **kwargs):
+    reasoning_filter = ReasoningFilter(**kwargs)
+    output = "".join(reasoning_filter.feed(chunk) for chunk in chunks) + reasoning_filter.flush()
+    return output, reasoning_filter
+
+
+@pytest.mark.parametrize("split", range(1, len(STREAM)))
+def test_tags_split_anywhere(split):
+    output, reasoning_filter = run([STREAM[:split], STREAM[split:]])
+    assert output == "Réponse <b>finale</b>"
+    assert reasoning_filter.text == "je réfléchis"
+
+
+def test_character_stream_and_keep():
+    assert run(STREAM)[0] == "Réponse <b>finale</b>"
+    assert run(STREAM, keep=True)[0] == STREAM
+
+
+def test_unclosed_reasoning_is_dropped_or_closed():
+    assert run(["<think>coupé", " en route"])[0] == ""
+    assert run(["<think>coupé"], keep=True)[0] == "<think>coupé</think>"
+    # Un début de balise en fin de flux n'en était pas une
+    assert run(["Réponse <thi"])[0] == "Réponse <thi"
+
+
+def test_budget_counts_reasoning_chunks():
+    reasoning_filter = ReasoningFilter(budget=2)
+    for chunk in ["<think>a", "b", "c"]:
+        reasoning_filter.feed(chunk)
+    assert reasoning_filter.tokens == 3 and reasoning_filter.exhausted
+    reasoning_filter.feed("</think>fin")
+    assert not reasoning_filter.exhausted
+
+
+def test_strip_reasoning():
+    assert strip_reasoning(STREAM) == "Réponse <b>finale</b>"
+    assert strip_reasoning("avant <think>jamais fermé") == "avant"
+
+
+@pytest.fixture
+def scripted_role(monkeypatch):
+    """Rôle dont chaque appel à un backend rejoue le flux suivant de ce backend et note (mode, options)"""
+    monkeypatch.setenv("TOGETHER_API_KEY", "clé")
+    role = BaseRole(mode='local', use_cache=False)
+    role.max_reasoning_tokens = 2
+    streams, calls = {'local': [], 'external': []}, []
+
+    def backend_stream(mode, prompt, temp, usage, local_options=None):
+        calls.append((mode, local_options))
+        for chunk in streams[mode].pop(0):
+            if isinstance(chunk, float):
+                time.sleep(chunk)
+            else:
+                yield chunk
+
+    monkeypatch.setattr(role, '_backend_stream', backend_stream)
+    return role, streams, calls
+
+
+def test_local_budget_interrupts_and_answers_without_thinking(scripted_role):
+    role, streams, calls = scripted_role
+    streams['local'].extend([["<think>a", "b", "c", "d", "jamais lu"], ["réponse"]])
+    assert role.generate_response("prompt") == "réponse"
+    assert calls == [('local', {}), ('local', {'think': False})]
+
+
+def test_external_budget_is_left_to_max_tokens(scripted_role):
+    role, streams, calls = scripted_role
+    role.mode = 'external'
+    streams['external'].append(["<think>a", "b", "c", "d</think>", "réponse"])
+    assert role.generate_response("prompt") == "réponse"
+    # Génération coupée par max_tokens pendant la réflexion : pas de relance non plus,
+    # Together raisonnerait de nouveau
+    streams['external'].append(["<think>a", "b", "c", "d"])
+    assert role.generate_response("prompt") == ""
+    assert [mode for mode, _ in calls] == ['external', 'external']
+
+
+def test_budget_follows_the_backend_that_won_the_hedge(scripted_role):
+    role, streams, calls = scripted_role
+    role.hedge, role.hedge_delay = True, 0.01
+    streams['local'].append([1.0, "<think>trop tard"])
+    streams['external'].append(["<think>a", "b", "c", "d</think>", "réponse"])
+    assert role.generate_response("prompt") == "réponse"
+    assert sorted(mode for mode, _ in calls) == ['external', 'local']
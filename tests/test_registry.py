@@ -0,0 +1,58 @@
+# test_registry.py
+import json
+import os
+
+import pytest
+
+from roles.registry import RoleRegistry
+
+
+def write_roles(path, *names, mtime_ns=None):
+    roles = [{"name": name, "prompt": f"{name} : {{input}}", "mode": "local", "detection": f"**{name}**"}
+             for name in names]
+    path.write_text(json.dumps(roles), encoding="utf-8")
+    if mtime_ns is not None:
+        # Date imposée : deux écritures rapprochées auraient sinon la même date de modification
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def roles_path(tmp_path):
+    path = tmp_path / "roles.json"
+    write_roles(path, "Coach", mtime_ns=1_000_000_000)
+    return path
+
+
+def test_snapshot_is_reused_until_file_changes(roles_path):
+    registry = RoleRegistry(str(roles_path))
+    snapshot = registry.snapshot()
+    assert registry.snapshot() is snapshot
+    assert snapshot.valid_roles == {"coach"}
+    assert registry.role_class("coach")().build_prompt("x") == "Coach : x"
+
+    write_roles(roles_path, "Coach", "Conseil", mtime_ns=2_000_000_000)
+    assert registry.valid_roles == {"coach", "conseil"}
+    assert registry.version != snapshot.version
+    assert "**Conseil**" in registry.snapshot().detection_prefix
+
+
+def test_invalid_file_keeps_previous_snapshot(roles_path):
+    registry = RoleRegistry(str(roles_path))
+    snapshot = registry.snapshot()
+    roles_path.write_text("[{", encoding="utf-8")
+    os.utime(roles_path, ns=(2_000_000_000, 2_000_000_000))
+    assert registry.snapshot() is snapshot
+    # Version refusée : le fichier n'est pas relu tant qu'il ne change pas
+    assert registry._rejected == (2_000_000_000, 2)
+
+    write_roles(roles_path, "Conseil", mtime_ns=3_000_000_000)
+    assert registry.valid_roles == {"conseil"}
+
+
+def test_missing_file(tmp_path, roles_path):
+    with pytest.raises(FileNotFoundError):
+        RoleRegistry(str(tmp_path / "absent.json")).snapshot()
+    registry = RoleRegistry(str(roles_path))
+    snapshot = registry.snapshot()
+    roles_path.unlink()
+    assert registry.snapshot() is snapshot
@@ -0,0 +1,92 @@
+# test_report_index.py
+import sqlite3
+
+import pytest
+
+from report_index import ReportIndex, failed_sections, normalize_prompt
+
+SECTIONS = {"Coach": "Planifiez vos journées la veille.", "Connecteur": "Synthèse : commencez petit."}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ReportIndex(str(tmp_path / "index.sqlite3"))
+
+
+def report(tmp_path, name: str) -> str:
+    """Crée un fichier de rapport : find_similar ignore les rapports supprimés"""
+    path = tmp_path / f"{name}.html"
+    path.write_text("<html></html>", encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("sections, failed", [
+    (SECTIONS, []),
+    ({"🚨 Erreur Système": "Erreur de traitement : boom"}, ["🚨 Erreur Système"]),
+    ({"Coach": "Erreur Coach: Délai dépassé"}, ["Coach"]),
+    ({"Coach": "Timeout : Coach n'a pas terminé dans les 60 secondes"}, ["Coach"]),
+    ({"Connecteur": "Erreur Connecteur : boom"}, ["Connecteur"]),
+    # Erreur du backend après un début de réponse
+    ({"Coach": "Début de conseil\n\nErreur inattendue : connexion perdue"}, ["Coach"]),
+    ({"Coach": "Le mot Erreur inattendue : reste un texte normal ici.\nSuite"}, []),
+])
+def test_failed_sections(sections, failed):
+    assert failed_sections(sections) == failed
+
+
+def test_search_and_sections(index, tmp_path):
+    path = report(tmp_path, "a")
+    index.add(path, "Comment mieux organiser mes journées ?", SECTIONS, models={"Coach": "m"})
+    results = index.search("journées")
+    assert [result['path'] for result in results] == [path]
+    assert results[0]['roles'] == list(SECTIONS) and results[0]['models'] == {"Coach": "m"}
+    assert index.sections(path) == SECTIONS
+    # Syntaxe FTS5 invalide : recherche des mots tels quels
+    assert [result['path'] for result in index.search('"journées')] == [path]
+
+
+def test_find_similar_ignores_failed_reports(index, tmp_path):
+    prompt = "Comment mieux organiser mes journées ?"
+    index.add(report(tmp_path, "ok"), prompt, SECTIONS)
+    index.add(report(tmp_path, "erreur"), prompt, {"Coach": "Erreur Coach: boom"})
+    index.add(report(tmp_path, "annulé"), prompt, SECTIONS, complete=False)
+    assert index.find_similar("comment mieux organiser mes journees")['path'].endswith("ok.html")
+
+    index.add(report(tmp_path, "ok"), prompt, {"Coach": "Timeout : Coach n'a pas terminé dans les 5 secondes"})
+    assert index.find_similar(prompt) is None
+    # Les rapports incomplets restent cherchables
+    assert len(index.search("journées")) == 3
+
+
+def test_find_similar_threshold_and_missing_files(index, tmp_path):
+    path = report(tmp_path, "a")
+    index.add(path, "Comment mieux organiser mes journées de travail ?", SECTIONS)
+    assert index.find_similar("Comment mieux organiser mes journées de travail")['similarity'] == 1.0
+    assert index.find_similar("Comment organiser mes journées de travail ?")['similarity'] >= 0.92
+    assert index.find_similar("Recette de la tarte aux pommes") is None
+
+    (tmp_path / "a.html").unlink()
+    assert index.find_similar("Comment mieux organiser mes journées de travail") is None
+    assert index.forget_missing() == 1
+    assert index.search("journées") == []
+
+
+def test_old_index_is_migrated(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE reports (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, prompt TEXT NOT NULL, "
+        "normalized TEXT NOT NULL, roles TEXT NOT NULL, models TEXT NOT NULL, "
+        "timings TEXT NOT NULL, created REAL NOT NULL)"
+    )
+    db.execute("CREATE TABLE sections (report_id INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL)")
+    prompt = "Comment mieux organiser mes journées ?"
+    for report_id, name, content in [(1, "erreur", "Erreur Coach: boom"), (2, "ok", "Planifiez la veille.")]:
+        db.execute("INSERT INTO reports VALUES (?, ?, ?, ?, '[]', '{}', '{}', ?)",
+                   (report_id, report(tmp_path, name), prompt, normalize_prompt(prompt), 2.0 - report_id))
+        db.execute("INSERT INTO sections VALUES (?, 'Coach', ?)", (report_id, content))
+    db.commit()
+    db.close()
+
+    # Le plus récent est en erreur : c'est le rapport complet qui est proposé
+    assert ReportIndex(path).find_similar(prompt)['path'].endswith("ok.html")
@@ -0,0 +1,69 @@
+# test_response_cache.py
+from roles.response_cache import ResponseCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_make_key_depends_on_every_parameter():
+    key = ResponseCache.make_key('ollama', 'm', 'prompt', 1.0, {'a': 1})
+    assert key == ResponseCache.make_key('ollama', 'm', 'prompt', 1.0, {'a': 1})
+    assert key != ResponseCache.make_key('together', 'm', 'prompt', 1.0, {'a': 1})
+    assert key != ResponseCache.make_key('ollama', 'm', 'prompt', 1.1, {'a': 1})
+    assert key != ResponseCache.make_key('ollama', 'm', 'prompt', 1.0, {'a': 2})
+
+
+def test_memory_then_disk_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get('k') is None
+    cache.set('k', 'réponse')
+    assert cache.get('k') == 'réponse'
+
+    # Un nouveau cache sur le même fichier retrouve la réponse sur disque, puis en mémoire
+    reopened = make_cache(tmp_path)
+    assert reopened.get('k') == 'réponse'
+    assert reopened.get('k') == 'réponse'
+    stats = reopened.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['hits']) == (1, 1, 2)
+
+
+def test_memory_lru_is_bounded():
+    cache = ResponseCache(path=None, memory_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+
+
+def test_disk_eviction_by_count_and_size(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=0, max_disk_entries=2)
+    for key in 'abc':
+        cache.set(key, key)
+    assert cache.get('a') is None
+    assert cache.get('c') == 'c'
+
+    cache = make_cache(tmp_path / "sub", memory_entries=0, max_disk_bytes=10)
+    cache.set('x', '12345678')
+    cache.set('y', '12345678')
+    assert cache.get('x') is None
+    assert cache.get('y') == '12345678'
+    assert cache.stats()['evictions'] >= 1
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = make_cache(tmp_path, max_age=0)
+    cache.set('k', 'v')
+    cache.max_age = -1
+    assert cache.get('k') is None
+    assert make_cache(tmp_path).db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_clear(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('k', 'v')
+    cache.clear()
+    assert cache.get('k') is None
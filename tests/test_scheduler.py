@@ -0,0 +1,81 @@
+# test_scheduler.py
+import contextvars
+import threading
+
+import pytest
+
+from scheduler import FairScheduler
+
+
+def blocked(scheduler, request_id, role='gate'):
+    """Occupe un thread du pool jusqu'à ce que l'événement retourné soit levé"""
+    gate = threading.Event()
+    future = scheduler.submit(request_id, role, gate.wait, 5)
+    return gate, future
+
+
+def test_requests_are_served_in_turn():
+    scheduler = FairScheduler(max_workers=1)
+    order = []
+    try:
+        gate, first = blocked(scheduler, 'a')
+        # La requête 'a' met trois rôles en file avant que 'b' n'arrive : 'b' n'attend qu'un seul d'entre eux
+        futures = [scheduler.submit('a', f'a{i}', order.append, f'a{i}') for i in range(3)]
+        futures.append(scheduler.submit('b', 'b0', order.append, 'b0'))
+        assert scheduler.stats() == {"in_flight": 1, "queued": 4, "active_requests": 2}
+        gate.set()
+        for future in [first] + futures:
+            future.result(timeout=5)
+        assert order == ['a0', 'b0', 'a1', 'a2']
+    finally:
+        scheduler.shutdown()
+
+
+def test_role_limit_skips_to_runnable_task():
+    scheduler = FairScheduler(max_workers=2, role_limits={'recherche': 1})
+    order = []
+    try:
+        gate, first = blocked(scheduler, 'a', role='recherche')
+        waiting = scheduler.submit('b', 'recherche', order.append, 'recherche')
+        other = scheduler.submit('c', 'créatif', order.append, 'créatif')
+        other.result(timeout=5)
+        # Le second 'recherche' attend la fin du premier malgré le thread libre
+        assert order == ['créatif'] and not waiting.done()
+        gate.set()
+        assert first.result(timeout=5) is True
+        waiting.result(timeout=5)
+        assert order == ['créatif', 'recherche']
+    finally:
+        scheduler.shutdown()
+
+
+def test_cancel_request_drops_queued_tasks():
+    scheduler = FairScheduler(max_workers=1)
+    try:
+        gate, first = blocked(scheduler, 'a')
+        queued = [scheduler.submit('b', f'r{i}', lambda: None) for i in range(2)]
+        assert scheduler.cancel_request('b') == 2
+        assert all(future.cancelled() for future in queued)
+        gate.set()
+        assert first.result(timeout=5) is True
+        assert scheduler.stats()["queued"] == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_task_runs_in_submitter_context_and_reports_errors():
+    scheduler = FairScheduler(max_workers=2)
+    current = contextvars.ContextVar('current', default=None)
+    try:
+        current.set('requête 1')
+        assert scheduler.submit(1, 'r', current.get).result(timeout=5) == 'requête 1'
+
+        def fail():
+            raise ValueError("échec")
+
+        with pytest.raises(ValueError):
+            scheduler.submit(1, 'r', fail).result(timeout=5)
+        # Une tâche en échec libère sa place
+        assert scheduler.submit(1, 'r', lambda: 'ok').result(timeout=5) == 'ok'
+    finally:
+        scheduler.shutdown()